@@ -0,0 +1,176 @@
+"""
+Library API of Cortex2JStore
+
+migrate() runs one migration in the calling process, without the command line, and
+returns the final JStore rows, the local subjects, the vocabulary, the match report
+and the stage metrics. The exports are paths, binary file objects or lists of rows
+keyed on the column names, and the options are the long command line options.
+Invalid options and missing exports raise InvalidMigration before anything runs.
+
+    from api import migrate
+    result = migrate("data/cortex.csv", open("data/jstore.xls", "rb"), match = "normalized")
+
+File objects are spooled to a temporary file first, as the readers detect the format
+from the file. Without an output directory the results are only returned, the files
+written by the stages go to a temporary directory removed afterwards.
+"""
+
+# import the required modules
+from collections.abc import Mapping
+from cortex2jstore import Cortex2JStore
+from cortex2jstore import build_parser
+import standardize
+import readers
+import logging
+import os
+import shutil
+import tempfile
+
+# Options given as arguments of migrate rather than as options
+INPUT_OPTIONS = ("cortex_raw", "jstore_raw", "output_dir")
+
+# Options the API sets unless given: the snapshots are returned rather than exported,
+# and the rows are kept in memory to be returned
+API_DEFAULTS = {
+    "artifacts": "none",
+    "join": "memory",
+}
+
+
+class InvalidMigration(ValueError):
+    pass
+
+
+"""
+This function returns the command line arguments of a migration: the defaults of the
+command line, overridden by the options. Invalid options raise InvalidMigration.
+
+Parameters:
+:param options: Long command line options, e.g. match = "fuzzy"
+:ptype options: dict
+"""
+def migration_args (**options):
+    parser = build_parser()
+    args = parser.parse_args([])
+    actions = {action.dest: action for action in parser._actions}
+
+    unknown = [name for name in options if name not in actions or name in INPUT_OPTIONS]
+    if unknown:
+        raise InvalidMigration("Unknown options: " + ", ".join(sorted(unknown)))
+
+    # The values are checked like the command line checks them
+    for name, value in options.items():
+        action = actions[name]
+        if action.choices is not None and value not in action.choices:
+            raise InvalidMigration("Invalid value of {}: {}, choose from {}".format(name, value, ", ".join(str(c) for c in action.choices)))
+        if action.type in (int, float) and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise InvalidMigration("Invalid value of {}: {}, a number is expected".format(name, value))
+
+    for name, value in dict(API_DEFAULTS, **options).items():
+        setattr(args, name, value)
+
+    # The results are returned in memory, which the stream modes do not keep
+    if args.stream or args.pipeline or args.join != "memory":
+        raise InvalidMigration("migrate returns the rows in memory, stream, pipeline and --join other than memory are not supported")
+    if args.manifest or args.collections:
+        raise InvalidMigration("migrate runs a single collection, use batch.run_batch for a batch")
+    if args.engine == "columnar" and (args.match != "exact" or args.incremental):
+        raise InvalidMigration("the columnar engine runs --match exact without --incremental")
+
+    return args
+
+
+"""
+This function returns an export as the readers take it: a path or rows are passed
+on, a file object is copied to a file in the scratch directory. A missing file or
+an export of another type raises InvalidMigration.
+
+Parameters:
+:param source: Path, binary file object or list of rows
+:ptype source: str, file or list
+:param path: Path of the copy of a file object
+:ptype path: str
+"""
+def spool (source, path):
+    # The copy is named after the detected format, openpyxl refuses other extensions
+    if hasattr(source, "read"):
+        with open(path, 'wb') as spool_file:
+            shutil.copyfileobj(source, spool_file)
+        typed_path = path + "." + readers.detect_format(path)
+        os.replace(path, typed_path)
+        return typed_path
+
+    if readers.is_path(source):
+        if not os.path.isfile(source):
+            raise InvalidMigration("No such export: " + os.fsdecode(source))
+        return source
+
+    if not isinstance(source, list) or not all(isinstance(row, Mapping) for row in source):
+        raise InvalidMigration("An export is a path, a binary file object or a list of rows keyed on the column names")
+    return source
+
+
+"""
+This function returns the results of a finished migration.
+
+Parameters:
+:param appln: Application object the driver ran on
+:ptype appln: Cortex2JStore
+:param output_dir: Directory the results were written to, None when discarded
+:ptype output_dir: str
+"""
+def results (appln, output_dir):
+    rows = appln.columnar.records() if appln.engine == "columnar" else appln.final_jstore
+    return {
+        "rows": [dict(row.items()) for row in rows],
+        "local_subjects": appln.getlocalsubjectslist(),
+        "vocabulary": appln.vocabulary.to_list(),
+        "match_report": appln.match_summary(),
+        "metrics": appln.metrics.summary(),
+        "caches": standardize.cache_stats(),
+        "output_dir": output_dir,
+    }
+
+
+"""
+This function migrates a Cortex/JStore export pair and returns the results.
+
+Parameters:
+:param cortex: Cortex export: path, binary file object or list of rows
+:ptype cortex: str, file or list
+:param jstore: JStore export: path, binary file object or list of rows
+:ptype jstore: str, file or list
+:param output_dir: Directory the results are written to, None to only return them
+:ptype output_dir: str
+:param logger: Logger object, the Cortex2JStore logger by default
+:ptype logger: logging.Logger
+:param warm_caches: Flag to keep the transform caches of the earlier migrations of the process
+:ptype warm_caches: bool
+:param options: Long command line options, e.g. match = "fuzzy", workers = 4
+:ptype options: dict
+"""
+def migrate (cortex, jstore, output_dir = None, logger = None, warm_caches = False, **options):
+    logger = logger or logging.getLogger("Cortex2JStore")
+    scratch = tempfile.mkdtemp(prefix="cortex2jstore-")
+
+    try:
+        args = migration_args(**options)
+        args.output_dir = output_dir or scratch
+        args.cortex_raw = spool(cortex, os.path.join(scratch, "cortex"))
+        args.jstore_raw = spool(jstore, os.path.join(scratch, "jstore"))
+
+        if (args.checkpoint or args.resume) and not (readers.is_path(args.cortex_raw) and readers.is_path(args.jstore_raw)):
+            raise InvalidMigration("--checkpoint and --resume require exports given as paths or files")
+
+        appln = Cortex2JStore(logger)
+        appln.warm_caches = warm_caches
+        appln.configure(args)
+        appln.driver()
+        return results(appln, output_dir)
+
+    except Exception as e:
+        logger.error("migrate: Exception: " + str(e))
+        raise e
+
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
@@ -0,0 +1,231 @@
+"""
+Batch mode for migrating many collections in one run
+
+Every collection is a Cortex/JStore export pair, listed in a manifest or found with
+a glob, and runs the whole pipeline in its own worker process with its results in
+<output_dir>/<name>/. The collections start largest first, so the wall time stays
+close to the one of the slowest collection. The transform caches are shared through
+one cache file: every finished collection merges its entries into it, and the
+collections started afterwards load it warm.
+"""
+
+# import the required modules
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from cache import save_caches
+import standardize
+import writers
+import copy
+import csv
+import glob
+import json
+import logging
+import os
+import time
+
+# Prefixes of the export files in a collection directory found with a glob
+CORTEX_PREFIX = "cortex"
+JSTORE_PREFIX = "jstore"
+
+
+"""
+This function reads a manifest of collections, a JSON list of objects or a CSV file,
+both with the fields name, cortex and jstore. Relative paths are relative to the manifest.
+
+Parameters:
+:param path: Path to the manifest
+:ptype path: str
+"""
+def load_manifest (path):
+    if path.endswith(".json"):
+        with open(path, 'r') as manifest_file:
+            entries = json.load(manifest_file)
+    else:
+        with open(path, 'r', newline='') as manifest_file:
+            entries = list(csv.DictReader(manifest_file))
+
+    base = os.path.dirname(os.path.abspath(path))
+    collections = []
+    for entry in entries:
+        missing = [f for f in ("name", "cortex", "jstore") if not entry.get(f)]
+        if missing:
+            raise Exception("Manifest entry without " + ", ".join(missing) + ": " + str(entry))
+        collections.append({
+            "name": entry["name"],
+            "cortex": os.path.join(base, entry["cortex"]),
+            "jstore": os.path.join(base, entry["jstore"]),
+        })
+
+    return collections
+
+
+"""
+This function returns the collections found in the directories matching the glob.
+A collection directory holds one cortex.* and one jstore.* export and is named
+after the directory.
+
+Parameters:
+:param pattern: Glob of the collection directories, e.g. data/*
+:ptype pattern: str
+"""
+def find_collections (pattern):
+    collections = []
+    for directory in sorted(glob.glob(pattern)):
+        if not os.path.isdir(directory):
+            continue
+
+        files = sorted(os.listdir(directory))
+        cortex = [f for f in files if f.lower().startswith(CORTEX_PREFIX)]
+        jstore = [f for f in files if f.lower().startswith(JSTORE_PREFIX)]
+        if len(cortex) != 1 or len(jstore) != 1:
+            raise Exception("Expected one cortex.* and one jstore.* file in " + directory)
+
+        collections.append({
+            "name": os.path.basename(os.path.normpath(directory)),
+            "cortex": os.path.join(directory, cortex[0]),
+            "jstore": os.path.join(directory, jstore[0]),
+        })
+
+    return collections
+
+
+"""
+This function runs the pipeline of one collection. It is the unit of work of the
+batch worker processes and returns the summary of the collection together with the
+entries of its transform caches.
+
+Parameters:
+:param application: Application class, Cortex2JStore
+:ptype application: type
+:param collection: Collection with its name and export paths
+:ptype collection: dict
+:param args: Command line arguments of the collection
+:ptype args: argparse.Namespace
+"""
+def run_collection (application, collection, args):
+    logger = logging.getLogger("Cortex2JStore." + collection["name"])
+    logger.setLevel(args.loglevel)
+
+    summary = {"name": collection["name"], "output_dir": args.output_dir, "status": "ok"}
+    start = time.perf_counter()
+
+    try:
+        appln = application(logger)
+        appln.shared_cache = True
+        appln.configure(args)
+        appln.driver()
+        summary["caches"] = {name: list(cache.entries.items()) for name, cache in standardize.caches.items()}
+
+    except Exception as e:
+        logger.error("run_collection: " + collection["name"] + ": Exception: " + str(e))
+        summary["status"] = "failed"
+        summary["error"] = str(e)
+
+    summary["wall_s"] = time.perf_counter() - start
+    return summary
+
+
+"""
+This function runs the collections on a pool of worker processes and writes the
+batch summary to <output_dir>/batch.json. It returns the summaries.
+
+Parameters:
+:param application: Application class, Cortex2JStore
+:ptype application: type
+:param collections: Collections with their names and export paths
+:ptype collections: list
+:param args: Command line arguments of the batch
+:ptype args: argparse.Namespace
+:param logger: Logger object
+:ptype logger: logging.Logger
+"""
+def run_batch (application, collections, args, logger):
+    try:
+        names = [c["name"] for c in collections]
+        if len(set(names)) != len(names):
+            raise Exception("Duplicate collection names in the batch")
+
+        os.makedirs(args.output_dir, exist_ok=True)
+
+        # The collections share one cache file, loaded here and saved after every collection
+        cache_file = args.cache_file or os.path.join(args.output_dir, "cache.json")
+        standardize.configure_caches(size = args.cache_size, path = args.cache_file)
+
+        # Largest inputs first, so that no large collection starts last
+        pending = sorted(collections, key=input_size, reverse=True)
+        workers = max(1, min(args.batch_workers, len(pending)))
+        logger.info("run_batch: {} collections on {} workers".format(len(pending), workers))
+
+        summaries = []
+        start = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            running = set()
+            while pending or running:
+                # Collections are submitted as workers free up, so that they start with the latest cache file
+                while pending and len(running) < workers:
+                    collection = pending.pop(0)
+                    running.add(executor.submit(run_collection, application, collection, collection_args(args, collection, cache_file)))
+
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    summary = future.result()
+                    for name, entries in summary.pop("caches", {}).items():
+                        for key, value in entries:
+                            standardize.caches[name].put(key, value)
+                    summaries.append(summary)
+                    logger.info("run_batch: {}: {} in {:.2f}s".format(summary["name"], summary["status"], summary["wall_s"]))
+
+                save_caches(standardize.caches, cache_file)
+
+        failed = [s["name"] for s in summaries if s["status"] != "ok"]
+        logger.info("run_batch: {} collections in {:.2f}s, {} failed{}".format(
+            len(summaries), time.perf_counter() - start, len(failed), ": " + ", ".join(failed) if failed else ""))
+
+        summaries.sort(key=lambda s: names.index(s["name"]))
+        writers.write_json(summaries, os.path.join(args.output_dir, "batch.json"), "pretty")
+        return summaries
+
+    except Exception as e:
+        logger.error("run_batch: Exception: " + str(e))
+        raise e
+
+
+"""
+This function returns the size of the exports of a collection, missing files count
+as empty and fail in their own worker.
+
+Parameters:
+:param collection: Collection with its name and export paths
+:ptype collection: dict
+"""
+def input_size (collection):
+    return sum(os.path.getsize(collection[f]) for f in ("cortex", "jstore") if os.path.exists(collection[f]))
+
+
+"""
+This function returns the command line arguments of one collection: its exports,
+its own output directory, the shared cache file, its own incremental state file, and
+its name as the name of its vocabulary.
+
+Parameters:
+:param args: Command line arguments of the batch
+:ptype args: argparse.Namespace
+:param collection: Collection with its name and export paths
+:ptype collection: dict
+:param cache_file: Cache file shared by the collections
+:ptype cache_file: str
+"""
+def collection_args (args, collection, cache_file):
+    collection_args = copy.copy(args)
+    collection_args.cortex_raw = collection["cortex"]
+    collection_args.jstore_raw = collection["jstore"]
+    collection_args.output_dir = os.path.join(args.output_dir, collection["name"])
+    collection_args.cache_file = cache_file if os.path.exists(cache_file) else None
+    collection_args.vocabulary_name = collection["name"]
+
+    if args.incremental:
+        collection_args.incremental = os.path.join(collection_args.output_dir, os.path.basename(args.incremental))
+
+    return collection_args
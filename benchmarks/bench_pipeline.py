@@ -0,0 +1,188 @@
+"""
+Scaling benchmark of the whole Cortex2JStore pipeline.
+
+For every size, a synthetic Cortex/JStore export pair is generated (once, then reused
+from the data directory) and cortex2jstore runs configure and driver on it in a fresh
+process per mode, so that the peak memory of one run does not leak into the next.
+The per-stage wall time, CPU time and peak RSS are taken from the metrics.json of the
+run. The final JStore of every mode is compared with the one of the first mode.
+Every run is appended to the results file, so regressions show up against earlier runs.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--sizes 10000,100000,1000000] [--modes row,columnar,stream]
+"""
+
+# import the required modules
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+
+# Command line arguments of cortex2jstore per mode
+MODES = {
+    "row": [],
+    "columnar": ["-e", "columnar"],
+    "stream": ["--stream"],
+    "parallel": ["-w", str(os.cpu_count() or 1)],
+}
+
+
+"""
+This function returns the abbreviated commit of the working tree, or None outside git.
+"""
+def current_commit ():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+"""
+This function returns the paths of the exports of a size, generating them when missing.
+
+Parameters:
+:param data_dir: Directory the datasets are kept in
+:ptype data_dir: str
+:param rows: Number of JStore rows
+:ptype rows: int
+:param match_ratio: Share of the JStore rows matching a Cortex record
+:ptype match_ratio: float
+"""
+def dataset (data_dir, rows, match_ratio):
+    directory = os.path.join(data_dir, "{}-{}".format(rows, match_ratio))
+    cortex_path = os.path.join(directory, "cortex.csv")
+    jstore_path = os.path.join(directory, "jstore.xlsx")
+
+    if not (os.path.exists(cortex_path) and os.path.exists(jstore_path)):
+        start = time.perf_counter()
+        synthetic.write_dataset(directory, rows, match_ratio)
+        print("generated {} rows in {:.1f}s".format(rows, time.perf_counter() - start))
+
+    return cortex_path, jstore_path
+
+
+"""
+This function runs cortex2jstore on the exports in a new process and returns the run
+with its per-stage metrics, or with an error when the run did not finish.
+
+Parameters:
+:param mode: Mode, a key of MODES
+:ptype mode: str
+:param cortex_path: Path to the Cortex export
+:ptype cortex_path: str
+:param jstore_path: Path to the JStore export
+:ptype jstore_path: str
+:param output_dir: Directory the results of the run are written to
+:ptype output_dir: str
+"""
+def run_pipeline (mode, cortex_path, jstore_path, output_dir):
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+
+    command = [sys.executable, os.path.join(ROOT, "cortex2jstore.py"), "-c", cortex_path, "-j", jstore_path,
+               "-o", output_dir, "-l", "30", "-a", "final", "-f", "ndjson"] + MODES[mode]
+
+    start = time.perf_counter()
+    with open(os.path.join(output_dir, "run.log"), 'w') as log_file:
+        subprocess.run(command, stdout=log_file, stderr=subprocess.STDOUT, check=False)
+    run = {"mode": mode, "wall_s": time.perf_counter() - start}
+
+    # cortex2jstore logs its errors and exits normally, the metrics are only written by a complete run
+    metrics_path = os.path.join(output_dir, "metrics.json")
+    if not os.path.exists(metrics_path):
+        run["error"] = "no metrics, see " + os.path.join(output_dir, "run.log")
+        return run
+
+    with open(metrics_path, 'r') as metrics_file:
+        stages = json.load(metrics_file)["stages"]
+
+    run["peak_rss_mb"] = max(s["peak_rss_mb"] for s in stages)
+    run["stages"] = [{k: s[k] for k in ("stage", "calls", "wall_s", "cpu_s", "rows_in", "rows_out", "rss_delta_mb", "peak_rss_mb")} for s in stages]
+    return run
+
+
+"""
+This function compares two NDJSON files row by row, ignoring the order of the keys.
+
+Parameters:
+:param path: Path to the first file
+:ptype path: str
+:param other: Path to the second file
+:ptype other: str
+"""
+def same_rows (path, other):
+    with open(path, 'r') as first, open(other, 'r') as second:
+        for line, other_line in zip(first, second):
+            if json.loads(line) != json.loads(other_line):
+                return False
+        return first.readline() == "" and second.readline() == ""
+
+
+def main ():
+    parser = argparse.ArgumentParser (description="Scaling benchmark of the whole Cortex2JStore pipeline on synthetic exports")
+    parser.add_argument ("--sizes", type=str, default="10000,100000,1000000", help="comma separated numbers of jstore rows: default 10000,100000,1000000")
+    parser.add_argument ("--modes", type=str, default="row,columnar,stream", help="comma separated modes, of {}: default row,columnar,stream".format (", ".join (MODES)))
+    parser.add_argument ("--match_ratio", type=float, default=0.9, help="share of the jstore rows with a cortex record: default 0.9")
+    parser.add_argument ("--data_dir", type=str, default=os.path.join(ROOT, "benchmarks", "data"), help="directory the synthetic exports and the run outputs are kept in: default benchmarks/data")
+    parser.add_argument ("--results", type=str, default=os.path.join(ROOT, "benchmarks", "results.json"), help="json file the runs are appended to: default benchmarks/results.json")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    modes = [m.strip() for m in args.modes.split(",")]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        parser.error("unknown modes: " + ", ".join(unknown))
+
+    results = []
+    if os.path.exists(args.results):
+        with open(args.results, 'r') as results_file:
+            results = json.load(results_file)
+
+    context = {"date": datetime.datetime.now().isoformat(timespec="seconds"), "commit": current_commit(), "python": platform.python_version()}
+    failed = False
+
+    for rows in sizes:
+        cortex_path, jstore_path = dataset(args.data_dir, rows, args.match_ratio)
+        reference = None
+
+        for mode in modes:
+            output_dir = os.path.join(os.path.dirname(cortex_path), "output-" + mode)
+            run = dict(context, rows=rows, match_ratio=args.match_ratio, **run_pipeline(mode, cortex_path, jstore_path, output_dir))
+
+            if "error" not in run:
+                final_path = os.path.join(output_dir, "finaljstore.ndjson")
+                if reference is None:
+                    reference = final_path
+                run["parity"] = same_rows(reference, final_path)
+
+            failed = failed or "error" in run or not run["parity"]
+            results.append(run)
+
+            if "error" in run:
+                print("{:>9} {:<9} FAILED: {}".format(rows, mode, run["error"]))
+                continue
+            print("{:>9} {:<9} {:>9.2f}s {:>9.1f} MB  parity {}".format(rows, mode, run["wall_s"], run["peak_rss_mb"], "ok" if run["parity"] else "MISMATCH"))
+            # The RSS of a stage is its change, the peak is the one of the process
+            for stage in run["stages"]:
+                print("          {:<22} {:>9.2f}s {:>9} MB".format(stage["stage"], stage["wall_s"], "-" if stage["rss_delta_mb"] is None else "{:+.1f}".format(stage["rss_delta_mb"])))
+
+    with open(args.results, 'w') as results_file:
+        json.dump(results, results_file, indent=4)
+    print("results appended to " + args.results)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
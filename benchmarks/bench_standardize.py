@@ -0,0 +1,95 @@
+"""
+Micro-benchmarks for the JStore standardization transforms.
+
+The golden outputs in golden_standardize.json are checked first, so a faster
+implementation can never silently change the migrated data. Then every transform
+is timed with timeit on synthetic names and subject lists and reported in ops/sec.
+
+Usage:
+    python benchmarks/bench_standardize.py [-n 10000] [-r 5]
+"""
+
+# import the required modules
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import standardize
+import synthetic
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_standardize.json")
+
+
+"""
+This function checks every transform against its golden outputs and returns the mismatches.
+"""
+def check_golden ():
+    with open(GOLDEN_PATH, 'r') as golden_file:
+        golden = json.load(golden_file)
+
+    transforms = {
+        "format_name": standardize.format_name,
+        "comma_replace_pipe": standardize.comma_replace_pipe,
+        "standardize_vanderbilt_people": lambda v: standardize.standardize_vanderbilt_people(standardize.comma_replace_pipe(v)),
+    }
+
+    mismatches = []
+    for name, cases in golden.items():
+        for value, expected in cases:
+            actual = transforms[name](value)
+            if actual != expected:
+                mismatches.append((name, value, expected, actual))
+    
+    return mismatches
+
+
+"""
+This function times func over every value and returns the best ops/sec of the repeats.
+
+Parameters:
+:param func: Transform to be timed
+:ptype func: callable
+:param values: Inputs of the transform
+:ptype values: list
+:param repeat: Number of timing repeats
+:ptype repeat: int
+"""
+def ops_per_sec (func, values, repeat):
+    timer = timeit.Timer(lambda: [func(v) for v in values])
+    return len(values) / min(timer.repeat(repeat=repeat, number=1))
+
+
+def main ():
+    parser = argparse.ArgumentParser (description="Micro-benchmarks for the JStore standardization transforms")
+    parser.add_argument ("-n", "--values", type=int, default=10000, help="number of synthetic values per benchmark: default 10000")
+    parser.add_argument ("-r", "--repeat", type=int, default=5, help="number of timing repeats, the best one is reported: default 5")
+    args = parser.parse_args()
+
+    mismatches = check_golden()
+    for name, value, expected, actual in mismatches:
+        print("GOLDEN MISMATCH {}({!r}): expected {!r}, got {!r}".format(name, value, expected, actual))
+    if mismatches:
+        sys.exit(1)
+    print("golden outputs: ok")
+
+    names = synthetic.names(args.values, seed=1)
+    subjects = synthetic.subject_lists(args.values, seed=1)
+    people = [standardize.comma_replace_pipe(p) for p in synthetic.people_lists(args.values, seed=1)]
+
+    # Uncached transforms, then the cached path used by the pipeline
+    benchmarks = [
+        ("format_name", standardize.format_name, names),
+        ("comma_replace_pipe", standardize.comma_replace_pipe, subjects),
+        ("standardize_vanderbilt_people (cached)", standardize.standardize_vanderbilt_people, people),
+    ]
+
+    for name, func, values in benchmarks:
+        print("{:<42} {:>14,.0f} ops/sec".format(name, ops_per_sec(func, values, args.repeat)))
+
+
+if __name__ == "__main__":
+    main()
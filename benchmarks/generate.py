@@ -0,0 +1,33 @@
+"""
+Generates a synthetic Cortex/JStore export pair to run cortex2jstore on.
+
+Usage:
+    python benchmarks/generate.py -n 100000 -d data/synthetic [--match_ratio 0.9] [--format xlsx]
+    python cortex2jstore.py -c data/synthetic/cortex.csv -j data/synthetic/jstore.xlsx
+"""
+
+# import the required modules
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synthetic
+
+
+def main ():
+    parser = argparse.ArgumentParser (description="Generates a synthetic Cortex/JStore export pair")
+    parser.add_argument ("-n", "--rows", type=int, default=10000, help="number of jstore rows: default 10000")
+    parser.add_argument ("-d", "--directory", type=str, default="data/synthetic", help="directory the exports are written to: default data/synthetic")
+    parser.add_argument ("--match_ratio", type=float, default=0.9, help="share of the jstore rows with a cortex record: default 0.9")
+    parser.add_argument ("--format", type=str, default="xlsx", choices=["xlsx", "xls"], help="format of the jstore export, xls holds at most 65535 rows: default xlsx")
+    parser.add_argument ("--seed", type=int, default=0, help="random seed: default 0")
+    args = parser.parse_args()
+
+    cortex_path, jstore_path = synthetic.write_dataset(args.directory, args.rows, args.match_ratio, args.format, args.seed)
+    print("written {} and {}".format(cortex_path, jstore_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+Synthetic values and exports shaped like the Cortex and JStore exports, used by the benchmarks.
+
+write_dataset writes a Cortex CSV export (BOM and "|CoreField..." header suffixes
+included) and a JStore xlsx or xls export of any size, with a chosen share of
+matching file names.
+"""
+
+# import the required modules
+import csv
+import itertools
+import openpyxl
+import os
+import random
+
+try:
+    import xlwt
+except ImportError:
+    xlwt = None
+
+# Data rows of a legacy xls sheet, whose 65,536 rows include the header
+XLS_MAX_ROWS = 65535
+
+FIRST_NAMES = ["John", "Mary", "James", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William", "Elizabeth", "Chancellor", "Dean"]
+MIDDLE_NAMES = ["A.", "B.", "Lee", "Ann", "Paul", "Marie", "J.", "Van"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Heard", "Kirkland", "Vanderbilt", "Wyatt"]
+SUFFIXES = ["Jr.", "Sr.", "II.", "III.", "IV."]
+NOTES = ["(left)", "(right)", "(center)", "(unidentified)"]
+SUBJECTS = ["Football", "Basketball", "Commencement", "Alumni", "Campus buildings", "Kirkland Hall", "Student life", "Faculty", "Music", "Reunions", "Protests", "Medical Center", "Athletics", "Libraries"]
+
+
+"""
+This function returns a random person name, with optional middle names, suffixes and notes.
+
+Parameters:
+:param rng: Random number generator
+:ptype rng: random.Random
+"""
+def person_name (rng):
+    shape = rng.random()
+    if shape < 0.05:
+        return rng.choice(LAST_NAMES)
+
+    parts = [rng.choice(FIRST_NAMES)]
+    if shape > 0.5:
+        parts.append(rng.choice(MIDDLE_NAMES))
+    parts.append(rng.choice(LAST_NAMES))
+
+    if shape > 0.8:
+        parts.append(rng.choice(SUFFIXES))
+    if shape > 0.9:
+        parts.append(rng.choice(MIDDLE_NAMES + NOTES))
+    elif 0.7 < shape < 0.75:
+        parts.append(rng.choice(NOTES))
+    
+    return " ".join(parts)
+
+
+"""
+This function returns a comma separated list of people, as found in the Cortex "Person Shown" column.
+
+Parameters:
+:param rng: Random number generator
+:ptype rng: random.Random
+:param people: Number of people in the list
+:ptype people: int
+"""
+def people_list (rng, people = None):
+    count = people if people is not None else rng.randint(1, 4)
+    return ",".join(person_name(rng) for _ in range(count))
+
+
+"""
+This function returns a comma separated list of subjects, as found in the Cortex "Tags" column.
+Some lists use ", " which is kept as a comma by the comma to pipe transform.
+
+Parameters:
+:param rng: Random number generator
+:ptype rng: random.Random
+"""
+def subject_list (rng):
+    subjects = rng.sample(SUBJECTS, rng.randint(1, 5))
+    separator = ", " if rng.random() < 0.1 else ","
+    return separator.join(subjects)
+
+
+"""
+This function returns n random person names.
+
+Parameters:
+:param n: Number of names
+:ptype n: int
+:param seed: Random seed
+:ptype seed: int
+"""
+def names (n, seed = 0):
+    rng = random.Random(seed)
+    return [person_name(rng) for _ in range(n)]
+
+
+"""
+This function returns n random subject lists.
+
+Parameters:
+:param n: Number of subject lists
+:ptype n: int
+:param seed: Random seed
+:ptype seed: int
+"""
+def subject_lists (n, seed = 0):
+    rng = random.Random(seed)
+    return [subject_list(rng) for _ in range(n)]
+
+
+"""
+This function returns n random comma separated lists of people.
+
+Parameters:
+:param n: Number of lists
+:ptype n: int
+:param seed: Random seed
+:ptype seed: int
+"""
+def people_lists (n, seed = 0):
+    rng = random.Random(seed)
+    return [people_list(rng) for _ in range(n)]
+
+
+# Columns of the synthetic exports, matched as in config.py
+CORTEX_KEY = "Original File Name"
+JSTORE_KEY = "Filename"
+CORTEX_COLUMNS = [CORTEX_KEY, "Unique Identifier", "Title", "Description / Data", "Notes", "Date Circa", "Date Created", "Source Name", "Tags", "Person Shown", "Original Asset Type", "Original Asset Condition", "Asset Donor", "Date Scanned"]
+JSTORE_COLUMNS = [JSTORE_KEY, "Identifier[2071405]", "Title[2071407]", "Description[2071422]", "Source[2071436]", "Date[2071410]", "Precise Date[2071412]", "Photographer[2071421]", "Vanderbilt Local Subjects[2083876]", "Vanderbilt People[2083840]", "Format[2071431]", "Work Type[2071442]", "Contributor[2071404]", "Edition[2071419]"]
+ASSET_TYPES = ["Photograph", "Negative", "Slide", "Print", "Postcard"]
+CONDITIONS = ["Good", "Fair", "Poor", "Excellent"]
+DONORS = ["University Archives", "Alumni Association", "Estate of J. Smith", "Athletics Department"]
+
+
+"""
+This function returns the header of a Cortex CSV export, with the "|CoreField..."
+suffixes that clean_cortex_header strips.
+"""
+def cortex_header ():
+    return [c + "|CoreField." + c.replace(" ", "").replace("/", "") for c in CORTEX_COLUMNS]
+
+
+"""
+This function returns the subjects of a collection: the common subjects followed by a
+long tail, with Zipf-like weights so that a few subjects are on most rows.
+
+Parameters:
+:param tail: Number of subjects of the long tail
+:ptype tail: int
+"""
+def subject_pool (tail):
+    subjects = SUBJECTS + ["Collection " + str(i) for i in range(tail)]
+    weights = [1 / (rank + 1) for rank in range(len(subjects))]
+    return subjects, weights
+
+
+"""
+This function returns the values of a Cortex row.
+
+Parameters:
+:param rng: Random number generator
+:ptype rng: random.Random
+:param filename: Original file name of the asset
+:ptype filename: str
+:param index: Row number
+:ptype index: int
+:param pool: Subjects and weights from subject_pool
+:ptype pool: tuple
+"""
+def cortex_row (rng, filename, index, pool):
+    subjects = list(dict.fromkeys(rng.choices(pool[0], pool[1], k=rng.randint(1, 5))))
+    year = rng.randint(1880, 2020)
+    description = "Photograph {}, taken by {}".format(index, person_name(rng))
+    if rng.random() < 0.1:
+        description += ".\n\"Caption\" on the back"
+
+    return [
+        filename,
+        "CX" + str(index),
+        "Title " + str(index),
+        description,
+        "Box {}, folder {}".format(rng.randint(1, 500), rng.randint(1, 50)),
+        "circa " + str(year),
+        "{}-{:02d}-{:02d}".format(year, rng.randint(1, 12), rng.randint(1, 28)),
+        person_name(rng),
+        (", " if rng.random() < 0.1 else ",").join(subjects),
+        people_list(rng),
+        rng.choice(ASSET_TYPES),
+        rng.choice(CONDITIONS),
+        rng.choice(DONORS),
+        str(rng.randint(2015, 2023)),
+    ]
+
+
+"""
+This function returns the values of a JStore row. Most cells are empty, to be filled
+from Cortex, and some are already catalogued.
+
+Parameters:
+:param rng: Random number generator
+:ptype rng: random.Random
+:param filename: File name of the asset
+:ptype filename: str
+:param index: Row number
+:ptype index: int
+:param filled: Share of the cells already filled
+:ptype filled: float
+"""
+def jstore_row (rng, filename, index, filled):
+    values = [filename]
+    for column in JSTORE_COLUMNS[1:]:
+        values.append("J{}-{}".format(column.split("[")[0], index) if rng.random() < filled else "")
+    return values
+
+
+"""
+This function writes a Cortex CSV export: UTF-8 with a BOM, and a "|CoreField..."
+suffix on every column name.
+
+Parameters:
+:param path: Path to the CSV file
+:ptype path: str
+:param filenames: Original file names, one row each
+:ptype filenames: list
+:param seed: Random seed
+:ptype seed: int
+:param tail: Number of subjects of the long tail
+:ptype tail: int
+"""
+def write_cortex (path, filenames, seed = 0, tail = 200):
+    rng = random.Random(seed)
+    pool = subject_pool(tail)
+    with open(path, 'w', newline='', encoding='utf-8-sig') as cortex_file:
+        writer = csv.writer(cortex_file)
+        writer.writerow(cortex_header())
+        for index, filename in enumerate(filenames):
+            writer.writerow(cortex_row(rng, filename, index, pool))
+
+
+"""
+This function writes a JStore export, xlsx with openpyxl in write-only mode or
+legacy xls with xlwt (at most XLS_MAX_ROWS rows).
+
+Parameters:
+:param path: Path to the JStore file
+:ptype path: str
+:param filenames: File names, one row each
+:ptype filenames: list
+:param format: xlsx or xls
+:ptype format: str
+:param seed: Random seed
+:ptype seed: int
+:param filled: Share of the cells already filled
+:ptype filled: float
+"""
+def write_jstore (path, filenames, format = "xlsx", seed = 0, filled = 0.3):
+    rng = random.Random(seed)
+    rows = (jstore_row(rng, filename, index, filled) for index, filename in enumerate(filenames))
+
+    if format == "xlsx":
+        workbook = openpyxl.Workbook(write_only=True)
+        worksheet = workbook.create_sheet()
+        worksheet.append(JSTORE_COLUMNS)
+        for values in rows:
+            worksheet.append(values)
+        workbook.save(path)
+
+    elif format == "xls":
+        if xlwt is None:
+            raise Exception("xlwt is required to write xls files")
+        if len(filenames) > XLS_MAX_ROWS:
+            raise Exception("xls files hold at most {} rows".format(XLS_MAX_ROWS))
+        workbook = xlwt.Workbook()
+        worksheet = workbook.add_sheet("Sheet1")
+        for r, values in enumerate(itertools.chain([JSTORE_COLUMNS], rows)):
+            for c, value in enumerate(values):
+                worksheet.write(r, c, value)
+        workbook.save(path)
+
+    else:
+        raise Exception("Unknown file type: " + format)
+
+
+"""
+This function writes a Cortex export and a JStore export of the given size to a
+directory and returns their paths. match_ratio of the JStore rows have a Cortex
+record; the others are new assets. A few Cortex records share a file name, as
+duplicates do in real exports.
+
+Parameters:
+:param directory: Directory the exports are written to
+:ptype directory: str
+:param rows: Number of JStore rows
+:ptype rows: int
+:param match_ratio: Share of the JStore rows matching a Cortex record
+:ptype match_ratio: float
+:param format: Format of the JStore export, xlsx or xls
+:ptype format: str
+:param seed: Random seed
+:ptype seed: int
+"""
+def write_dataset (directory, rows, match_ratio = 0.9, format = "xlsx", seed = 0):
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    jstore_names = ["IMG_{:07d}.tif".format(i) for i in range(rows)]
+    matched = rng.sample(jstore_names, int(rows * match_ratio))
+    # Cortex also holds records of assets that are not in JStore, and some duplicates
+    cortex_names = matched + ["SCAN_{:07d}.tif".format(i) for i in range(rows // 10)]
+    cortex_names += rng.sample(matched, len(matched) // 100)
+    rng.shuffle(cortex_names)
+
+    cortex_path = os.path.join(directory, "cortex.csv")
+    jstore_path = os.path.join(directory, "jstore." + format)
+    write_cortex(cortex_path, cortex_names, seed = seed, tail = max(len(SUBJECTS), rows // 50))
+    write_jstore(jstore_path, jstore_names, format = format, seed = seed)
+    return cortex_path, jstore_path
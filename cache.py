@@ -0,0 +1,161 @@
+"""
+Bounded LRU cache used in front of the name and comma transforms.
+
+The same values repeat across thousands of rows of a collection, so each distinct
+value is transformed once. Caches can be saved to a local JSON file and loaded
+back, so that repeated migrations start warm.
+"""
+
+# import the required modules
+from collections import OrderedDict
+import json
+import os
+
+
+class LRUCache:
+
+    """
+    Constructor
+
+    Parameters:
+    :param maxsize: Maximum number of entries kept, 0 disables the cache
+    :ptype maxsize: int
+    :param record: Flag to keep the entries computed on a miss until they are drained
+    :ptype record: bool
+    """
+    def __init__(self, maxsize, record = False):
+        self.maxsize = maxsize # Maximum number of entries
+        self.entries = OrderedDict() # Cached entries, least recently used first
+        self.hits = 0 # Number of lookups answered from the cache
+        self.misses = 0 # Number of lookups not in the cache
+        self.evictions = 0 # Number of entries dropped to respect maxsize
+        self.record = record # Keep the computed entries for drain()
+        self.computed = [] # Entries computed since the last drain()
+
+
+    """
+    This method returns the cached value for the key, or computes it with func and caches it.
+
+    Parameters:
+    :param key: Cache key
+    :ptype key: str
+    :param func: Function computing the value from the key on a miss
+    :ptype func: callable
+    """
+    def get (self, key, func):
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            value = func(key)
+            self.put(key, value)
+            if self.record:
+                self.computed.append((key, value))
+            return value
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+
+    """
+    This method stores a value, evicting the least recently used entries when the cache is full.
+
+    Parameters:
+    :param key: Cache key
+    :ptype key: str
+    :param value: Value to be cached
+    :ptype value: str
+    """
+    def put (self, key, value):
+        if self.maxsize <= 0:
+            return
+
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+
+    """
+    This method returns the hit, miss and eviction counters of the cache.
+    """
+    def stats (self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+    """
+    This method returns the lookup counters and the computed entries recorded since
+    the last call, and resets them. Worker processes use it to report back to the parent.
+    """
+    def drain (self):
+        report = {"hits": self.hits, "misses": self.misses, "computed": self.computed}
+        self.hits = 0
+        self.misses = 0
+        self.computed = []
+        return report
+
+
+    """
+    This method merges a report drained from another cache, e.g. one living in a worker
+    process: the lookup counters are added and the computed entries are cached here.
+
+    Parameters:
+    :param report: Report as returned by drain()
+    :ptype report: dict
+    """
+    def merge (self, report):
+        self.hits += report["hits"]
+        self.misses += report["misses"]
+        for key, value in report["computed"]:
+            self.put(key, value)
+
+
+"""
+This function saves named caches to a JSON file, writing a temporary file first
+so that an interrupted run never leaves a truncated cache behind.
+
+Parameters:
+:param caches: Caches keyed on their name
+:ptype caches: dict
+:param path: Path to the cache file
+:ptype path: str
+"""
+def save_caches (caches, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as cache_file:
+        json.dump({name: list(cache.entries.items()) for name, cache in caches.items()}, cache_file)
+    os.replace(tmp_path, path)
+
+
+"""
+This function loads the entries saved by save_caches into the given caches.
+A missing file leaves the caches empty.
+
+Parameters:
+:param caches: Caches keyed on their name
+:ptype caches: dict
+:param path: Path to the cache file
+:ptype path: str
+"""
+def load_caches (caches, path):
+    if not path or not os.path.exists(path):
+        return
+
+    with open(path, 'r') as cache_file:
+        saved = json.load(cache_file)
+
+    for name, cache in caches.items():
+        for key, value in saved.get(name, []):
+            cache.put(key, value)
+        cache.evictions = 0
@@ -0,0 +1,212 @@
+"""
+Stage checkpoints for resuming a failed migration
+
+After each completed stage of the batch driver, the data the next stages need is
+pickled (protocol 5) to <output_dir>/checkpoints/<stage>.pkl. The manifest records
+the completed stages under a key made of the hashes of the raw exports, config.py
+and the matching settings. A resumed run only loads the checkpoints written under
+the same key, so it never continues from data that no longer matches its inputs.
+"""
+
+# import the required modules
+from config import match_columns
+from config import jstore_schema_columns
+from config import match_normalizers
+from state import fingerprint
+import hashlib
+import json
+import os
+import pickle
+import shutil
+
+# Bump when the pipeline data structures change, so that older checkpoints are discarded
+CHECKPOINT_VERSION = 2
+
+# Stages checkpointed by the batch driver, in pipeline order, and the attributes
+# of the application saved with each one
+CHECKPOINT_STAGES = {
+    "loaded": ("schemas", "cortex", "jstore"), # raw exports read
+    "matched": ("schemas", "cortex", "matches"), # matches found, the Cortex rows are fingerprinted by the incremental mode
+    "standardized": ("schemas", "final_jstore", "vocabulary"), # final JStore rows standardized
+}
+
+# Pickle protocol of the checkpoints
+PICKLE_PROTOCOL = 5
+
+# Size of the blocks read to hash the raw exports
+HASH_BLOCK_SIZE = 1 << 20
+
+
+"""
+This function returns the SHA-1 of the contents of a file.
+
+Parameters:
+:param path: Path to the file
+:ptype path: str
+"""
+def file_hash (path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as raw_file:
+        for block in iter(lambda: raw_file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CheckpointStore:
+
+    """
+    Constructor
+
+    Parameters:
+    :param directory: Directory the checkpoints are written to
+    :ptype directory: str
+    :param logger: Logger object
+    :ptype logger: logging.Logger
+    """
+    def __init__(self, directory, logger):
+        self.directory = directory # Directory the checkpoints are written to
+        self.logger = logger # Logger object
+        self.key = None # Hash of the inputs, the configuration and the settings of the run
+        self.stages = [] # Stages checkpointed under the key, in pipeline order
+        self.resumed_after = None # Last stage completed by the resumed run
+
+
+    """
+    This method computes the key of the run and reads the manifest. The checkpoints
+    of a previous run are kept only when resuming with the same key.
+
+    Parameters:
+    :param inputs: Paths to the raw exports
+    :ptype inputs: list
+    :param settings: Command line settings the stages depend on
+    :ptype settings: list
+    :param resume: Flag to keep the checkpoints of the previous run
+    :ptype resume: bool
+    """
+    def open (self, inputs, settings, resume = False):
+        try:
+            self.key = fingerprint([
+                CHECKPOINT_VERSION, [file_hash(path) for path in inputs],
+                list(match_columns.items()), sorted(jstore_schema_columns.items()), match_normalizers, settings,
+            ])
+
+            manifest = self.read_manifest()
+            if resume and manifest.get("key") == self.key:
+                self.stages = [s for s in manifest.get("stages", []) if os.path.exists(self.stage_path(s))]
+                self.resumed_after = self.latest()
+            else:
+                if resume and manifest:
+                    self.logger.info("CheckpointStore::open: inputs or configuration changed, discarding the checkpoints")
+                self.clear()
+
+            return self
+
+        except Exception as e:
+            self.logger.error("CheckpointStore::open: Exception: " + str(e))
+            raise e
+
+
+    """
+    This method returns the last checkpointed stage, or None.
+    """
+    def latest (self):
+        return self.stages[-1] if self.stages else None
+
+
+    """
+    This method returns True when the stage, or a later one, is checkpointed.
+
+    Parameters:
+    :param stage: Stage name, from CHECKPOINT_STAGES
+    :ptype stage: str
+    """
+    def reached (self, stage):
+        order = list(CHECKPOINT_STAGES)
+        return self.latest() is not None and order.index(self.latest()) >= order.index(stage)
+
+
+    """
+    This method saves the state of a completed stage and records it in the manifest.
+    The later stages are dropped, as they no longer follow from it.
+
+    Parameters:
+    :param stage: Stage name, from CHECKPOINT_STAGES
+    :ptype stage: str
+    :param state: Attributes of the application to be saved, keyed on name
+    :ptype state: dict
+    """
+    def save (self, stage, state):
+        try:
+            path = self.stage_path(stage)
+            with open(path + ".tmp", 'wb') as checkpoint_file:
+                pickle.dump(state, checkpoint_file, protocol=PICKLE_PROTOCOL)
+            os.replace(path + ".tmp", path)
+
+            order = list(CHECKPOINT_STAGES)
+            self.stages = [s for s in self.stages if order.index(s) < order.index(stage)] + [stage]
+            self.write_manifest()
+
+            self.logger.info("CheckpointStore::save: {} ({:.1f} MB)".format(stage, os.path.getsize(path) / (1024 * 1024)))
+
+        except Exception as e:
+            self.logger.error("CheckpointStore::save: Exception: " + str(e))
+            raise e
+
+
+    """
+    This method loads the state saved by a stage.
+
+    Parameters:
+    :param stage: Stage name, from CHECKPOINT_STAGES
+    :ptype stage: str
+    """
+    def load (self, stage):
+        try:
+            with open(self.stage_path(stage), 'rb') as checkpoint_file:
+                return pickle.load(checkpoint_file)
+
+        except Exception as e:
+            self.logger.error("CheckpointStore::load: Exception: " + str(e))
+            raise e
+
+
+    """
+    This method removes all the checkpoints and starts an empty manifest.
+    """
+    def clear (self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+        self.stages = []
+        self.write_manifest()
+
+
+    """
+    This method returns the path of the checkpoint of a stage.
+
+    Parameters:
+    :param stage: Stage name, from CHECKPOINT_STAGES
+    :ptype stage: str
+    """
+    def stage_path (self, stage):
+        return os.path.join(self.directory, stage + ".pkl")
+
+
+    """
+    This method returns the manifest of the checkpoint directory, empty when there is none.
+    """
+    def read_manifest (self):
+        path = os.path.join(self.directory, "manifest.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r') as manifest_file:
+            return json.load(manifest_file)
+
+
+    """
+    This method writes the manifest, through a temporary file renamed into place.
+    """
+    def write_manifest (self):
+        path = os.path.join(self.directory, "manifest.json")
+        with open(path + ".tmp", 'w') as manifest_file:
+            json.dump({"key": self.key, "stages": self.stages}, manifest_file, indent=4)
+        os.replace(path + ".tmp", path)
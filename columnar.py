@@ -0,0 +1,174 @@
+"""
+Columnar engine for Cortex2JStore
+
+Loads both exports into DataFrames and runs the match, combine and standardize
+stages as whole-column operations instead of row by row loops.
+"""
+
+# import the required modules
+from plan import CORTEX_KEY
+from plan import JSTORE_KEY
+from matching import MatchIndex
+from matching import MatchReport
+from vocabulary import RECORD_COLUMN
+from vocabulary import SUBJECTS_COLUMN
+from vocabulary import Vocabulary
+import readers
+import pandas as pd
+
+# Prefix given to the Cortex columns while they are merged into the JStore frame,
+# so that they can never collide with a JStore column name.
+CORTEX_PREFIX = "__cortex__"
+
+
+class ColumnarEngine:
+
+    """
+    Constructor
+
+    Parameters:
+    :param logger: Logger object
+    :ptype logger: logging.Logger
+    :param clean_header: Function returning the cleaned up name of a raw Cortex column
+    :ptype clean_header: callable
+    """
+    def __init__(self, logger, clean_header):
+        self.logger = logger # Logger object
+        self.clean_header = clean_header # Cortex header cleanup
+        self.cortex = None # Cortex data frame
+        self.jstore = None # JStore data frame
+        self.final_jstore = None # Final JStore data frame
+
+
+    """
+    This method loads the raw files into data frames.
+
+    Parameters:
+    :param cortex_path: Path to the raw Cortex file (csv, xls or xlsx)
+    :ptype cortex_path: str
+    :param jstore_path: Path to the raw JStore file (xls, xlsx or csv)
+    :ptype jstore_path: str
+    """
+    def load (self, cortex_path, jstore_path):
+        try:
+            self.logger.info("ColumnarEngine::load")
+
+            # Every Cortex CSV cell is kept as a string, exactly like the CSV reader does
+            if readers.is_path(cortex_path) and readers.detect_format(cortex_path) == "csv":
+                self.cortex = pd.read_csv(cortex_path, dtype=str, keep_default_na=False, encoding="utf-8")
+            else:
+                headers, rows = readers.open_reader(cortex_path)
+                self.cortex = pd.DataFrame(list(rows), columns=list(headers), dtype=object)
+            self.cortex.columns = [self.clean_header(c) for c in self.cortex.columns]
+
+            # The JStore rows are read with the same readers as the row engine, keeping the cell values as they are
+            headers, rows = readers.open_reader(jstore_path)
+            self.jstore = pd.DataFrame(list(rows), columns=list(headers), dtype=object)
+
+            self.logger.info("ColumnarEngine::load: " + str(len(self.cortex)) + " Cortex rows, " + str(len(self.jstore)) + " JStore rows")
+
+        except Exception as e:
+            self.logger.error("ColumnarEngine::load: Exception: " + str(e))
+            raise e
+
+
+    """
+    This method returns the match report of the exact join, the same report the row
+    engine writes with --match exact.
+    """
+    def match_report (self):
+        keys = self.jstore[JSTORE_KEY]
+        cortex_keys = self.cortex[CORTEX_KEY]
+
+        report = MatchReport(MatchIndex())
+        for key, found in zip(keys, keys.isin(cortex_keys)):
+            report.add(key, "exact" if found else None, [key] if found else [])
+
+        # Rows past the first one of every duplicated key, counted in order of first duplication
+        repeated = cortex_keys[cortex_keys.duplicated()]
+        duplicates = {key: int(count) + 1 for key, count in repeated.value_counts(sort=False).items()}
+
+        return report.to_dict("exact", duplicates)
+
+
+    """
+    This method joins JStore with Cortex on "Filename" = "Original File Name" and fills
+    the empty JStore cells from the mapped Cortex columns.
+    When several Cortex rows share a file name the last one wins, like in the row engine.
+
+    Parameters:
+    :param plan: Column plan compiled against the headers of the data frames
+    :ptype plan: ColumnPlan
+    """
+    def combine (self, plan):
+        try:
+            self.logger.info("ColumnarEngine::combine")
+
+            cortex_columns = [c for c in dict.fromkeys(v for k, v in plan.fill) if c != CORTEX_KEY]
+            cortex = self.cortex.drop_duplicates(CORTEX_KEY, keep="last")
+            cortex = cortex[[CORTEX_KEY] + cortex_columns]
+            cortex.columns = [CORTEX_PREFIX + c for c in cortex.columns]
+
+            # An inner merge keeps the order of the JStore rows
+            merged = self.jstore.merge(cortex, how="inner", left_on=JSTORE_KEY, right_on=CORTEX_PREFIX + CORTEX_KEY)
+
+            for k, v in plan.fill:
+                merged[k] = merged[k].mask(merged[k] == "", merged[CORTEX_PREFIX + v])
+
+            self.final_jstore = merged[list(self.jstore.columns)].reset_index(drop=True)
+
+        except Exception as e:
+            self.logger.error("ColumnarEngine::combine: Exception: " + str(e))
+            raise e
+
+
+    """
+    This method converts the schema columns to the format required by JStore.
+    The transform chain of a column runs once per distinct value and the results
+    are mapped back onto the column.
+
+    Parameters:
+    :param plan: Column plan compiled against the headers of the data frames
+    :ptype plan: ColumnPlan
+    """
+    def standardize (self, plan):
+        try:
+            self.logger.info("ColumnarEngine::standardize")
+
+            for k, transforms in plan.transforms:
+                column = self.final_jstore[k]
+                mapping = {v: plan.apply(transforms, v) for v in column.unique()}
+                self.final_jstore[k] = column.map(mapping).astype(object)
+
+        except Exception as e:
+            self.logger.error("ColumnarEngine::standardize: Exception: " + str(e))
+            raise e
+
+
+    """
+    This method returns the local subjects vocabulary of the standardized data.
+    The subjects are exploded into one row each and counted with a single group by,
+    keeping the first-seen order.
+    """
+    def local_subjects (self):
+        vocabulary = Vocabulary()
+        if SUBJECTS_COLUMN not in self.final_jstore.columns:
+            return vocabulary
+
+        subjects = pd.DataFrame({
+            "subject": self.final_jstore[SUBJECTS_COLUMN].str.split("|"),
+            "record": self.final_jstore[RECORD_COLUMN] if RECORD_COLUMN in self.final_jstore.columns else None,
+        }).explode("subject").dropna(subset=["subject"])
+
+        counts = subjects.groupby("subject", sort=False)["record"].agg(["size", "first"])
+        for subject, count, record in counts.itertuples():
+            vocabulary.add(subject, int(count), record)
+
+        return vocabulary
+
+
+    """
+    This method returns the standardized data as a list of dictionaries.
+    """
+    def records (self):
+        return self.final_jstore.to_dict("records")
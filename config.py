@@ -25,7 +25,22 @@ match_columns = {
     # Add more columns here
 }
 
+# Configure the JStore columns to be standardized
+# NOTE: The key is the JStore column name and the value is the list of transforms
+# applied to it, in this order. See standardize.TRANSFORMS.
+
 jstore_schema_columns = {
-    "Vanderbilt Local Subjects[2083876]",
-    "Vanderbilt People[2083840]",
+    "Vanderbilt Local Subjects[2083876]": ["comma_replace_pipe"],
+    "Vanderbilt People[2083840]": ["comma_replace_pipe", "standardize_vanderbilt_people"],
+
+    # Add more columns here
 }
+
+# Key normalizers applied to "Filename" and "Original File Name" by the normalized
+# and fuzzy matching passes (--match), in this order. See matching.NORMALIZERS.
+match_normalizers = [
+    "strip_whitespace",
+    "basename",
+    "casefold",
+    "strip_extension",
+]
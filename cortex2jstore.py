@@ -6,15 +6,66 @@ Date: 04/07/2023
 
 # import the required modules
 from config import match_columns
-from config import jstore_schema_columns
+from config import match_normalizers
+from plan import CORTEX_KEY
+import plan
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+import standardize
+import readers
+import functools
+import writers
+from metrics import Instrumentation
+from metrics import instrumented
+from metrics import count_rows
+from matching import MatchIndex
+from matching import MatchReport
+from matching import MATCH_MODES
+from cache import save_caches
+from state import StateStore
+from state import CORTEX_IDENTIFIER
+from state import fingerprint
+from checkpoint import CheckpointStore
+from checkpoint import CHECKPOINT_STAGES
+from spill import SpillIndex
+import spill
+from pipeline import Pipeline
+import itertools
+from vocabulary import Vocabulary
+from vocabulary import VocabularyStore
+import batch
 import logging
 import argparse
-import csv
-import xlrd
-import json
-import time
-import pandas as pd
-import openpyxl
+import os
+
+# Inputs smaller than this are standardized serially even when workers are requested
+PARALLEL_MIN_ROWS = 10000
+
+# Number of chunks handed to each worker process
+PARALLEL_CHUNKS_PER_WORKER = 4
+
+# JStore rows per chunk passed between the stages of the pipeline mode, and chunks per queue
+PIPELINE_CHUNK_ROWS = 1000
+PIPELINE_QUEUE_SIZE = 8
+
+# JSON stage snapshots, in pipeline order, and the files they are exported to under the output directory.
+# finaljstore.xlsx and localsubjects.xlsx are the deliverables and are always written.
+ARTIFACTS = {
+    "jstore": "jstore.json", # raw JStore rows
+    "cortex": "cortex.json", # cleaned up Cortex rows
+    "matches": "matches.json", # (jstore, cortex) pairs
+    "matchreport": "match_report.json", # unmatched, ambiguous and recovered matches
+    "combined": "combined.json", # pairs after the Cortex data was merged into JStore
+    "nsjstore": "nsjstore.json", # combined JStore rows, not yet standardized
+    "finaljstore": "finaljstore.json", # standardized JStore rows
+    "delta": "finaljstore.delta.json", # rows changed since the previous incremental run
+    "removed": "finaljstore.removed.json", # file names gone since the previous incremental run
+    "localsubjects": "localsubjects.json", # unique local subjects, in first-seen order
+    "vocabulary": "vocabulary.json", # local subjects with their counts, first-seen records and normalized forms
+}
+
+# Snapshots exported with --artifacts final
+FINAL_ARTIFACTS = ("matchreport", "finaljstore", "delta", "removed", "localsubjects", "vocabulary")
 
 class Cortex2JStore:
         
@@ -26,6 +77,35 @@ class Cortex2JStore:
         self.cortex = None # Cortex data
         self.jstore = None # JStore data
         self.matches = None # Matches between Cortex and JStore
+        self.schemas = {} # Column map per source (cortex, jstore): the schema of its rows, with the index of every column
+        self.plan = None # Column plan compiled from config.py against the headers
+        self.jstore_rows = None # JStore rows, read one at a time by the stream driver
+        self.stream = False # Stream JStore rows through the pipeline
+        self.pipeline = False # Run the stream mode as concurrent stages
+        self.cortex_index = None # Index of the Cortex rows keyed on "Original File Name"
+        self.join = "memory" # Where the Cortex index of the stream mode is kept: memory or disk
+        self.memory_budget = None # Memory the rows of the exports may take, in MB
+        self.match_report = None # Unmatched, ambiguous and recovered matches
+        self.match_mode = "exact" # Matching passes to run
+        self.match_distance = 2 # Largest edit distance of the fuzzy pass
+        self.engine = "row" # Engine running the match, combine and standardize stages
+        self.columnar = None # Columnar engine (columnar mode)
+        self.workers = 1 # Number of worker processes used for standardization
+        self.read_workers = 1 # Number of worker processes parsing a large CSV export
+        self.cache_size = standardize.DEFAULT_CACHE_SIZE # Entries per transform cache
+        self.cache_file = None # File the transform caches are persisted to
+        self.state = None # State store of the incremental mode
+        self.json_format = "pretty" # Format of the JSON exports
+        self.artifacts = set(ARTIFACTS) # Stage snapshots to be exported
+        self.metrics = Instrumentation(logger) # Per-stage timing, memory and throughput
+        self.output_dir = "output" # Directory the results are written to
+        self.shared_cache = False # The cache file is shared by a batch, which saves it
+        self.warm_caches = False # The transform caches of the earlier runs in this process are kept (server)
+        self.xlsx_split = "sheet" # Where the XLSX rows continue past Excel's row limit
+        self.vocabulary = Vocabulary() # Local subjects vocabulary, filled during standardization
+        self.vocabulary_store = None # Store the vocabulary is saved to
+        self.vocabulary_name = None # Name the vocabulary is saved under
+        self.checkpoints = None # Stage checkpoints of the batch driver
     
     """
     Configure
@@ -47,9 +127,88 @@ class Cortex2JStore:
                 'matches': self.matches
             }
 
-            # Convert the raw files to internal data structures
-            self.raw2data(path = args.cortex_raw, type = "csv", target = "cortex", is_2bexported = False)
-            self.raw2data(path = args.jstore_raw, type = "xls", target = "jstore", is_2bexported = True)
+            self.output_dir = args.output_dir
+            os.makedirs(self.output_dir, exist_ok=True)
+
+            # Profiling and memory tracing must be set up before the first stage runs
+            self.metrics.configure(profile_dir = self.output_path('profile') if args.profile else None, trace_memory = args.trace_memory)
+
+            self.workers = args.workers
+            self.read_workers = args.read_workers
+            self.json_format = args.json_format
+            self.xlsx_split = args.xlsx_split
+            self.match_mode = args.match
+            self.match_distance = args.match_distance
+            self.artifacts = parse_artifacts(args.artifacts)
+
+            # Warm up the name and comma transform caches, unless they are still warm from an earlier run
+            self.cache_size = args.cache_size
+            self.cache_file = args.cache_file
+            if not self.warm_caches:
+                standardize.configure_caches(size = self.cache_size, path = self.cache_file)
+
+            # The vocabulary is saved under the name of the JStore export unless named,
+            # rows given in memory have no file name
+            if args.vocabulary:
+                self.vocabulary_store = VocabularyStore(args.vocabulary, self.logger).open()
+                self.vocabulary_name = args.vocabulary_name or (os.path.splitext(os.path.basename(args.jstore_raw))[0] if readers.is_path(args.jstore_raw) else "jstore")
+
+            # The incremental mode keeps the fingerprints of the previous run in a state store.
+            # Only the batch driver merges incrementally, the other modes would ignore it.
+            if args.incremental:
+                if args.engine == "columnar" or args.stream or args.pipeline:
+                    raise Exception("--incremental requires the row engine without --stream or --pipeline")
+                self.state = StateStore(args.incremental, self.logger)
+                self.state.open()
+
+            # Exports too large for the memory budget are streamed against a Cortex index on disk
+            self.engine = args.engine
+            if self.engine == "columnar" and self.match_mode != "exact":
+                raise Exception("--engine columnar joins on the exact file name, --match " + self.match_mode + " requires the row engine")
+            self.pipeline = args.pipeline
+            self.stream = args.stream or self.pipeline
+            self.memory_budget = args.memory_budget
+            self.choose_join(args)
+
+            # Checkpoints hold the in-memory state of the batch driver, which the other modes do not build
+            if args.checkpoint or args.resume:
+                if self.engine == "columnar" or self.stream:
+                    raise Exception("--checkpoint and --resume require the row engine without --stream or --pipeline")
+                self.checkpoints = CheckpointStore(self.output_path("checkpoints"), self.logger)
+                self.checkpoints.open(inputs = [args.cortex_raw, args.jstore_raw], settings = [self.match_mode, self.match_distance], resume = args.resume)
+
+                # Continue from the last completed stage, the raw exports are not read again
+                if self.checkpoints.resumed_after is not None:
+                    self.restore_checkpoint(self.checkpoints.resumed_after)
+                    self.compile_plan(self.schemas["jstore"].columns, self.schemas["cortex"].columns)
+                    return
+
+            # The columnar engine loads both sides into data frames
+            if self.engine == "columnar":
+                # pandas is only imported by the columnar engine, it slows down the start of the others
+                from columnar import ColumnarEngine
+                self.columnar = ColumnarEngine(self.logger, self.clean_cortex_header)
+                self.columnar.load(cortex_path = args.cortex_raw, jstore_path = args.jstore_raw)
+                self.compile_plan(self.columnar.jstore.columns, self.columnar.cortex.columns)
+                return
+
+            # In stream mode only the Cortex lookup is kept, in memory or on disk,
+            # the JStore rows are read one at a time by the driver.
+            if self.stream:
+                self.build_cortex_index(path = args.cortex_raw, type = None)
+                self.schemas["jstore"], self.jstore_rows = readers.open_records(args.jstore_raw, workers = self.read_workers)
+                self.compile_plan(self.schemas["jstore"].columns, self.schemas["cortex"].columns)
+                return
+
+            # Convert the raw files to internal data structures. Both exports are read
+            # concurrently, except under cProfile which profiles a single thread.
+            with ThreadPoolExecutor(max_workers = 1 if args.profile else 2) as executor:
+                cortex = executor.submit(self.raw2data, path = args.cortex_raw, type = None, target = "cortex", is_2bexported = False)
+                jstore = executor.submit(self.raw2data, path = args.jstore_raw, type = None, target = "jstore", is_2bexported = True)
+                cortex.result()
+                jstore.result()
+            self.compile_plan(self.schemas["jstore"].columns, self.schemas["cortex"].columns)
+            self.save_checkpoint("loaded")
 
         except Exception as e:
             self.logger.error("Cortex2JStore::configure: Exception: " + str(e))
@@ -65,92 +224,571 @@ class Cortex2JStore:
 
             # dump the configuration
             self.dump ()  
-                        
-            # Clean up and export the Cortex data
-            self.cortex_cleanup()
-            self.export_data(data = self.cortex, path = 'output/cortex.json', type = 'json')
-            
-            # Find the matches
-            self.find_matches()
-            self.export_data(data = self.matches, path = 'output/matches.json', type = 'json')
 
+            if self.engine == "columnar":
+                self.columnar_driver()
+
+            elif self.pipeline:
+                self.pipeline_driver()
+
+            elif self.stream:
+                self.stream_driver()
+
+            else:
+                self.batch_driver()
+
+            self.report_caches()
+            self.metrics.report(self.output_path('metrics.json'))
+
+            if self.state is not None:
+                self.state.close()
+
+            if self.vocabulary_store is not None:
+                self.vocabulary_store.close()
+
+        except Exception as e:
+            self.logger.error("Cortex2JStore::driver: Exception: " + str(e))
+            raise e
+    
+
+    """
+    Batch driver method
+
+    Runs every stage as a full pass over the data and exports the intermediate snapshots.
+    """
+    def batch_driver (self):
+        try:
+            self.logger.info("Cortex2JStore::batch_driver")
+
+            # Stages completed by the run being resumed are skipped
+            if not self.resumed("matched"):
+                # Export the Cortex data, its header was cleaned up while it was read
+                self.export_artifact("cortex", self.cortex)
+
+                # Find the matches
+                self.find_matches()
+                self.export_artifact("matches", self.matches)
+                self.save_checkpoint("matched")
+
+            if not self.resumed("standardized"):
+                # In incremental mode only the changed matches are combined and standardized
+                if self.state is not None:
+                    self.incremental_merge()
+                    self.export_artifact("finaljstore", self.final_jstore)
+
+                else:
+                    self.merge_and_standardize()
+                self.save_checkpoint("standardized")
+
+            # Export the local subjects list
+            self.export_local_subjects()
+
+            # Export the final JStore data in XLSX format
+            self.export_data(data = self.final_jstore, path = self.output_path('finaljstore.xlsx'), type = 'xlsx')
+
+        except Exception as e:
+            self.logger.error("Cortex2JStore::batch_driver: Exception: " + str(e))
+            raise e
+    
+
+    """
+    This method chooses where the join runs from --join and the memory estimated for
+    the rows of the exports. With auto, the row engine switches to stream mode when
+    both exports exceed the budget, unless the incremental mode or checkpoints need
+    the full data, and the Cortex index is spilled to disk when Cortex alone exceeds it.
+
+    Parameters:
+    :param args: Command line arguments
+    :ptype args: argparse.Namespace
+    """
+    def choose_join (self, args):
+        try:
+            full_data = args.incremental or args.checkpoint or args.resume
+            if args.join == "disk":
+                if self.engine == "columnar" or full_data:
+                    raise Exception("--join disk streams the rows and cannot run with the columnar engine, --incremental or --checkpoint")
+                self.stream = True
+                self.join = "disk"
+                return
+
+            self.join = "memory"
+            if args.join == "memory" or self.engine == "columnar":
+                return
+
+            cortex_mb = spill.estimate_memory(args.cortex_raw)
+            jstore_mb = spill.estimate_memory(args.jstore_raw)
+
+            if not self.stream and cortex_mb + jstore_mb > self.memory_budget:
+                if full_data:
+                    self.logger.warning("Cortex2JStore::choose_join: the exports need about {:.0f} MB of the {} MB budget, not streamed with --incremental or --checkpoint".format(cortex_mb + jstore_mb, self.memory_budget))
+                else:
+                    self.logger.info("Cortex2JStore::choose_join: the exports need about {:.0f} MB of the {} MB budget, switching to stream mode".format(cortex_mb + jstore_mb, self.memory_budget))
+                    self.stream = True
+
+            if self.stream and cortex_mb > self.memory_budget:
+                self.logger.info("Cortex2JStore::choose_join: Cortex needs about {:.0f} MB of the {} MB budget, joining on disk".format(cortex_mb, self.memory_budget))
+                self.join = "disk"
+
+        except Exception as e:
+            self.logger.error("Cortex2JStore::choose_join: Exception: " + str(e))
+            raise e
+
+
+    """
+    This method saves the state of a completed stage, when checkpoints are enabled.
+
+    Parameters:
+    :param stage: Stage name, from CHECKPOINT_STAGES
+    :ptype stage: str
+    """
+    def save_checkpoint (self, stage):
+        if self.checkpoints is not None:
+            self.checkpoints.save(stage, {name: getattr(self, name) for name in CHECKPOINT_STAGES[stage]})
+
+
+    """
+    This method restores the state saved by a completed stage.
+
+    Parameters:
+    :param stage: Stage name, from CHECKPOINT_STAGES
+    :ptype stage: str
+    """
+    @instrumented("restore_checkpoint")
+    def restore_checkpoint (self, stage):
+        try:
+            self.logger.info("Cortex2JStore::restore_checkpoint: resuming after " + stage)
+
+            for name, value in self.checkpoints.load(stage).items():
+                setattr(self, name, value)
+
+        except Exception as e:
+            self.logger.error("Cortex2JStore::restore_checkpoint: Exception: " + str(e))
+            raise e
+
+
+    """
+    This method returns True when the stage was completed by the run being resumed.
+
+    Parameters:
+    :param stage: Stage name, from CHECKPOINT_STAGES
+    :ptype stage: str
+    """
+    def resumed (self, stage):
+        return self.checkpoints is not None and self.checkpoints.reached(stage)
+
+
+    """
+    This method combines all the matches and standardizes the result, exporting the intermediate snapshots.
+    """
+    def merge_and_standardize (self):
+        try:
             # Combine the matches
             self.combine_matches()
-            self.export_data(data = self.matches, path = 'output/combined.json', type = 'json')
+            self.export_artifact("combined", self.matches)
 
             # Remove the cortex data from the combined matches
             # The result of this operation will be the final JStore data that 
             # needs to be standardized according to JStore schema requirements.
             self.remove_cortex_data()
-            self.export_data(data = self.final_jstore, path = 'output/nsjstore.json', type='json')
+            self.export_artifact("nsjstore", self.final_jstore)
 
             self.standardize_jstore()
-            self.export_data(data = self.final_jstore, path = 'output/finaljstore.json', type='json')
+            self.export_artifact("finaljstore", self.final_jstore)
+
+        except Exception as e:
+            self.logger.error("Cortex2JStore::merge_and_standardize: Exception: " + str(e))
+            raise e
+    
+
+    """
+    This method merges and standardizes only the matches whose JStore row or Cortex record
+    changed since the previous run, and rebuilds the full snapshot from the state store.
+    The changed rows are exported to finaljstore.delta.json and the file names no longer
+    present in the JStore export to finaljstore.removed.json.
+    """
+    @instrumented("incremental_merge", rows_in = lambda self: len(self.matches), rows_out = lambda self, result: len(self.final_jstore))
+    def incremental_merge (self):
+        try:
+            self.logger.info("Cortex2JStore::incremental_merge")
+
+            # Fingerprint the Cortex records, keyed on their identifier. The records sharing an
+            # identifier are folded into one fingerprint, so a change to any of them is seen.
+            cortex_fingerprints = {}
+            for c in self.cortex:
+                key = c.get(CORTEX_IDENTIFIER) or c["Original File Name"]
+                fp = self.state.cortex_fingerprint(c)
+                cortex_fingerprints[key] = fingerprint([cortex_fingerprints[key], fp]) if key in cortex_fingerprints else fp
+            changed_cortex = self.state.update_cortex(cortex_fingerprints)
+
+            # Split the matches into unchanged ones and the ones to be merged again.
+            # positions holds, for every match, its index in changed or None when it is unchanged.
+            previous = self.state.jstore_fingerprints()
+            changed = []
+            changed_fingerprints = []
+            positions = []
+
+            for j, c in self.matches:
+                fp = self.state.match_fingerprint(j, cortex_fingerprints[c.get(CORTEX_IDENTIFIER) or c["Original File Name"]])
+                if previous.get(j["Filename"]) == fp:
+                    positions.append(None)
+                    continue
+
+                positions.append(len(changed))
+                changed_fingerprints.append((j["Filename"], fp))
+                changed.append(self.combine_row(j, c))
+            
+            self.logger.info("Cortex2JStore::incremental_merge: {} changed Cortex records, {} of {} matches to be merged".format(
+                changed_cortex, len(changed), len(self.matches)))
+
+            # Standardize the changed rows only, with the worker pool when it pays off
+            self.final_jstore = changed
+            self.standardize_jstore()
+            changed = self.final_jstore
+
+            # Rebuild the full snapshot in JStore order from the changed rows and the cached outputs
+            cached = self.state.outputs([j["Filename"] for (j, c), p in zip(self.matches, positions) if p is None])
+            self.final_jstore = [cached[j["Filename"]] if p is None else changed[p] for (j, c), p in zip(self.matches, positions)]
+
+            # The cached rows are not standardized again, the vocabulary is rebuilt from the snapshot
+            self.vocabulary = Vocabulary()
+            for row in self.final_jstore:
+                self.vocabulary.add_row(row)
+
+            current = set(j["Filename"] for j, c in self.matches)
+            removed = [f for f in previous if f not in current]
+
+            self.export_artifact("delta", changed)
+            self.export_artifact("removed", removed)
+
+            self.state.commit(changed = [(f, fp, row) for (f, fp), row in zip(changed_fingerprints, changed)], removed = removed)
+
+        except Exception as e:
+            self.logger.error("Cortex2JStore::incremental_merge: Exception: " + str(e))
+            raise e
+    
+
+    """
+    This method logs the hit, miss and eviction counters of the transform caches
+    and saves them to the cache file, if one was given.
+    """
+    def report_caches (self):
+        try:
+            for name, stats in standardize.cache_stats().items():
+                self.logger.info("Cortex2JStore::report_caches: {}: hits={} misses={} evictions={} size={}/{} hit rate={:.1%}".format(
+                    name, stats["hits"], stats["misses"], stats["evictions"], stats["size"], stats["maxsize"], stats["hit_rate"]))
+
+            if self.cache_file and not self.shared_cache:
+                save_caches(standardize.caches, self.cache_file)
+                self.logger.info("Cortex2JStore::report_caches: caches saved to " + self.cache_file)
+
+        except Exception as e:
+            self.logger.error("Cortex2JStore::report_caches: Exception: " + str(e))
+            raise e
+    
+
+    """
+    Columnar driver method
+
+    Runs the match, combine and standardize stages as column operations on data frames.
+    The matches, combined and nsjstore snapshots have no equivalent in this mode.
+    """
+    @instrumented("columnar_driver", rows_out = lambda self, result: len(self.columnar.final_jstore))
+    def columnar_driver (self):
+        try:
+            self.logger.info("Cortex2JStore::columnar_driver")
+
+            # The data frames are only converted to rows when their snapshot is requested
+            self.export_artifact("jstore", lambda: self.columnar.jstore.to_dict("records"))
+            self.export_artifact("cortex", lambda: self.columnar.cortex.to_dict("records"))
+            self.log_match_report()
+
+            self.columnar.combine(self.plan)
+            self.columnar.standardize(self.plan)
+
+            self.export_artifact("finaljstore", self.columnar.records)
 
             # Export the local subjects list
-            uniquelocalsubjects = self.getlocalsubjectslist()
-            list_uniquelocalsubjects = list(uniquelocalsubjects)
-            self.export_data(data = list_uniquelocalsubjects, path = 'output/localsubjects.json', type='json')
-            df = pd.DataFrame(list_uniquelocalsubjects, columns=["Local Subjects"])
-            df.to_excel("output/localsubjects.xlsx", index=False)
+            self.vocabulary = self.columnar.local_subjects()
+            self.export_local_subjects()
 
             # Export the final JStore data in XLSX format
-            self.export_data(data = self.final_jstore, path = 'output/finaljstore.xlsx', type = 'xlsx')
+            self.export_data(data = self.columnar.final_jstore.itertuples(index=False, name=None), path = self.output_path('finaljstore.xlsx'), type = 'xlsx', columns = self.columnar.final_jstore.columns)
 
         except Exception as e:
-            self.logger.error("Cortex2JStore::driver: Exception: " + str(e))
+            self.logger.error("Cortex2JStore::columnar_driver: Exception: " + str(e))
             raise e
     
 
+    """
+    Stream driver method
+
+    Each JStore row is read, combined with its Cortex match, standardized and written
+    before the next one is read, so the peak memory is bounded by the Cortex lookup.
+    The intermediate JSON snapshots are not produced in this mode.
+    """
+    @instrumented("stream_driver", rows_out = lambda self, count: count)
+    def stream_driver (self):
+        try:
+            self.logger.info("Cortex2JStore::stream_driver")
+
+            count = 0
+
+            json_writer = self.artifact_writer("finaljstore")
+            xlsx_writer = writers.XlsxWriter(self.output_path('finaljstore.xlsx'), split = self.xlsx_split)
+
+            try:
+                for j in self.jstore_rows:
+                    c, method, candidates = self.cortex_index.match(j["Filename"])
+                    self.match_report.add(j["Filename"], method, candidates)
+                    if not c:
+                        continue
+
+                    row = self.standardize_row(self.combine_row(j, c))
+                    self.vocabulary.add_row(row)
+
+                    if json_writer: json_writer.write(row)
+                    xlsx_writer.write(row)
+                    count += 1
+
+            except Exception:
+                if json_writer: json_writer.abort()
+                xlsx_writer.abort()
+                raise
+            
+            if json_writer: json_writer.close()
+            xlsx_writer.close()
+
+            self.logger.info("Cortex2JStore::stream_driver: streamed " + str(count) + " matching rows")
+            self.log_match_report()
+            self.cortex_index.close()
+
+            # Export the local subjects list
+            self.export_local_subjects()
+
+            return count
+
+        except Exception as e:
+            self.logger.error("Cortex2JStore::stream_driver: Exception: " + str(e))
+            raise e
+    
+
+    """
+    Pipeline driver method
+
+    Runs the stream mode as concurrent stages connected by bounded queues: the JStore
+    rows are read, matched and combined, standardized, and written to the JSON and XLSX
+    outputs in chunks, each stage in its own thread. With --workers the chunks are
+    standardized on a process pool, and the queue between the standardize and collect
+    stages bounds the chunks in flight. The outputs are the ones of the stream mode.
+    """
+    @instrumented("pipeline_driver", rows_out = lambda self, count: count)
+    def pipeline_driver (self):
+        try:
+            self.logger.info("Cortex2JStore::pipeline_driver")
+
+            counts = {"rows": 0}
+
+            json_writer = self.artifact_writer("finaljstore")
+            xlsx_writer = writers.XlsxWriter(self.output_path('finaljstore.xlsx'), split = self.xlsx_split)
+            executor = None
+            if self.workers > 1:
+                executor = ProcessPoolExecutor(max_workers=self.workers, initializer=standardize.configure_caches, initargs=(self.cache_size, self.cache_file, True))
+
+            def match_chunk (rows):
+                matched = []
+                for j in rows:
+                    c, method, candidates = self.cortex_index.match(j["Filename"])
+                    self.match_report.add(j["Filename"], method, candidates)
+                    if c:
+                        matched.append(self.combine_row(j, c))
+                return matched
+
+            def standardize_chunk (rows):
+                if executor is None:
+                    return standardize.standardize_rows(rows, self.plan.steps, self.vocabulary)
+                return executor.submit(standardize.standardize_chunk, rows, self.plan.steps, Vocabulary())
+
+            # The results of the workers are collected in chunk order
+            def collect_chunk (future):
+                rows, reports, vocabulary = future.result()
+                self.vocabulary.merge(vocabulary)
+                for name, cache in standardize.caches.items():
+                    cache.merge(reports[name])
+                return rows
+
+            def write_json (rows):
+                for row in rows:
+                    json_writer.write(row)
+
+            def write_xlsx (rows):
+                for row in rows:
+                    xlsx_writer.write(row)
+                counts["rows"] += len(rows)
+
+            try:
+                pipeline = Pipeline(self.logger, PIPELINE_QUEUE_SIZE)
+                chunks = iter(lambda: list(itertools.islice(self.jstore_rows, PIPELINE_CHUNK_ROWS)), [])
+
+                rows = pipeline.stage("match", match_chunk, pipeline.source("read", chunks))
+                rows = pipeline.stage("standardize", standardize_chunk, rows)
+                if executor is not None:
+                    rows = pipeline.stage("collect", collect_chunk, rows)
+
+                if json_writer:
+                    json_rows, rows = pipeline.stage("fan out", lambda rows: rows, rows, outputs = 2)
+                    pipeline.sink("write json", write_json, json_rows)
+                pipeline.sink("write xlsx", write_xlsx, rows)
+
+                pipeline.join()
+
+            except Exception:
+                if json_writer: json_writer.abort()
+                xlsx_writer.abort()
+                raise
+
+            finally:
+                if executor is not None:
+                    executor.shutdown(cancel_futures=True)
+
+            if json_writer: json_writer.close()
+            xlsx_writer.close()
+
+            self.logger.info("Cortex2JStore::pipeline_driver: streamed " + str(counts["rows"]) + " matching rows")
+            self.log_match_report()
+            self.cortex_index.close()
+
+            # Export the local subjects list
+            self.export_local_subjects()
+
+            return counts["rows"]
+
+        except Exception as e:
+            self.logger.error("Cortex2JStore::pipeline_driver: Exception: " + str(e))
+            raise e
+    
+
+    """
+    This method builds the Cortex lookup keyed on "Original File Name" used in stream mode.
+    Only "Original File Name" and the columns referenced by config.match_columns are kept
+    for each row, schemas["cortex"] is the schema of the kept columns. With --join disk
+    the lookup is a SQLite file in the output directory, removed at the end of the run.
+
+    Parameters:
+    :param path: Path to the raw Cortex file
+    :ptype path: str
+    :param type: Type of the raw file
+    :ptype type: str
+    """
+    @instrumented("build_cortex_index", rows_out = lambda self, result: len(self.cortex_index))
+    def build_cortex_index (self, path, type = None):
+        try:
+            self.logger.info("Cortex2JStore::build_cortex_index")
+
+            self.cortex_index = self.new_match_index()
+            cortex_columns = frozenset(match_columns.values()) | {CORTEX_KEY}
+
+            schema, rows = readers.open_records(path, type, self.clean_cortex_header, self.read_workers)
+            self.schemas["cortex"] = schema.projected(cortex_columns)
+            for row in rows:
+                self.cortex_index.add(row["Original File Name"], row.project(cortex_columns))
+            self.cortex_index.finish()
+            
+            self.logger.info("Cortex2JStore::build_cortex_index: indexed " + str(len(self.cortex_index)) + " Cortex rows")
+
+        except Exception as e:
+            self.logger.error("Cortex2JStore::build_cortex_index: Exception: " + str(e))
+            raise e
+    
+
+    @instrumented("find_matches", rows_in = lambda self: len(self.jstore), rows_out = lambda self, result: len(self.matches))
     def find_matches(self):
         try:
             self.logger.info("Cortex2JStore::find_matches: Finding matches between Cortex and JStore")
 
-            start_time = time.time()
-
-            # Create a dictionary of "Original File Name" values from cortex
-            cortex_dict = {c["Original File Name"]: c for c in self.cortex}
+            # Create an index of "Original File Name" values from cortex
+            self.cortex_index = self.new_match_index()
+            for c in self.cortex:
+                self.cortex_index.add(c["Original File Name"], c)
 
-            # Iterate over jstore and check for matches with cortex_dict
+            # Iterate over jstore and check for matches with the index
             for j in self.jstore:
-                c = cortex_dict.get(j["Filename"])
+                c, method, candidates = self.cortex_index.match(j["Filename"])
+                self.match_report.add(j["Filename"], method, candidates)
                 if c:
                     self.matches.append((j, c))
             
-            end_time = time.time()
-
-            self.logger.info("Matches alogrithm took : " + str(end_time - start_time) + " seconds")
+            self.log_match_report()
         
         except Exception as e:
             self.logger.error("Cortex2JStore::find_matches: Exception: " + str(e))
             raise e
     
 
+    """
+    This method returns an empty index of the Cortex rows, set up for the --match mode.
+    """
+    def new_match_index (self):
+        if self.join == "disk":
+            index = SpillIndex(self.output_path("cortex_index.db"), mode = self.match_mode, normalizers = match_normalizers, max_distance = self.match_distance)
+        else:
+            index = MatchIndex(mode = self.match_mode, normalizers = match_normalizers, max_distance = self.match_distance)
+        self.match_report = MatchReport(index)
+        return index
+    
+
+    """
+    This method returns the match report of the run as a dictionary, or None before matching.
+    """
+    def match_summary (self):
+        if self.engine == "columnar":
+            return self.columnar.match_report() if self.columnar is not None else None
+        if self.match_report is None or self.cortex_index is None:
+            return None
+        return self.match_report.to_dict(self.cortex_index.mode, self.cortex_index.duplicates)
+
+
+    """
+    This method logs the outcome of the matching and exports the match report.
+    """
+    def log_match_report (self):
+        report = self.match_summary()
+        self.logger.info("Cortex2JStore::find_matches: matched {}, unmatched {}, ambiguous {}".format(
+            report["matched"], report["unmatched_count"], report["ambiguous_count"]))
+        self.export_artifact("matchreport", report)
+
+
+    @instrumented("combine_matches", rows_in = lambda self: len(self.matches), rows_out = lambda self, result: len(self.matches))
     def combine_matches (self):
         try:
             self.logger.info("Cortex2Jstore::combine_matches: Combining matches")
 
             # Iterator over the matching records
             for match in self.matches:
-                
-                # Iterate over the match_columns dictionary
-                # and update the jstore with cortex column data.
-                for k, v in match_columns.items():
-                    
-                    # Check if the value is empty in the jstore data, 
-                    # as we do not want to overwrite the existing data.
-                    # with cortex data
-                    if match[0][k] == "":
-                        match[0][k] = match[1][v]
+                self.combine_row(match[0], match[1])
         
         except Exception as e:
             self.logger.error("Cortex2Jstore::combine_matches: Exception: " + str(e))
             raise e
     
 
+    """
+    This method updates a single JStore row with the data of its matching Cortex row.
+    The mapped columns are filled by position, as compiled in the column plan.
+
+    Parameters:
+    :param jstore_row: JStore row to be updated
+    :ptype jstore_row: Record
+    :param cortex_row: Matching Cortex row
+    :ptype cortex_row: Record
+    """
+    def combine_row (self, jstore_row, cortex_row):
+        return self.plan.combine(jstore_row, cortex_row)
+    
+
     """
     This method is used to remove the cortex data from the combined matches.
     """
+    @instrumented("remove_cortex_data", rows_in = lambda self: len(self.matches), rows_out = lambda self, result: len(self.final_jstore))
     def remove_cortex_data (self):
         try:
             self.logger.info("Cortex2Jstore::remove_cortex_data: Removing cortex data from combined matches")
@@ -168,36 +806,52 @@ class Cortex2JStore:
 
     """
     This method is used to convert the final data to the required schema format by JStore.
-    We go through each column that needed to be reformatted according to JStore schema.
-    We defined these columns in the config file.
+    Only the columns defined in the config file are visited, each one with its chain of
+    transforms, as compiled in the column plan.
     """
+    @instrumented("standardize_jstore", rows_in = lambda self: len(self.final_jstore), rows_out = lambda self, result: len(self.final_jstore))
     def standardize_jstore (self):
         try:
             self.logger.info("Cortex2Jstore::standardize_jstore: Standardizing JStore data")
 
-            for row in self.final_jstore:
-                for k, v in row.items():
-                    
-                    # Select columns to be reformatted
-                    if k in jstore_schema_columns:
-                        """
-                        Setup the pipeline 
-                        """
-
-                        # Replace commas with pipes
-                        row[k] = self.comma_replace_pipe(v)
-
-                        # If the key is "Vanderbilt People[2083840]"
-                        # then we need to standardize the naming convention <LastName, FirstName + Extra>
-                        if k == "Vanderbilt People[2083840]":
-                            row[k] = self.standardize_vanderbilt_people(row[k])
-                            # self.standardize_vanderbilt_people(row[k])
+            # Small inputs are standardized serially, as pickling the rows
+            # to the worker processes would cost more than it saves.
+            if self.workers < 2 or len(self.final_jstore) < PARALLEL_MIN_ROWS:
+                standardize.standardize_rows(self.final_jstore, self.plan.steps, self.vocabulary)
+                return
+
+            # Split the rows into a few chunks per worker, executor.map keeps the chunk order
+            chunk_size = -(-len(self.final_jstore) // (self.workers * PARALLEL_CHUNKS_PER_WORKER))
+            chunks = [self.final_jstore[i:i + chunk_size] for i in range(0, len(self.final_jstore), chunk_size)]
+
+            self.logger.info("Cortex2Jstore::standardize_jstore: " + str(len(chunks)) + " chunks on " + str(self.workers) + " workers")
+
+            # Workers start from the same warm cache file and report their lookups
+            # and newly computed values back, so the parent cache can be persisted
+            self.final_jstore = []
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=standardize.configure_caches, initargs=(self.cache_size, self.cache_file, True)) as executor:
+                for rows, reports, vocabulary in executor.map(functools.partial(standardize.standardize_chunk, steps = self.plan.steps, vocabulary = Vocabulary()), chunks):
+                    self.final_jstore.extend(rows)
+                    self.vocabulary.merge(vocabulary)
+                    for name, cache in standardize.caches.items():
+                        cache.merge(reports[name])
         
         except Exception as e:
             self.logger.error("Cortex2Jstore::standardize_jstore: Exception: " + str(e))
             raise e
     
 
+    """
+    This method standardizes a single JStore row in place according to the JStore schema.
+
+    Parameters:
+    :param row: JStore row to be standardized
+    :ptype row: Record
+    """
+    def standardize_row (self, row):
+        return standardize.standardize_row(row, self.plan.steps)
+    
+
     """
     This method will replace the commas with pipes in the given string, only if there
     is no space before and after the comma.
@@ -208,20 +862,7 @@ class Cortex2JStore:
     """
     def comma_replace_pipe (self, string):
         try:
-            self.logger.debug("Cortex2Jstore::comma_replace_pipe: replacing commas with pipes")
-
-            new_string = ""
-
-            for i in range(len(string)):
-                if string[i] == ",":
-                    if string[i-1] != " " and string[i+1] != " ":
-                        new_string += "|"
-                    else:
-                        new_string += ","
-                else:
-                    new_string += string[i]
-
-            return new_string
+            return standardize.comma_replace_pipe(string)
         
         except Exception as e:
             self.logger.error("Cortex2Jstore::comma_replace_pipe: Exception: " + str(e))
@@ -230,24 +871,7 @@ class Cortex2JStore:
 
     def standardize_vanderbilt_people (self, string):
         try:
-            self.logger.debug("Cortex2Jstore::standardize_vanderbilt_people: Standardizing Vanderbilt People")
-
-            # Split the string by pipe
-            values_list = string.split('|')
-            new_values_list = []
-            for name in values_list:
-                formatted_name = self.format_name(name)
-                if formatted_name != "":
-                    new_values_list.append(self.format_name(name))
-            
-            formatted_names =  '|'.join(new_values_list)
-
-            # self.logger.debug("#########################################################")
-            # self.logger.debug("Cortex2Jstore::standardize_vanderbilt_people: values_list: \n" + str(values_list))
-            # self.logger.debug("Cortex2Jstore::standardize_vanderbilt_people: formatted_names: \n" + str(formatted_names))
-            # self.logger.debug("#########################################################")
-
-            return formatted_names
+            return standardize.standardize_vanderbilt_people(string)
         
         except Exception as e:
             self.logger.error("Cortex2Jstore::standardize_vanderbilt_people: Exception: " + str(e))
@@ -255,204 +879,190 @@ class Cortex2JStore:
     
 
     def format_name(self, name):
-        parts = name.split()
-
-        if len(parts) < 2:
-            # Logic: If there is only one part in the name,
-            # then return the name as it is.
-            return name
-        
-        elif len(parts) == 2:
-            # Logic: If there are two parts in the name,
-            # then return the name as <LastName, FirstName>
-            return f"{parts[1]}, {parts[0]}"
+        return standardize.format_name(name)
         
-        else:
-            # Logic: If there are more than two parts in the name,
-            # then first check if the name contains a suffix.
-            # If it does, then take the word before the suffix as the last name.
-            # and then append whatever is left as the extra.
-            # If it does not, then take the last word as the last name.
-            suffix_list = ["Jr.", "Sr.", "II.", "III.", "IV.", "V.", "VI.", "VII.", "VIII.", "IX.", "X."]
-            has_suffix = False
-            suffix_location = 0
-
-            for part in parts:
-                if part in suffix_list:
-                    has_suffix = True
-                    suffix_location = parts.index(part)
-                    break
-            
-            if has_suffix:
-                last_name = ''.join(parts[suffix_location - 1])
 
-                extra = ''
+    """
+    This method returns the unique local subjects, in first-seen order. The vocabulary
+    was filled while the rows were standardized, so the rows are not scanned again.
+    """
+    def getlocalsubjectslist(self):
+        return self.vocabulary.subjects()
 
-                for part in parts:
-                    if parts.index(part) != suffix_location - 1:
-                        if parts.index(part) != len(parts) - 1:
-                            extra += part + ' '
-                        else:
-                            extra += part
-                
-                extra_parts = extra.split()
-
-                # Get new suffix location
-                suffix_location = 0
-                for part in extra_parts:
-                    if part in suffix_list:
-                        suffix_location = extra_parts.index(part)
-                        break
-                
-                # Divide the extra in two parts
-                before_suffix = ''
-                after_suffix = ''
-
-                for part in extra_parts:
-                    if extra_parts.index(part) < suffix_location:
-                        before_suffix += part + ' '
-                    else:
-                        if extra_parts.index(part) != len(extra_parts) - 1:
-                            after_suffix += part + ' '
-                        else:
-                            after_suffix += part
-                
-                before_suffix = before_suffix[:-1] + ","
-                return f"{last_name}, {before_suffix} {after_suffix}"
 
-            else:
-                # We need to check if there is paranthesis in the name
-                for s in part[-1]:
-                    if ("(" in s) or (")" in s):
-                        return f""
-                
-                last_name = ''.join(parts[-1])
-                first_name_plus_extra = ' '.join(parts[:-1])
-                return f"{last_name}, {first_name_plus_extra}"
-
-        # else:
-        #     first_name = ' '.join(parts[:-2])
-        #     last_name = parts[-2]
-        #     extra = parts[-1]
-        #     return f"{last_name}, {first_name} {extra}"
-        
-
-    def getlocalsubjectslist(self):
+    """
+    This method exports the local subjects list and the vocabulary, and saves the
+    vocabulary to the vocabulary store, if one was given.
+    """
+    @instrumented("export_local_subjects", rows_out = lambda self, result: len(self.vocabulary))
+    def export_local_subjects (self):
         try:
-            self.logger.info("Cortex2Jstore::getlocalsubjectslist: Getting local subjects list")
+            self.logger.info("Cortex2Jstore::export_local_subjects: {} local subjects, {} near-duplicate groups".format(
+                len(self.vocabulary), len(self.vocabulary.groups())))
 
-            unique_local_subjects = set()
+            list_uniquelocalsubjects = self.getlocalsubjectslist()
+            self.export_artifact("localsubjects", list_uniquelocalsubjects)
+            self.export_artifact("vocabulary", self.vocabulary.to_list)
+            self.export_data(data = [[s] for s in list_uniquelocalsubjects], path = self.output_path("localsubjects.xlsx"), type = 'xlsx', columns = ["Local Subjects"])
 
-            for row in self.final_jstore:
-                for k, v in row.items():
-                    
-                    # Select columns to be reformatted
-                    if k == "Vanderbilt Local Subjects[2083876]":
-                        values_list = v.split('|')
-                        unique_local_subjects.update(set(values_list))
-            
-            return unique_local_subjects
+            if self.vocabulary_store is not None:
+                self.vocabulary_store.save(self.vocabulary_name, self.vocabulary)
+                self.logger.info("Cortex2Jstore::export_local_subjects: vocabulary saved as " + self.vocabulary_name)
+
+        except Exception as e:
+            self.logger.error("Cortex2Jstore::export_local_subjects: Exception: " + str(e))
+            raise e
+
+
+    """
+    This method compiles config.py into the column plan of the run, validating the
+    configured columns against the headers. The plan is compiled once per header in
+    a process and reused by the later runs.
+
+    Parameters:
+    :param jstore_columns: JStore column names, in row order
+    :ptype jstore_columns: list
+    :param cortex_columns: Cortex column names, in row order
+    :ptype cortex_columns: list
+    """
+    def compile_plan (self, jstore_columns, cortex_columns):
+        try:
+            self.plan = plan.compiled_plan(jstore_columns, cortex_columns)
+
+            for column in self.plan.skipped:
+                self.logger.warning("Cortex2JStore::compile_plan: schema column not in the JStore header: " + column)
+            self.logger.info("Cortex2JStore::compile_plan: {} columns to fill, {} columns to standardize".format(
+                len(self.plan.fill_positions), len(self.plan.steps)))
 
         except Exception as e:
-            self.logger.error("Cortex2Jstore::getlocalsubjectslist: Exception: " + str(e))
+            self.logger.error("Cortex2JStore::compile_plan: Exception: " + str(e))
             raise e
 
+
     """
     This method converts the raw data into internal data structures
 
     Parameters:
     :param path: Path to the raw file
     :ptype path: str
-    :param type: Type of the raw file
+    :param type: Type of the raw file (csv, xls or xlsx), detected from the file when None
     :ptype type: str
     :param target: Name of the datastructure to save the data in (cortex or jstore)
     :ptype target: str
     :param is_required_reference: Flag to indicate if the data is required for the reference output
     :ptype is_required_reference: bool
     """
+    @instrumented("raw2data", rows_out = lambda self, result: len(result))
     def raw2data (self, path, type, target, is_2bexported= False):
         try:
             self.logger.info("Cortex2JStore::raw2data")
             
-            # Read the CSV file
-            if type == "csv":
-                with open(path, 'r') as csv_file:
-                    csv_reader = csv.DictReader(csv_file)
-
-                    for row in csv_reader:
-                        self.var_dict.get(target).append(row)
-
-            # Read the XLS file
-            elif type == "xls":
-                workbook = xlrd.open_workbook(path)
-                worksheet = workbook.sheet_by_index(0)
-                headers = [cell.value for cell in worksheet.row(0)]
-
-                for i in range(1, worksheet.nrows):
-                    row_data = {}
-                    for j in range(len(headers)):
-                        row_data[headers[j]] = worksheet.cell_value(i, j)
-                    self.var_dict.get(target).append(row_data)
-            
-            else:
-                raise Exception("Unknown file type")
+            # The header is cleaned up once, the rows are read with the renamed columns
+            rename = self.clean_cortex_header if target == "cortex" else None
+            self.schemas[target], rows = readers.open_records(path, type, rename, self.read_workers)
+            self.var_dict.get(target).extend(rows)
 
             # Export the data
-            if is_2bexported: self.export_data(data = self.var_dict.get(target), path = 'output/'+ target +'.json') 
+            if is_2bexported: self.export_artifact(target, self.var_dict.get(target))
+
+            return self.var_dict.get(target)
 
         except Exception as e:
             self.logger.error("Cortex2JStore::raw2data: Exception: " + str(e))
             raise e
     
 
-    def cortex_cleanup(self):
-        try:
-            self.logger.info("Cortex2JStore::cortex_cleanup")
-            
-            for item in self.cortex:
-                new_keys = {}
+    """
+    This method returns the cleaned up name of a raw Cortex column. It runs once per
+    column when the Cortex header is read; columns without a "|" are kept whole.
+
+    Parameters:
+    :param key: Raw Cortex column name
+    :ptype key: str
+    """
+    def clean_cortex_header (self, key):
+        # Removing random unicode values (the byte order mark, as read with and without the UTF-8 decoding)
+        new_key = str(key).replace("\u00ef\u00bb\u00bf", "").replace("\ufeff", "").replace("\"", "")
+
+        # NOTE: the part after "|" contains cortex appended field value, CoreField.OriginalFileName
+        new_key, separator, redundant_col = new_key.partition("|")
+        return new_key
+
+    """
+    This method returns the path of a result file in the output directory.
+
+    Parameters:
+    :param filename: Name of the result file
+    :ptype filename: str
+    """
+    def output_path (self, filename):
+        return os.path.join(self.output_dir, filename)
 
-                for key in item.keys():
 
-                    # Removing random unicode values
-                    new_key = key.replace("\u00ef\u00bb\u00bf", "").replace("\"", "")
-                    new_key = key.replace("\ufeff", "").replace("\"", "")
+    """
+    This method exports a stage snapshot registered in ARTIFACTS, only when it was
+    selected with --artifacts. The data may be given as a function, so that building
+    it costs nothing when the snapshot is skipped.
 
-                    # NOTE: redundant_col contains cortex appended field value, CoreField.OriginalFileName
-                    new_key, redundant_col = new_key.split("|")
-                    new_keys[new_key] = item[key]
+    Parameters:
+    :param name: Name of the artifact
+    :ptype name: str
+    :param data: Data to be exported, or a function returning it
+    :ptype data: list
+    """
+    def export_artifact (self, name, data):
+        if name not in self.artifacts:
+            self.logger.debug("Cortex2JStore::export_artifact: skipping " + name)
+            return
 
-                item.clear()
-                item.update(new_keys)
+        if callable(data):
+            data = data()
         
-        except Exception as e:
-            self.logger.error("Cortex2JStore::cortex_cleanup: Exception: " + str(e))
-            raise e
+        self.export_data(data = data, path = self.output_path(ARTIFACTS[name]), type = 'json')
+
 
     """
-    Description: exports the data to JSON files
+    This method returns a JsonWriter for a stage snapshot registered in ARTIFACTS,
+    or None when the snapshot was not selected with --artifacts.
+
+    Parameters:
+    :param name: Name of the artifact
+    :ptype name: str
+    """
+    def artifact_writer (self, name):
+        if name not in self.artifacts:
+            return None
+        return writers.JsonWriter(writers.export_path(self.output_path(ARTIFACTS[name]), self.json_format), self.json_format)
+
+
+    """
+    Description: exports the data to JSON files, in the format selected with --json_format,
+    or to XLSX files, written one row at a time and split past Excel's row limit as
+    selected with --xlsx_split
 
     Parameters:
     :param data: Data to be exported
     :ptype data: dict
-    :param path: Path to the JSON file
+    :param path: Path to the JSON file, .json becomes .ndjson in the ndjson format
     :ptype path: str
+    :param type: json or xlsx
+    :ptype type: str
+    :param columns: Header of the XLSX sheets when the rows are sequences of values
+    :ptype columns: list
     """
-    def export_data (self, data, path, type = "json"):
+    @instrumented("export_data", rows_in = lambda self, data = None, *args, **kwargs: count_rows(data))
+    def export_data (self, data, path, type = "json", columns = None):
         try:
             self.logger.info("Cortex2JStore::export_data")
 
-            # Export the data to JSON file
+            # Export the data to JSON file, in the selected JSON format
             if type == "json":
-                with open(path, 'w') as json_file:
-                    json.dump (data, json_file, indent=4)
+                writers.write_json(data, path, self.json_format)
             
             elif type == "xlsx":
-                # convert the list of dictionaries to a DataFrame
-                df = pd.DataFrame(data)
-
-                # convert the dataframe to an XlsxWriter Excel object.
-                df.to_excel(path, index=False)
+                paths = writers.write_xlsx(data, path, columns, self.xlsx_split)
+                if len(paths) > 1:
+                    self.logger.info("Cortex2JStore::export_data: row limit reached, written to " + ", ".join(paths))
                 
             else:
                 raise Exception("Unknown file type")
@@ -471,6 +1081,23 @@ class Cortex2JStore:
             self.logger.info ("Cortex2JStore::dump")
             self.logger.info ("------------------------------")
             self.logger.info ("     Log Level: {}".format (self.logger.getEffectiveLevel ()))
+            self.logger.info ("     Engine: {}".format (self.engine))
+            self.logger.info ("     Stream Mode: {}".format (self.stream))
+            self.logger.info ("     Pipeline Mode: {}".format (self.pipeline))
+            self.logger.info ("     Join: {} (memory budget {} MB)".format (self.join, self.memory_budget))
+            self.logger.info ("     Workers: {}".format (self.workers))
+            self.logger.info ("     Read Workers: {}".format (self.read_workers))
+            self.logger.info ("     JSON Format: {}".format (self.json_format))
+            self.logger.info ("     XLSX Split: {}".format (self.xlsx_split))
+            self.logger.info ("     Match Mode: {}".format (self.match_mode))
+            self.logger.info ("     Artifacts: {}".format (", ".join(a for a in ARTIFACTS if a in self.artifacts) or "none"))
+            self.logger.info ("     Cache Size: {}".format (self.cache_size))
+            self.logger.info ("     Cache File: {}".format (self.cache_file))
+            self.logger.info ("     Incremental State: {}".format (self.state.path if self.state else None))
+            self.logger.info ("     Output Dir: {}".format (self.output_dir))
+            self.logger.info ("     Checkpoints: {}".format (self.checkpoints.directory if self.checkpoints else None))
+            self.logger.info ("     Resumed After: {}".format (self.checkpoints.resumed_after if self.checkpoints else None))
+            self.logger.info ("     Vocabulary Store: {}".format (self.vocabulary_store.path + " (" + self.vocabulary_name + ")" if self.vocabulary_store else None))
             self.logger.info ("**********************************")
 
         except Exception as e:
@@ -478,19 +1105,98 @@ class Cortex2JStore:
 
 
 """
-Parse command line arguments
+Parse the --artifacts selection into a set of artifact names
+
+Parameters:
+:param selection: none, final, all, or a comma separated list of artifact names
+:ptype selection: str
 """
-def parseCmdLineArgs ():
+def parse_artifacts (selection):
+  if selection == "none":
+    return set ()
+  if selection == "final":
+    return set (FINAL_ARTIFACTS)
+  if selection == "all":
+    return set (ARTIFACTS)
+
+  names = set (name.strip () for name in selection.split (",") if name.strip ())
+  unknown = names - set (ARTIFACTS)
+  if unknown:
+    raise Exception ("Unknown artifacts: {}".format (", ".join (sorted (unknown))))
+  return names
+
+
+"""
+Build the command line parser, its defaults are also the defaults of the library API
+"""
+def build_parser ():
   # instantiate a ArgumentParser object
   parser = argparse.ArgumentParser (description="Cortex2JStore: A program to merge Cortex data into JStore")
 
   parser.add_argument ("-l", "--loglevel", type=int, default=logging.INFO, choices=[logging.DEBUG,logging.INFO,logging.WARNING,logging.ERROR,logging.CRITICAL], help="logging level, choices 10,20,30,40,50: default 20=logging.INFO")
 
-  parser.add_argument ("-c", "--cortex_raw", type=str, default="data/cortex.csv", help="cortex csv raw file: default data/cortex.csv")
+  parser.add_argument ("-c", "--cortex_raw", type=str, default="data/cortex.csv", help="cortex raw file, csv, xls or xlsx detected from the file: default data/cortex.csv")
 
-  parser.add_argument ("-j", "--jstore_raw", type=str, default="data/jstore.xls", help="jstore xls raw file: default data/jstore.xls")
-  
-  return parser.parse_args()
+  parser.add_argument ("-j", "--jstore_raw", type=str, default="data/jstore.xls", help="jstore raw file, xls, xlsx or csv detected from the file: default data/jstore.xls")
+
+  parser.add_argument ("-e", "--engine", type=str, default="row", choices=["row", "columnar"], help="engine running the match, combine and standardize stages, choices row, columnar: default row")
+
+  parser.add_argument ("-w", "--workers", type=int, default=1, help="number of worker processes used to standardize the jstore data: default 1")
+
+  parser.add_argument ("--read_workers", type=int, default=1, help="number of worker processes parsing a csv export of 32 MB or more, split into byte ranges on record boundaries: default 1")
+
+  parser.add_argument ("--cache_size", type=int, default=standardize.DEFAULT_CACHE_SIZE, help="maximum number of distinct values kept by each name and comma transform cache, 0 disables caching: default 100000")
+
+  parser.add_argument ("--cache_file", type=str, default=None, help="json file the transform caches are loaded from and saved to between runs: default none")
+
+  parser.add_argument ("-i", "--incremental", type=str, default=None, help="sqlite state file of the incremental mode, only rows changed since the previous run are merged and standardized: default off")
+
+  parser.add_argument ("-f", "--json_format", type=str, default="pretty", choices=writers.JSON_FORMATS, help="format of the json exports, choices pretty, compact, ndjson (one row per line, .ndjson files): default pretty")
+
+  parser.add_argument ("--xlsx_split", type=str, default="sheet", choices=writers.XLSX_SPLITS, help="where the xlsx rows continue past the row limit of excel, choices sheet (next sheet), file (<name>.2.xlsx, ...): default sheet")
+
+  parser.add_argument ("-a", "--artifacts", type=str, default="all", help="json stage snapshots to export: none, final ({}), all, or a comma separated list of {}: default all".format (", ".join (FINAL_ARTIFACTS), ", ".join (ARTIFACTS)))
+
+  parser.add_argument ("--profile", action="store_true", help="dump the cProfile stats of every stage to <output_dir>/profile/<stage>.prof: default off")
+
+  parser.add_argument ("--trace_memory", action="store_true", help="record the tracemalloc delta and peak of every stage in <output_dir>/metrics.json, slows the run down: default off")
+
+  parser.add_argument ("-m", "--match", type=str, default="exact", choices=MATCH_MODES, help="matching passes between filename and original file name, choices exact, normalized (config.match_normalizers), fuzzy (normalized within --match_distance edits): default exact")
+
+  parser.add_argument ("--match_distance", type=int, default=2, help="largest edit distance accepted by the fuzzy matching pass: default 2")
+
+  parser.add_argument ("-s", "--stream", action="store_true", help="stream jstore rows through combine, standardize and write, keeping only the cortex lookup in memory: default off")
+
+  parser.add_argument ("-p", "--pipeline", action="store_true", help="stream mode run as concurrent read, match, standardize and write stages connected by bounded queues, standardized on a process pool with --workers: default off")
+
+  parser.add_argument ("--join", type=str, default="auto", choices=["auto", "memory", "disk"], help="where the cortex index is kept, choices auto (stream and spill to disk past --memory_budget), memory, disk (stream against a sqlite index in the output directory): default auto")
+
+  parser.add_argument ("--memory_budget", type=int, default=spill.default_memory_budget (), help="memory in MB the rows of the exports may take before --join auto streams them and spills the cortex index: default half of the physical memory")
+
+  parser.add_argument ("--checkpoint", action="store_true", help="checkpoint the row engine after reading, matching and standardizing to <output_dir>/checkpoints: default off")
+
+  parser.add_argument ("--resume", action="store_true", help="continue from the last checkpoint written with the same inputs and configuration, and keep checkpointing: default off")
+
+  parser.add_argument ("--vocabulary", type=str, default=None, help="sqlite store the local subjects vocabulary is saved to, see vocabulary.py to merge and diff: default off")
+
+  parser.add_argument ("--vocabulary_name", type=str, default=None, help="name the vocabulary is saved under, the collection name in batch mode: default name of the jstore file")
+
+  parser.add_argument ("-o", "--output_dir", type=str, default="output", help="directory the results are written to, one sub-directory per collection in batch mode: default output")
+
+  parser.add_argument ("--manifest", type=str, default=None, help="batch mode, json or csv manifest of collections with the fields name, cortex, jstore: default off")
+
+  parser.add_argument ("--collections", type=str, default=None, help="batch mode, glob of collection directories holding one cortex.* and one jstore.* export each: default off")
+
+  parser.add_argument ("--batch_workers", type=int, default=os.cpu_count () or 1, help="number of collections migrated concurrently in batch mode: default number of cpus")
+
+  return parser
+
+
+"""
+Parse command line arguments
+"""
+def parseCmdLineArgs ():
+  return build_parser ().parse_args ()
 
 
 """
@@ -511,6 +1217,13 @@ def main ():
     logger.setLevel (args.loglevel)
     logger.debug ("Main: effective log level is {}".format (logger.getEffectiveLevel ()))
 
+    # In batch mode every collection runs in its own worker process
+    if args.manifest or args.collections:
+      logger.debug ("Main: run the cortex2jstore batch")
+      collections = batch.load_manifest (args.manifest) if args.manifest else batch.find_collections (args.collections)
+      batch.run_batch (Cortex2JStore, collections, args, logger)
+      return
+
     # Obtain the application object 
     logger.debug ("Main: obtain the cortex2jstore appln object")
     appln = Cortex2JStore (logger)
@@ -1,38 +1,168 @@
-import json
-import pandas as pd
+"""
+Export: converts the results of a migration between JSON, NDJSON, CSV and XLSX
+
+Rows are read one at a time (JSON arrays with ijson or chunked decoding, NDJSON line
+by line, CSV and XLSX row by row), optionally projected onto a list of columns, and
+written in chunks, so re-exporting a large result never loads it into memory.
+
+python export.py -s output/finaljstore.json -t output/finaljstore.csv -c "Filename,Title[2071407]"
+"""
+
+# import the required modules
+from records import Record
+from records import Schema
+import readers
+import writers
+import logging
+import argparse
+import os
+
+# Formats keyed on the file extension
+FORMATS = {
+    ".json": "json",
+    ".ndjson": "ndjson",
+    ".csv": "csv",
+    ".xlsx": "xlsx",
+}
+
+
+"""
+This function returns the format of a file from its extension.
+
+Parameters:
+:param path: Path to the file
+:ptype path: str
+"""
+def detect_format (path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise Exception("Unknown file type: " + path)
+    return FORMATS[extension]
+
+
+"""
+This function lazily reads the rows of a file.
+
+Parameters:
+:param path: Path to the file
+:ptype path: str
+:param format: json, ndjson, csv or xlsx
+:ptype format: str
+"""
+def read_rows (path, format):
+    if format == "json":
+        return writers.read_json(path)
+    if format == "ndjson":
+        return writers.read_ndjson(path)
+    if format in ("csv", "xlsx"):
+        return readers.read_rows(path, format)
+    raise Exception("Unknown file type")
+
+
+"""
+This function projects the rows onto the columns, in that order. Columns missing
+from a row are left empty.
+
+Parameters:
+:param rows: Rows to be projected
+:ptype rows: iterable
+:param columns: Columns to be kept
+:ptype columns: list
+"""
+def project_rows (rows, columns):
+    schema = Schema(columns)
+    for row in rows:
+        yield Record(schema, [row.get(c) for c in schema.columns])
+
 
 """
-Description: exports the data to JSON files
+Description: exports the rows to a file in the target format and returns the paths written
 
 Parameters:
-:param data: Data to be exported
-:ptype data: dict
-:param path: Path to the JSON file
+:param rows: Rows to be exported
+:ptype rows: iterable
+:param path: Path to the target file
 :ptype path: str
+:param format: json, ndjson, csv or xlsx
+:ptype format: str
+:param columns: Header of the CSV and XLSX files, taken from the first row when None
+:ptype columns: list
+:param json_format: pretty or compact, for the json format
+:ptype json_format: str
+:param xlsx_split: Where the XLSX rows continue past the row limit: sheet or file
+:ptype xlsx_split: str
 """
-def export_data (data, path, type = "json"):
-    # Export the data to JSON file
-    if type == "json":
-        with open(path, 'w') as json_file:
-            json.dump (data, json_file, indent=4)
-    
-    elif type == "xlsx":
-        # convert the list of dictionaries to a DataFrame
-        df = pd.DataFrame(data)
+def export_data (rows, path, format, columns = None, json_format = "pretty", xlsx_split = "sheet"):
+    if format in ("json", "ndjson"):
+        return [writers.write_json(rows, path, "ndjson" if format == "ndjson" else json_format)]
+    if format == "csv":
+        return [writers.write_csv(rows, path, columns)]
+    if format == "xlsx":
+        return writers.write_xlsx(rows, path, columns, xlsx_split)
+    raise Exception("Unknown file type")
+
+
+"""
+Parse command line arguments
+"""
+def parseCmdLineArgs ():
+  # instantiate a ArgumentParser object
+  parser = argparse.ArgumentParser (description="Export: converts migration results between json, ndjson, csv and xlsx")
+
+  parser.add_argument ("-l", "--loglevel", type=int, default=logging.INFO, choices=[logging.DEBUG,logging.INFO,logging.WARNING,logging.ERROR,logging.CRITICAL], help="logging level, choices 10,20,30,40,50: default 20=logging.INFO")
+
+  parser.add_argument ("-s", "--source", type=str, default="output/finaljstore.json", help="source file: default output/finaljstore.json")
+
+  parser.add_argument ("-t", "--target", type=str, default="output/finaljstore.xlsx", help="target file: default output/finaljstore.xlsx")
+
+  parser.add_argument ("--source_format", type=str, default=None, choices=sorted (set (FORMATS.values ())), help="format of the source file: default from the extension")
+
+  parser.add_argument ("--target_format", type=str, default=None, choices=sorted (set (FORMATS.values ())), help="format of the target file: default from the extension")
+
+  parser.add_argument ("-c", "--columns", type=str, default=None, help="comma separated columns to export, in this order: default all the columns of the first row")
+
+  parser.add_argument ("-f", "--json_format", type=str, default="pretty", choices=["pretty", "compact"], help="layout of a json target, choices pretty, compact: default pretty")
 
-        # convert the dataframe to an XlsxWriter Excel object.
-        df.to_excel(path, index=False)
-        
-    else:
-        raise Exception("Unknown file type")
+  parser.add_argument ("--xlsx_split", type=str, default="sheet", choices=writers.XLSX_SPLITS, help="where the xlsx rows continue past the row limit of excel, choices sheet, file: default sheet")
 
+  return parser.parse_args()
 
 
-# Open the JSON file
-with open('output/finaljstore.json', 'r') as f:
-    # Load the contents of the file into a Python variable
-    final_jstore = json.load(f)
+"""
+Main program
+"""
+def main ():
+  try:
+    logger = logging.getLogger ("Export")
+
+    # first parse the arguments
+    args = parseCmdLineArgs ()
+    logger.setLevel (args.loglevel)
+
+    source_format = args.source_format or detect_format (args.source)
+    target_format = args.target_format or detect_format (args.target)
+    columns = [c.strip () for c in args.columns.split (",")] if args.columns else None
+
+    logger.info ("Main: {} ({}) -> {} ({})".format (args.source, source_format, args.target, target_format))
+
+    rows = read_rows (args.source, source_format)
+    if columns is not None:
+      rows = project_rows (rows, columns)
+
+    paths = export_data (rows, args.target, target_format, columns, args.json_format, args.xlsx_split)
+    logger.info ("Main: written to {}".format (", ".join (paths)))
+
+  except Exception as e:
+    logger.error ("Exception caught in main - {}".format (e))
+    return
+
+
+"""
+Main entry point for the program
+"""
+if __name__ == "__main__":
 
+  # set underlying default logging capabilities
+  logging.basicConfig (level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-# Export the final JStore data in XLSX format
-export_data(data = final_jstore, path = 'output/finaljstore.xlsx', type = 'xlsx')
\ No newline at end of file
+  main ()
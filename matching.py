@@ -0,0 +1,403 @@
+"""
+Matching engine for JStore "Filename" and Cortex "Original File Name"
+
+The exact pass is a dictionary lookup, as before. When it misses, the normalized
+pass looks the file name up after the configured key normalizers ran (case, path
+prefix, extension, whitespace), and the fuzzy pass looks for normalized names
+within a small edit distance. Fuzzy candidates come from a trigram index and are
+restricted to names of a similar length, so no pass compares all pairs.
+A match found by the later passes is only accepted when it is unique; ties are
+left unmatched and reported as ambiguous.
+"""
+
+# import the required modules
+from collections import defaultdict
+import ntpath
+import os
+import re
+
+# Matching passes selectable with --match, each one includes the previous ones
+MATCH_MODES = ("exact", "normalized", "fuzzy")
+
+# Size of the n-grams of the fuzzy index
+NGRAM = 3
+
+# Unmatched JStore keys listed in the match report, the others are only counted
+REPORT_UNMATCHED_LIMIT = 1000
+
+
+"""
+Key normalizers, applied in the order listed in config.match_normalizers
+"""
+def strip_whitespace (value):
+    return re.sub(r"\s+", " ", value).strip()
+
+
+def casefold (value):
+    return value.casefold()
+
+
+def basename (value):
+    return ntpath.basename(value.replace("\\", "/").rstrip("/"))
+
+
+def strip_extension (value):
+    return os.path.splitext(value)[0]
+
+
+def remove_spaces (value):
+    return re.sub(r"[\s_\-]+", "", value)
+
+
+NORMALIZERS = {
+    "strip_whitespace": strip_whitespace,
+    "casefold": casefold,
+    "basename": basename,
+    "strip_extension": strip_extension,
+    "remove_spaces": remove_spaces,
+}
+
+
+"""
+This function returns the n-grams of the value, padded so that short values have n-grams too.
+
+Parameters:
+:param value: Normalized key
+:ptype value: str
+"""
+def ngrams (value):
+    padded = "^" + value + "$"
+    return set(padded[i:i + NGRAM] for i in range(max(len(padded) - NGRAM + 1, 1)))
+
+
+"""
+This function returns the edit distance between a and b, or None when it exceeds limit.
+
+Parameters:
+:param a: First value
+:ptype a: str
+:param b: Second value
+:ptype b: str
+:param limit: Largest distance of interest
+:ptype limit: int
+"""
+def bounded_edit_distance (a, b, limit):
+    if abs(len(a) - len(b)) > limit:
+        return None
+
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return None
+        previous = current
+
+    return previous[-1] if previous[-1] <= limit else None
+
+
+class MatchIndex:
+
+    """
+    Constructor
+
+    Parameters:
+    :param mode: Last matching pass to run: exact, normalized or fuzzy
+    :ptype mode: str
+    :param normalizers: Names of the key normalizers of the normalized and fuzzy passes
+    :ptype normalizers: list
+    :param max_distance: Largest edit distance accepted by the fuzzy pass
+    :ptype max_distance: int
+    """
+    def __init__(self, mode = "exact", normalizers = (), max_distance = 2):
+        if mode not in MATCH_MODES:
+            raise Exception("Unknown match mode: " + str(mode))
+
+        self.mode = mode # Last matching pass to run
+        self.normalizers = [NORMALIZERS[name] for name in normalizers] # Key normalizers
+        self.max_distance = max_distance # Largest accepted edit distance
+        self.exact = {} # Row per exact key, the last row wins
+        self.duplicates = {} # Number of rows per exact key, for keys seen more than once
+        self.targets = {} # Number of JStore keys matched per exact key
+        self.normalized = defaultdict(set) # Exact keys per normalized key
+        self.postings = defaultdict(set) # Normalized keys per (length, n-gram) bucket (fuzzy pass)
+
+
+    def __len__ (self):
+        return len(self.exact)
+
+
+    """
+    This method returns the normalized form of a key.
+
+    Parameters:
+    :param value: Raw key
+    :ptype value: str
+    """
+    def normalize (self, value):
+        value = str(value)
+        for normalizer in self.normalizers:
+            value = normalizer(value)
+        return value
+
+
+    """
+    This method adds a row to the index.
+
+    Parameters:
+    :param key: Exact key of the row
+    :ptype key: str
+    :param row: Indexed row
+    :ptype row: dict
+    """
+    def add (self, key, row):
+        if key in self.exact:
+            self.duplicates[key] = self.duplicates.get(key, 1) + 1
+        self.exact[key] = row
+
+        if self.mode == "exact":
+            return
+
+        normalized = self.normalize(key)
+        self.normalized[normalized].add(key)
+
+        if self.mode == "fuzzy" and len(self.normalized[normalized]) == 1:
+            for gram in ngrams(normalized):
+                self.postings[(len(normalized), gram)].add(normalized)
+
+
+    """
+    This method is called once all the rows were added, before the first match.
+    """
+    def finish (self):
+        pass
+
+
+    """
+    This method releases the index.
+    """
+    def close (self):
+        pass
+
+
+    """
+    This method records a JStore key matched to an exact key, and returns the number
+    of JStore keys matched to it so far.
+
+    Parameters:
+    :param key: Exact key
+    :ptype key: str
+    """
+    def target (self, key):
+        count = self.targets.get(key, 0) + 1
+        self.targets[key] = count
+        return count
+
+
+    """
+    This method returns the number of JStore keys matched to an exact key.
+
+    Parameters:
+    :param key: Exact key
+    :ptype key: str
+    """
+    def targets_of (self, key):
+        return self.targets.get(key, 0)
+
+
+    """
+    This method returns the row of an exact key, or None.
+
+    Parameters:
+    :param key: Exact key
+    :ptype key: str
+    """
+    def row (self, key):
+        return self.exact.get(key)
+
+
+    """
+    This method returns the exact keys of a normalized key.
+
+    Parameters:
+    :param normalized: Normalized key
+    :ptype normalized: str
+    """
+    def keys (self, normalized):
+        return self.normalized.get(normalized, ())
+
+
+    """
+    This method returns the rows matching a key as a tuple (row, method, candidates),
+    where method is exact, normalized, fuzzy or None when there is no unique match,
+    and candidates are the exact keys that were considered.
+
+    Parameters:
+    :param key: Key to be matched
+    :ptype key: str
+    """
+    def match (self, key):
+        row = self.row(key)
+        if row is not None:
+            return row, "exact", [key]
+
+        if self.mode == "exact":
+            return None, None, []
+
+        normalized = self.normalize(key)
+        candidates = self.keys(normalized)
+        if candidates:
+            if len(candidates) == 1:
+                candidate = next(iter(candidates))
+                return self.row(candidate), "normalized", [candidate]
+            return None, None, sorted(candidates, key=str)
+
+        if self.mode == "fuzzy":
+            return self.fuzzy_match(normalized)
+
+        return None, None, []
+
+
+    """
+    This method runs the fuzzy pass for a normalized key. Candidates must have a length
+    within max_distance and share enough n-grams to possibly be within max_distance
+    edits; only those are compared with the edit distance. Rows that the exact and
+    normalized passes matched never get here.
+
+    Parameters:
+    :param normalized: Normalized key
+    :ptype normalized: str
+    """
+    def fuzzy_match (self, normalized):
+        grams = ngrams(normalized)
+        # Every edit destroys at most NGRAM n-grams
+        needed = len(grams) - NGRAM * self.max_distance
+
+        # Only the buckets of keys with a length within max_distance are visited
+        shared = defaultdict(int)
+        for length in range(len(normalized) - self.max_distance, len(normalized) + self.max_distance + 1):
+            for gram in grams:
+                for candidate in self.postings.get((length, gram), ()):
+                    shared[candidate] += 1
+
+        best = None
+        best_candidates = []
+        for candidate, count in shared.items():
+            if count < needed:
+                continue
+            distance = bounded_edit_distance(normalized, candidate, self.max_distance)
+            if distance is None:
+                continue
+            if best is None or distance < best:
+                best = distance
+                best_candidates = [candidate]
+            elif distance == best:
+                best_candidates.append(candidate)
+
+        keys = sorted((k for c in best_candidates for k in self.keys(c)), key=str)
+        if len(keys) == 1:
+            return self.row(keys[0]), "fuzzy", keys
+        return None, None, keys
+
+
+class MatchReport:
+
+    """
+    Constructor
+
+    The report keeps counters and the exceptional entries only, so that it does not
+    grow with every JStore row of a streamed export. The number of JStore keys matched
+    to each Cortex key is kept by the index, next to the Cortex rows.
+
+    Parameters:
+    :param index: Index the matches are looked up in
+    :ptype index: MatchIndex
+    """
+    def __init__(self, index):
+        self.index = index # Index the matches are looked up in
+        self.methods = defaultdict(int) # Number of matches per method
+        self.unmatched_count = 0 # Number of JStore keys without a unique match
+        self.unmatched = [] # First JStore keys without a unique match, up to REPORT_UNMATCHED_LIMIT
+        self.ambiguous = [] # JStore keys with several candidates
+        self.recovered = [] # Matches found by the normalized and fuzzy passes
+        self.first_recovered = {} # First JStore key per Cortex key first matched by a recovered match
+        self.shared = {} # Number of JStore keys and first JStore key per Cortex key matched more than once
+
+
+    """
+    This method records the outcome of one match.
+
+    Parameters:
+    :param key: JStore key
+    :ptype key: str
+    :param method: exact, normalized, fuzzy or None
+    :ptype method: str
+    :param candidates: Cortex keys considered
+    :ptype candidates: list
+    """
+    def add (self, key, method, candidates):
+        if method is None:
+            self.unmatched_count += 1
+            if len(self.unmatched) < REPORT_UNMATCHED_LIMIT:
+                self.unmatched.append(key)
+            if len(candidates) > 1:
+                self.ambiguous.append({"filename": key, "reason": "several candidates", "candidates": candidates})
+            return
+
+        self.methods[method] += 1
+        target = candidates[0]
+        count = self.index.target(target)
+        if method != "exact":
+            self.recovered.append({"filename": key, "original_file_name": target, "method": method})
+            if count == 1:
+                self.first_recovered[target] = key
+
+        if count > 1:
+            self.shared[target] = (count, self.first_filename(target))
+
+
+    """
+    This method returns the first JStore key matched to a Cortex key: the Cortex key
+    itself, unless the first match was recovered.
+
+    Parameters:
+    :param target: Cortex key
+    :ptype target: str
+    """
+    def first_filename (self, target):
+        return self.first_recovered.get(target, target)
+
+
+    """
+    This method returns the report as a dictionary.
+
+    Parameters:
+    :param mode: Last matching pass that ran: exact, normalized or fuzzy
+    :ptype mode: str
+    :param duplicates: Number of Cortex rows per key seen more than once
+    :ptype duplicates: dict
+    """
+    def to_dict (self, mode, duplicates):
+        ambiguous = list(self.ambiguous)
+
+        # Several Cortex rows with the same file name, only the last one is used
+        for key, count in duplicates.items():
+            jstore_rows = self.index.targets_of(key)
+            if jstore_rows:
+                ambiguous.append({"original_file_name": key, "reason": "duplicate cortex rows, the last one is used", "cortex_rows": count,
+                                  "jstore_rows": jstore_rows, "first_filename": self.first_filename(key)})
+
+        # Several JStore rows matched to the same Cortex row
+        for key, (count, first) in self.shared.items():
+            ambiguous.append({"original_file_name": key, "reason": "several jstore rows", "jstore_rows": count, "first_filename": first})
+
+        return {
+            "mode": mode,
+            "matched": dict(self.methods),
+            "unmatched_count": self.unmatched_count,
+            "ambiguous_count": len(ambiguous),
+            "recovered": self.recovered,
+            "unmatched": self.unmatched,
+            "ambiguous": ambiguous,
+        }
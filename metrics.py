@@ -0,0 +1,245 @@
+"""
+Per-stage instrumentation of the Cortex2JStore pipeline
+
+Every instrumented stage records its wall time, rows in and out and throughput, the
+CPU time of the thread that ran it, and the change of the resident set size of the
+process over the stage along with the peak resident set size of the process so far.
+The CPU time of a stage is its own even when stages run concurrently in threads, but
+the work it hands to worker processes or other threads is not counted. The resident
+set sizes are those of the whole process, so concurrent stages share their changes,
+and the peak is the highest one since the process started. With trace_memory, the tracemalloc
+delta and peak of the stage are recorded too, and with a profile directory every
+stage is run under cProfile and its stats dumped to <stage>.prof.
+"""
+
+# import the required modules
+from contextlib import contextmanager
+import cProfile
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+
+"""
+This function returns the current resident set size of the process in MB, or None
+where /proc is not available.
+"""
+def rss_mb ():
+    try:
+        with open("/proc/self/statm", 'r') as statm_file:
+            pages = int(statm_file.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * resource.getpagesize() / (1024 * 1024)
+
+
+"""
+This function returns the peak resident set size of the process since it started, in MB.
+"""
+def peak_rss_mb ():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+"""
+This function returns the number of rows of the data, or None when it has no length.
+
+Parameters:
+:param data: Data of a stage
+:ptype data: object
+"""
+def count_rows (data):
+    try:
+        return len(data)
+    except TypeError:
+        return None
+
+
+class Instrumentation:
+
+    """
+    Constructor
+
+    Parameters:
+    :param logger: Logger object
+    :ptype logger: logging.Logger
+    """
+    def __init__(self, logger):
+        self.logger = logger # Logger object
+        self.records = [] # One record per stage call, in call order
+        self.profile_dir = None # Directory the cProfile stats are dumped to
+        self.trace_memory = False # Record tracemalloc deltas
+        self.profiles = {} # cProfile.Profile per stage name
+        self.running = threading.local() # Number of stages currently running in the thread, stages may be nested
+
+
+    """
+    This method sets up profiling and memory tracing.
+
+    Parameters:
+    :param profile_dir: Directory the cProfile stats are dumped to, None disables profiling
+    :ptype profile_dir: str
+    :param trace_memory: Flag to record the tracemalloc delta and peak of every stage
+    :ptype trace_memory: bool
+    """
+    def configure (self, profile_dir = None, trace_memory = False):
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+    """
+    Context manager measuring one call of a stage. The record it yields can be
+    updated by the caller with rows_in and rows_out.
+
+    Only the outermost running stage is profiled, as cProfile profilers cannot be nested;
+    the nested stages show up in its stats.
+
+    Parameters:
+    :param name: Name of the stage
+    :ptype name: str
+    """
+    @contextmanager
+    def stage (self, name):
+        record = {"stage": name, "rows_in": None, "rows_out": None}
+        self.records.append(record)
+        depth = getattr(self.running, "depth", 0)
+
+        profile = None
+        if self.profile_dir and depth == 0:
+            profile = self.profiles.setdefault(name, cProfile.Profile())
+
+        if self.trace_memory:
+            traced_start = tracemalloc.get_traced_memory()[0]
+            if depth == 0:
+                tracemalloc.reset_peak()
+
+        self.running.depth = depth + 1
+        rss_start = rss_mb()
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        if profile: profile.enable()
+
+        try:
+            yield record
+
+        finally:
+            if profile: profile.disable()
+            record["wall_s"] = time.perf_counter() - wall_start
+            record["cpu_s"] = time.thread_time() - cpu_start
+            self.running.depth = depth
+            rss_end = rss_mb()
+
+            rows = record["rows_out"] if record["rows_out"] is not None else record["rows_in"]
+            record["rows_per_s"] = rows / record["wall_s"] if rows is not None and record["wall_s"] > 0 else None
+            record["rss_delta_mb"] = rss_end - rss_start if rss_start is not None and rss_end is not None else None
+            record["peak_rss_mb"] = peak_rss_mb()
+
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record["traced_delta_mb"] = (current - traced_start) / (1024 * 1024)
+                record["traced_peak_mb"] = peak / (1024 * 1024)
+
+
+    """
+    This method aggregates the records per stage, in order of first call. The times,
+    rows and resident set size changes of the calls are added up, the peaks are the
+    highest of the calls.
+    """
+    def summary (self):
+        stages = {}
+        for record in self.records:
+            stage = stages.setdefault(record["stage"], {
+                "stage": record["stage"], "calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                "rows_in": None, "rows_out": None, "rss_delta_mb": None, "peak_rss_mb": 0.0,
+            })
+            stage["calls"] += 1
+            stage["wall_s"] += record["wall_s"]
+            stage["cpu_s"] += record["cpu_s"]
+            stage["peak_rss_mb"] = max(stage["peak_rss_mb"], record["peak_rss_mb"])
+            for key in ("rows_in", "rows_out", "rss_delta_mb"):
+                if record[key] is not None:
+                    stage[key] = (stage[key] or 0) + record[key]
+            for key in ("traced_delta_mb", "traced_peak_mb"):
+                if key in record:
+                    stage[key] = max(stage.get(key, record[key]), record[key])
+
+        for stage in stages.values():
+            rows = stage["rows_out"] if stage["rows_out"] is not None else stage["rows_in"]
+            stage["rows_per_s"] = rows / stage["wall_s"] if rows is not None and stage["wall_s"] > 0 else None
+
+        return list(stages.values())
+
+
+    """
+    This method logs the summary table, writes the records and the summary to a JSON
+    file and dumps the cProfile stats of every stage.
+
+    Parameters:
+    :param path: Path to the metrics JSON file
+    :ptype path: str
+    """
+    def report (self, path):
+        try:
+            summary = self.summary()
+
+            self.logger.info("Instrumentation::report")
+            self.logger.info("{:<22} {:>5} {:>10} {:>12} {:>10} {:>10} {:>12} {:>12} {:>14}".format(
+                "stage", "calls", "wall s", "thread cpu s", "rows in", "rows out", "rows/s", "process RSS", "process peak"))
+            self.logger.info("{:<22} {:>5} {:>10} {:>12} {:>10} {:>10} {:>12} {:>12} {:>14}".format(
+                "", "", "", "", "", "", "", "change MB", "so far MB"))
+            for stage in summary:
+                self.logger.info("{:<22} {:>5} {:>10.3f} {:>12.3f} {:>10} {:>10} {:>12} {:>12} {:>14.1f}".format(
+                    stage["stage"], stage["calls"], stage["wall_s"], stage["cpu_s"],
+                    "-" if stage["rows_in"] is None else stage["rows_in"],
+                    "-" if stage["rows_out"] is None else stage["rows_out"],
+                    "-" if stage["rows_per_s"] is None else "{:.0f}".format(stage["rows_per_s"]),
+                    "-" if stage["rss_delta_mb"] is None else "{:+.1f}".format(stage["rss_delta_mb"]),
+                    stage["peak_rss_mb"]))
+
+            with open(path, 'w') as metrics_file:
+                json.dump({"stages": summary, "calls": self.records}, metrics_file, indent=4)
+
+            if self.profile_dir:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                for name, profile in self.profiles.items():
+                    profile.dump_stats(os.path.join(self.profile_dir, name + ".prof"))
+                self.logger.info("Instrumentation::report: cProfile stats written to " + self.profile_dir)
+
+        except Exception as e:
+            self.logger.error("Instrumentation::report: Exception: " + str(e))
+            raise e
+
+
+"""
+Decorator instrumenting a method of an object holding an Instrumentation in self.metrics.
+
+Parameters:
+:param name: Name of the stage
+:ptype name: str
+:param rows_in: Function of (self, *args, **kwargs) returning the number of input rows
+:ptype rows_in: callable
+:param rows_out: Function of (self, result) returning the number of output rows
+:ptype rows_out: callable
+"""
+def instrumented (name, rows_in = None, rows_out = None):
+    def decorator (method):
+        @functools.wraps(method)
+        def wrapper (self, *args, **kwargs):
+            with self.metrics.stage(name) as record:
+                if rows_in is not None:
+                    record["rows_in"] = rows_in(self, *args, **kwargs)
+                result = method(self, *args, **kwargs)
+                if rows_out is not None:
+                    record["rows_out"] = rows_out(self, result)
+                return result
+        return wrapper
+    return decorator
@@ -0,0 +1,240 @@
+"""
+Pipelined stages connected by bounded queues
+
+Every stage runs in its own thread and passes chunks of rows to the next one through
+a bounded queue, so a fast stage blocks once it is queue_size chunks ahead of a slow
+one (backpressure) and the memory stays bounded. The wall time approaches the one of
+the slowest stage instead of the sum of the stages. CPU bound stages hand their chunks
+to a process pool and pass the futures on, the queue then bounds the chunks in flight.
+
+The first exception raised by a stage stops all the others and is raised again by
+join(). Every stage records the time it was busy, waiting for input and blocked on
+a full queue, which tells the slowest stage.
+"""
+
+# import the required modules
+import queue
+import threading
+import time
+
+# Chunks held by each queue between two stages
+DEFAULT_QUEUE_SIZE = 8
+
+# Seconds between two checks for a failed stage while a stage waits on a queue
+POLL_INTERVAL = 0.1
+
+# Marker put on a queue after the last chunk
+END = object()
+
+
+class PipelineStopped(Exception):
+    pass
+
+
+class Pipeline:
+
+    """
+    Constructor
+
+    Parameters:
+    :param logger: Logger object
+    :ptype logger: logging.Logger
+    :param queue_size: Chunks held by each queue
+    :ptype queue_size: int
+    """
+    def __init__(self, logger, queue_size = DEFAULT_QUEUE_SIZE):
+        self.logger = logger # Logger object
+        self.queue_size = queue_size # Chunks held by each queue
+        self.threads = [] # Thread per stage
+        self.stats = {} # Chunks, busy, waiting and blocked seconds per stage, in stage order
+        self.error = None # First exception raised by a stage
+        self.failed = threading.Event() # Set when a stage raised
+
+
+    """
+    This method starts a stage producing the chunks of an iterable, and returns its output queue.
+
+    Parameters:
+    :param name: Name of the stage
+    :ptype name: str
+    :param chunks: Chunks to be produced
+    :ptype chunks: iterable
+    """
+    def source (self, name, chunks):
+        output = queue.Queue(self.queue_size)
+        stats = self.new_stats(name)
+
+        def body ():
+            iterator = iter(chunks)
+            while True:
+                start = time.perf_counter()
+                chunk = next(iterator, END)
+                stats["busy_s"] += time.perf_counter() - start
+                if chunk is END:
+                    break
+                stats["chunks"] += 1
+                self.put(output, chunk, stats)
+            self.put(output, END, stats)
+
+        self.start(name, body)
+        return output
+
+
+    """
+    This method starts a stage applying a function to every chunk of its input queue,
+    and returns its output queues, each one receiving every result.
+
+    Parameters:
+    :param name: Name of the stage
+    :ptype name: str
+    :param func: Function of a chunk returning the chunk passed on
+    :ptype func: callable
+    :param inbox: Input queue
+    :ptype inbox: queue.Queue
+    :param outputs: Number of output queues
+    :ptype outputs: int
+    """
+    def stage (self, name, func, inbox, outputs = 1):
+        queues = [queue.Queue(self.queue_size) for _ in range(outputs)]
+        stats = self.new_stats(name)
+
+        def body ():
+            while True:
+                chunk = self.get(inbox, stats)
+                if chunk is END:
+                    break
+                start = time.perf_counter()
+                result = func(chunk)
+                stats["busy_s"] += time.perf_counter() - start
+                stats["chunks"] += 1
+                for output in queues:
+                    self.put(output, result, stats)
+            for output in queues:
+                self.put(output, END, stats)
+
+        self.start(name, body)
+        return queues[0] if outputs == 1 else queues
+
+
+    """
+    This method starts a stage consuming every chunk of its input queue.
+
+    Parameters:
+    :param name: Name of the stage
+    :ptype name: str
+    :param func: Function called with every chunk
+    :ptype func: callable
+    :param inbox: Input queue
+    :ptype inbox: queue.Queue
+    """
+    def sink (self, name, func, inbox):
+        stats = self.new_stats(name)
+
+        def body ():
+            while True:
+                chunk = self.get(inbox, stats)
+                if chunk is END:
+                    break
+                start = time.perf_counter()
+                func(chunk)
+                stats["busy_s"] += time.perf_counter() - start
+                stats["chunks"] += 1
+
+        self.start(name, body)
+
+
+    """
+    This method waits for all the stages and raises the first exception of a stage.
+    """
+    def join (self):
+        for thread in self.threads:
+            thread.join()
+
+        for name, stats in self.stats.items():
+            self.logger.info("Pipeline::join: {:<12} chunks={} busy={:.2f}s waiting={:.2f}s blocked={:.2f}s".format(
+                name, stats["chunks"], stats["busy_s"], stats["waiting_s"], stats["blocked_s"]))
+
+        if self.error is not None:
+            raise self.error
+
+
+    """
+    This method returns the counters of a new stage.
+
+    Parameters:
+    :param name: Name of the stage
+    :ptype name: str
+    """
+    def new_stats (self, name):
+        self.stats[name] = {"chunks": 0, "busy_s": 0.0, "waiting_s": 0.0, "blocked_s": 0.0}
+        return self.stats[name]
+
+
+    """
+    This method runs the body of a stage in a new thread. An exception stops the pipeline.
+
+    Parameters:
+    :param name: Name of the stage
+    :ptype name: str
+    :param body: Body of the stage
+    :ptype body: callable
+    """
+    def start (self, name, body):
+        def run ():
+            try:
+                body()
+            except PipelineStopped:
+                pass
+            except Exception as e:
+                self.logger.error("Pipeline::" + name + ": Exception: " + str(e))
+                if self.error is None:
+                    self.error = e
+                self.failed.set()
+
+        thread = threading.Thread(target=run, name="pipeline-" + name, daemon=True)
+        self.threads.append(thread)
+        thread.start()
+
+
+    """
+    This method puts a chunk on a queue, blocking while it is full, until a stage fails.
+
+    Parameters:
+    :param output: Output queue
+    :ptype output: queue.Queue
+    :param chunk: Chunk
+    :ptype chunk: object
+    :param stats: Counters of the stage
+    :ptype stats: dict
+    """
+    def put (self, output, chunk, stats):
+        start = time.perf_counter()
+        while not self.failed.is_set():
+            try:
+                output.put(chunk, timeout=POLL_INTERVAL)
+                stats["blocked_s"] += time.perf_counter() - start
+                return
+            except queue.Full:
+                continue
+        raise PipelineStopped()
+
+
+    """
+    This method takes a chunk from a queue, waiting while it is empty, until a stage fails.
+
+    Parameters:
+    :param inbox: Input queue
+    :ptype inbox: queue.Queue
+    :param stats: Counters of the stage
+    :ptype stats: dict
+    """
+    def get (self, inbox, stats):
+        start = time.perf_counter()
+        while not self.failed.is_set():
+            try:
+                chunk = inbox.get(timeout=POLL_INTERVAL)
+                stats["waiting_s"] += time.perf_counter() - start
+                return chunk
+            except queue.Empty:
+                continue
+        raise PipelineStopped()
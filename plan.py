@@ -0,0 +1,115 @@
+"""
+Column plan compiled from config.py
+
+match_columns and jstore_schema_columns are resolved once against the headers of
+the inputs: the positions of the JStore cells to be filled from Cortex, and the
+chain of transforms of every schema column. The stages then only visit the
+configured columns, and a new transform is added by registering it in
+standardize.TRANSFORMS and listing it in config.py.
+"""
+
+# import the required modules
+from config import match_columns
+from config import jstore_schema_columns
+from standardize import TRANSFORMS
+
+# Columns the matching stages look up
+JSTORE_KEY = "Filename"
+CORTEX_KEY = "Original File Name"
+
+# Plans compiled in this process, keyed on the headers they were compiled against
+compiled_plans = {}
+
+
+class ColumnPlan:
+
+    """
+    Constructor
+
+    Validates the configuration against the headers and compiles it. Missing match
+    columns are an error. Schema columns missing from the JStore header are left out
+    of the plan, as there is nothing to standardize.
+
+    Parameters:
+    :param jstore_columns: JStore column names, in row order
+    :ptype jstore_columns: list
+    :param cortex_columns: Cortex column names, in row order
+    :ptype cortex_columns: list
+    """
+    def __init__(self, jstore_columns, cortex_columns):
+        jstore_positions = {c: i for i, c in enumerate(jstore_columns)}
+        cortex_positions = {c: i for i, c in enumerate(cortex_columns)}
+
+        missing = [c for c in [JSTORE_KEY] + list(match_columns) if c not in jstore_positions]
+        if missing:
+            raise Exception("JStore columns missing from the header: " + ", ".join(dict.fromkeys(missing)))
+
+        missing = [c for c in [CORTEX_KEY] + list(match_columns.values()) if c not in cortex_positions]
+        if missing:
+            raise Exception("Cortex columns missing from the header: " + ", ".join(dict.fromkeys(missing)))
+
+        unknown = [t for chain in jstore_schema_columns.values() for t in chain if t not in TRANSFORMS]
+        if unknown:
+            raise Exception("Unknown transforms: " + ", ".join(dict.fromkeys(unknown)))
+
+        self.fill = list(match_columns.items()) # (JStore column, Cortex column) to be filled
+        self.fill_positions = tuple((jstore_positions[k], cortex_positions[v]) for k, v in self.fill) # Positions of the fill columns
+        self.skipped = [c for c in jstore_schema_columns if c not in jstore_positions] # Schema columns missing from the JStore header
+        self.transforms = [(c, tuple(TRANSFORMS[t] for t in chain)) for c, chain in jstore_schema_columns.items() if c in jstore_positions and chain] # Transforms per schema column
+        self.steps = tuple((jstore_positions[c], transforms) for c, transforms in self.transforms) # Positions and transforms of the schema columns
+
+
+    """
+    This method fills the empty cells of a JStore row from its matching Cortex row, in place.
+    Both rows must be records with the schemas the plan was compiled for.
+
+    Parameters:
+    :param jstore_row: JStore row to be updated
+    :ptype jstore_row: Record
+    :param cortex_row: Matching Cortex row
+    :ptype cortex_row: Record
+    """
+    def combine (self, jstore_row, cortex_row):
+        jstore_values = jstore_row.values
+        cortex_values = cortex_row.values
+
+        # Only the empty JStore cells are filled, existing data is never overwritten
+        for j, c in self.fill_positions:
+            if jstore_values[j] == "":
+                jstore_values[j] = cortex_values[c]
+
+        return jstore_row
+
+
+    """
+    This method applies the transform chain of a schema column to a single value.
+
+    Parameters:
+    :param transforms: Transforms of the column, from self.transforms
+    :ptype transforms: tuple
+    :param value: Value to be standardized
+    :ptype value: str
+    """
+    @staticmethod
+    def apply (transforms, value):
+        for transform in transforms:
+            value = transform(value)
+        return value
+
+
+"""
+This function returns the plan of a pair of headers, compiled on first use and reused
+by the later runs of the process with the same headers. Plans are not modified once
+compiled, so they can be shared.
+
+Parameters:
+:param jstore_columns: JStore column names, in row order
+:ptype jstore_columns: list
+:param cortex_columns: Cortex column names, in row order
+:ptype cortex_columns: list
+"""
+def compiled_plan (jstore_columns, cortex_columns):
+    key = (tuple(jstore_columns), tuple(cortex_columns))
+    if key not in compiled_plans:
+        compiled_plans[key] = ColumnPlan(list(jstore_columns), list(cortex_columns))
+    return compiled_plans[key]
@@ -0,0 +1,370 @@
+"""
+Readers for the raw Cortex and JStore exports
+
+Every reader returns the header of the file and a generator of row values, read
+with row-level bulk access. Rows are turned into records sharing one schema built
+from the header, one row at a time, so nothing forces a whole sheet into memory.
+Supported formats are legacy .xls (xlrd), .xlsx (openpyxl read-only mode) and CSV,
+plus rows already in memory as mappings. xlrd and openpyxl are only imported when a
+file of their format is read, so runs without spreadsheets start faster.
+
+Large CSV files can be parsed by several worker processes: the file is memory-mapped
+and split into byte ranges that start on a record boundary, found by counting the
+quotes so that newlines inside quoted fields never split a record. The ranges are
+parsed into lists of values in the workers and yielded back in file order.
+"""
+
+# import the required modules
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import io
+import mmap
+import os
+from records import Record, Schema
+
+# Size of the byte ranges of a CSV file parsed by each worker
+CSV_CHUNK_BYTES = 8 << 20
+
+# CSV files smaller than this are parsed serially, even with several workers
+CSV_PARALLEL_MIN_BYTES = 32 << 20
+
+# Leading bytes of the binary spreadsheet formats
+XLS_SIGNATURE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" # OLE2 compound document
+XLSX_SIGNATURE = b"PK\x03\x04" # zip archive
+
+
+"""
+This function detects the format of the file from its first bytes: xls, xlsx or csv.
+
+Parameters:
+:param path: Path to the raw file
+:ptype path: str
+"""
+def detect_format (path):
+    with open(path, 'rb') as raw_file:
+        head = raw_file.read(len(XLS_SIGNATURE))
+
+    if head.startswith(XLS_SIGNATURE):
+        return "xls"
+    if head.startswith(XLSX_SIGNATURE):
+        return "xlsx"
+    return "csv"
+
+
+"""
+This function reads the header of a CSV file and returns it with a generator of the row values.
+
+Parameters:
+:param path: Path to the CSV file
+:ptype path: str
+"""
+def open_csv (path):
+    csv_file = open(path, 'r')
+    csv_reader = csv.reader(csv_file)
+    headers = tuple(next(csv_reader, ()))
+    width = len(headers)
+
+    # Blank lines are skipped and short rows padded with None, like csv.DictReader does
+    def rows():
+        with csv_file:
+            for values in csv_reader:
+                if not values:
+                    continue
+                if len(values) < width:
+                    values.extend([None] * (width - len(values)))
+                yield values
+
+    return headers, rows()
+
+
+"""
+This function returns the offset following the CSV record that contains position,
+or the end of the file. A newline ends a record only when the quotes seen since the
+start of the record are balanced; doubled quotes inside a field count twice and do
+not change the balance.
+
+Parameters:
+:param mm: Memory-mapped CSV file
+:ptype mm: mmap.mmap
+:param position: Offset inside the record
+:ptype position: int
+:param quotes: Number of quotes between the start of the record and position, modulo 2
+:ptype quotes: int
+"""
+def record_end (mm, position, quotes = 0):
+    while True:
+        newline = mm.find(b"\n", position)
+        if newline == -1:
+            return len(mm)
+        quotes = (quotes + mm[position:newline].count(b'"')) % 2
+        position = newline + 1
+        if quotes == 0:
+            return position
+
+
+"""
+This function splits the records of a CSV file following start into byte ranges of
+about chunk_bytes each, and returns the offsets of the ranges, end of file included.
+
+Parameters:
+:param mm: Memory-mapped CSV file
+:ptype mm: mmap.mmap
+:param start: Offset of the first record
+:ptype start: int
+:param chunk_bytes: Size of the ranges
+:ptype chunk_bytes: int
+"""
+def record_boundaries (mm, start, chunk_bytes = CSV_CHUNK_BYTES):
+    boundaries = [start]
+    while boundaries[-1] + chunk_bytes < len(mm):
+        target = boundaries[-1] + chunk_bytes
+        boundary = record_end(mm, target, mm[boundaries[-1]:target].count(b'"') % 2)
+        if boundary >= len(mm):
+            break
+        boundaries.append(boundary)
+    boundaries.append(len(mm))
+    return boundaries
+
+
+"""
+This function parses a CSV text into lists of values, skipping blank lines and padding
+short rows with None like open_csv. The bytes are decoded and their newlines translated
+as open() does in open_csv, so both readers return the same values.
+
+Parameters:
+:param data: Encoded CSV records
+:ptype data: bytes
+:param width: Number of columns of the header, None to keep the rows as they are
+:ptype width: int
+"""
+def parse_csv (data, width = None):
+    rows = []
+    for values in csv.reader(io.TextIOWrapper(io.BytesIO(data))):
+        if not values:
+            continue
+        if width is not None and len(values) < width:
+            values.extend([None] * (width - len(values)))
+        rows.append(values)
+    return rows
+
+
+"""
+This function is the unit of work of the parallel CSV reader, it parses one byte
+range of the file.
+
+Parameters:
+:param path: Path to the CSV file
+:ptype path: str
+:param start: Offset of the first record of the range
+:ptype start: int
+:param end: Offset following the last record of the range
+:ptype end: int
+:param width: Number of columns of the header
+:ptype width: int
+"""
+def parse_csv_range (path, start, end, width):
+    with open(path, 'rb') as csv_file, mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return parse_csv(mm[start:end], width)
+
+
+"""
+This function reads the header of a CSV file and returns it with a generator of the
+row values, parsed by worker processes. Files smaller than CSV_PARALLEL_MIN_BYTES are
+read with open_csv. At most two ranges per worker are parsed ahead of the consumer.
+
+Parameters:
+:param path: Path to the CSV file
+:ptype path: str
+:param workers: Number of worker processes
+:ptype workers: int
+"""
+def open_csv_parallel (path, workers):
+    if workers < 2 or os.path.getsize(path) < CSV_PARALLEL_MIN_BYTES:
+        return open_csv(path)
+
+    with open(path, 'rb') as csv_file, mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        header_end = record_end(mm, 0)
+        headers = tuple(next(csv.reader(io.TextIOWrapper(io.BytesIO(mm[:header_end]))), ()))
+        boundaries = record_boundaries(mm, header_end, CSV_CHUNK_BYTES)
+
+    width = len(headers)
+    ranges = list(zip(boundaries, boundaries[1:]))
+
+    def rows():
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for start, end in ranges:
+                pending.append(executor.submit(parse_csv_range, path, start, end, width))
+                if len(pending) < 2 * workers:
+                    continue
+                yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    return headers, rows()
+
+
+"""
+This function reads the header of the first sheet of an XLS file and returns it
+with a generator of the row values. Sheets are loaded on demand.
+
+Parameters:
+:param path: Path to the XLS file
+:ptype path: str
+"""
+def open_xls (path):
+    import xlrd
+
+    workbook = xlrd.open_workbook(path, on_demand=True)
+    worksheet = workbook.sheet_by_index(0)
+    headers = tuple(worksheet.row_values(0)) if worksheet.nrows else ()
+
+    def rows():
+        try:
+            for i in range(1, worksheet.nrows):
+                yield worksheet.row_values(i)
+        finally:
+            workbook.release_resources()
+
+    return headers, rows()
+
+
+"""
+This function reads the header of the first sheet of an XLSX file and returns it
+with a generator of the row values. The sheet is streamed in read-only mode and
+empty cells are returned as "", like xlrd does.
+
+Parameters:
+:param path: Path to the XLSX file
+:ptype path: str
+"""
+def open_xlsx (path):
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    worksheet = workbook.worksheets[0]
+    sheet_rows = worksheet.iter_rows(values_only=True)
+    headers = tuple("" if v is None else v for v in next(sheet_rows, ()))
+    width = len(headers)
+
+    def rows():
+        try:
+            for values in sheet_rows:
+                values = ["" if v is None else v for v in values]
+                if len(values) < width:
+                    values.extend([""] * (width - len(values)))
+                yield values
+        finally:
+            workbook.close()
+
+    return headers, rows()
+
+
+"""
+This function returns the header and a generator of the row values of rows held in
+memory as mappings. The header lists the keys of all the rows in first-seen order,
+and the keys missing from a row are read as "".
+
+Parameters:
+:param rows: Rows keyed on the column names
+:ptype rows: list
+"""
+def open_mappings (rows):
+    headers = tuple(dict.fromkeys(key for row in rows for key in row))
+
+    def values():
+        for row in rows:
+            yield [row.get(h, "") for h in headers]
+
+    return headers, values()
+
+
+"""
+This function returns True when the source of a reader is a file path, False for rows in memory.
+
+Parameters:
+:param source: Path to a raw file, or rows keyed on the column names
+:ptype source: object
+"""
+def is_path (source):
+    return isinstance(source, (str, bytes, os.PathLike))
+
+
+# Readers keyed on the file format
+READERS = {
+    "csv": open_csv,
+    "xls": open_xls,
+    "xlsx": open_xlsx,
+    "rows": open_mappings,
+}
+
+
+"""
+This function opens a raw file and returns its header and a generator of the row values.
+
+Parameters:
+:param path: Path to the raw file, or rows keyed on the column names
+:ptype path: str
+:param format: Format of the file (csv, xls, xlsx or rows), detected when None
+:ptype format: str
+:param workers: Number of worker processes parsing a large CSV file
+:ptype workers: int
+"""
+def open_reader (path, format = None, workers = 1):
+    if format is None:
+        format = detect_format(path) if is_path(path) else "rows"
+
+    if format not in READERS:
+        raise Exception("Unknown file type")
+
+    if format == "csv" and workers > 1:
+        return open_csv_parallel(path, workers)
+
+    return READERS[format](path)
+
+
+"""
+This function opens a raw file and returns the schema built from its header with a
+generator of the rows as records sharing it. The header is renamed once, here, so
+the rows never need their columns renamed.
+
+Parameters:
+:param path: Path to the raw file, or rows keyed on the column names
+:ptype path: str
+:param format: Format of the file (csv, xls, xlsx or rows), detected when None
+:ptype format: str
+:param rename: Function returning the column name of a raw header, None keeps the header
+:ptype rename: callable
+:param workers: Number of worker processes parsing a large CSV file
+:ptype workers: int
+"""
+def open_records (path, format = None, rename = None, workers = 1):
+    headers, rows = open_reader(path, format, workers)
+    schema = Schema(headers if rename is None else (rename(h) for h in headers))
+    width = len(schema)
+
+    def records():
+        for values in rows:
+            # Values past the header are dropped, like dict(zip(headers, values)) does
+            if len(values) > width:
+                values = values[:width]
+            yield Record(schema, values)
+
+    return schema, records()
+
+
+"""
+This function yields the rows of a raw file as records keyed on the header,
+all sharing the schema of the file.
+
+Parameters:
+:param path: Path to the raw file
+:ptype path: str
+:param format: Format of the file (csv, xls or xlsx), detected from the file when None
+:ptype format: str
+:param rename: Function returning the column name of a raw header, None keeps the header
+:ptype rename: callable
+"""
+def read_rows (path, format = None, rename = None):
+    return open_records(path, format, rename)[1]
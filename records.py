@@ -0,0 +1,175 @@
+"""
+Compact row representation for the Cortex and JStore data
+
+A plain dict per row repeats the hash table of every column name in every row.
+Here the column names live once per source in a shared Schema, and each Record
+only holds a slot for the schema and a list of values. Records are mutable
+mappings, so the stages keep reading and writing them by column name.
+"""
+
+# import the required modules
+from collections.abc import MutableMapping
+import sys
+
+
+class Schema:
+
+    __slots__ = ("columns", "positions", "derived")
+
+    """
+    Constructor
+
+    Parameters:
+    :param columns: Column names, in order
+    :ptype columns: list
+    """
+    def __init__(self, columns):
+        self.columns = tuple(sys.intern(c) if isinstance(c, str) else c for c in columns) # Column names
+        self.positions = {c: i for i, c in enumerate(self.columns)} # Position per column name
+        self.derived = {} # Schemas derived from this one, shared by all the records deriving them
+
+
+    def __len__ (self):
+        return len(self.columns)
+
+
+    def __reduce__ (self):
+        return (Schema, (self.columns,))
+
+
+    """
+    This method returns the schema with the column appended.
+
+    Parameters:
+    :param column: Column name
+    :ptype column: str
+    """
+    def with_column (self, column):
+        key = ("+", column)
+        if key not in self.derived:
+            self.derived[key] = Schema(self.columns + (column,))
+        return self.derived[key]
+
+
+    """
+    This method returns the schema without the column.
+
+    Parameters:
+    :param column: Column name
+    :ptype column: str
+    """
+    def without_column (self, column):
+        key = ("-", column)
+        if key not in self.derived:
+            self.derived[key] = Schema(c for c in self.columns if c != column)
+        return self.derived[key]
+
+
+    """
+    This method returns the schema restricted to the given columns, in schema order.
+
+    Parameters:
+    :param columns: Columns to be kept
+    :ptype columns: frozenset
+    """
+    def projected (self, columns):
+        key = ("project", columns)
+        if key not in self.derived:
+            self.derived[key] = Schema(c for c in self.columns if c in columns)
+        return self.derived[key]
+
+
+class Record(MutableMapping):
+
+    __slots__ = ("schema", "values")
+
+    """
+    Constructor
+
+    Parameters:
+    :param schema: Shared schema of the source
+    :ptype schema: Schema
+    :param values: Values, in the order of the schema columns
+    :ptype values: list
+    """
+    def __init__(self, schema, values):
+        self.schema = schema # Shared schema
+        self.values = values # Values, in schema order
+
+
+    def __getitem__ (self, key):
+        return self.values[self.schema.positions[key]]
+
+
+    def __setitem__ (self, key, value):
+        position = self.schema.positions.get(key)
+        if position is None:
+            self.schema = self.schema.with_column(key)
+            self.values.append(value)
+        else:
+            self.values[position] = value
+
+
+    def __delitem__ (self, key):
+        position = self.schema.positions[key]
+        self.schema = self.schema.without_column(key)
+        del self.values[position]
+
+
+    def __iter__ (self):
+        return iter(self.schema.columns)
+
+
+    def __len__ (self):
+        return len(self.schema.columns)
+
+
+    def __contains__ (self, key):
+        return key in self.schema.positions
+
+
+    def __repr__ (self):
+        return "Record(" + repr(dict(self.items())) + ")"
+
+
+    def __reduce__ (self):
+        return (Record, (self.schema, self.values))
+
+
+    """
+    This method returns the columns and values as pairs, without a lookup per column.
+    """
+    def items (self):
+        return zip(self.schema.columns, self.values)
+
+
+    """
+    This method returns the record as a plain dictionary.
+    """
+    def to_dict (self):
+        return dict(zip(self.schema.columns, self.values))
+
+
+    """
+    This method returns a new record holding only the given columns.
+
+    Parameters:
+    :param columns: Columns to be kept
+    :ptype columns: frozenset
+    """
+    def project (self, columns):
+        schema = self.schema.projected(columns)
+        return Record(schema, [self.values[self.schema.positions[c]] for c in schema.columns])
+
+
+"""
+This function converts the records nested in data to dictionaries, for the JSON encoders.
+
+Parameters:
+:param value: Value the encoder does not know
+:ptype value: object
+"""
+def to_json (value):
+    if isinstance(value, Record):
+        return value.to_dict()
+    raise TypeError("Object of type " + type(value).__name__ + " is not JSON serializable")
@@ -0,0 +1,243 @@
+"""
+Warm migration server
+
+A local HTTP server running migrations with the library API in one long-lived process,
+so the repeated small jobs of a workflow skip the interpreter start and the imports,
+and find config.py compiled and the transform caches warm from the earlier jobs.
+The jobs run one at a time in the server process, in the order they arrive.
+
+    python server.py --port 8765 --cache_file output/cache.json --root output
+    curl -s localhost:8765/migrate -H 'Content-Type: application/json' -d '{"cortex": "data/cortex.csv", "jstore": "data/jstore.xls", "options": {"match": "normalized"}}'
+
+POST /migrate takes a JSON object with the exports, as paths or lists of rows, an
+optional output_dir and the long command line options, and returns the results of
+api.migrate. GET /status returns the number of jobs run and the cache counters.
+Invalid jobs, options and missing exports are answered with 400, failed migrations
+with 500.
+
+The server listens on the loopback interface only, and a web page must not be able to
+use it: requests with another Host than the loopback, or from another Origin, are
+answered with 403, and a body that is not application/json, which a page can post
+without asking, with 415. The output_dir of a job and the options writing files are
+resolved under the --root directory and refused outside it, and refused altogether
+when the server runs without --root. The exports are only read, and read as given.
+"""
+
+# import the required modules
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from records import to_json
+from cache import save_caches
+import standardize
+import api
+from urllib.parse import urlsplit
+import argparse
+import json
+import logging
+import os
+import time
+
+# Host names of the loopback interface accepted in the Host and Origin headers
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+# Options naming a file the migration writes, resolved under the root directory
+PATH_OPTIONS = ("cache_file", "incremental", "vocabulary")
+
+
+class MigrationServer(HTTPServer):
+
+    """
+    Constructor
+
+    Parameters:
+    :param address: Host and port to listen on
+    :ptype address: tuple
+    :param logger: Logger object
+    :ptype logger: logging.Logger
+    :param cache_file: File the transform caches are loaded from at start and saved to on shutdown
+    :ptype cache_file: str
+    :param root: Directory the jobs may write to, None to refuse the jobs writing files
+    :ptype root: str
+    """
+    def __init__(self, address, logger, cache_file = None, root = None):
+        super().__init__(address, MigrationHandler)
+        self.logger = logger # Logger object
+        self.cache_file = cache_file # File the transform caches are loaded from and saved to
+        self.root = os.path.realpath(root) if root else None # Directory the jobs may write to
+        self.jobs = 0 # Number of migrations run
+        self.failed = 0 # Number of migrations that raised
+
+
+    """
+    This method returns a path a job writes to, resolved under the root directory.
+    A path outside the root, or any path without a root, raises InvalidMigration.
+
+    Parameters:
+    :param name: Name of the field or option giving the path
+    :ptype name: str
+    :param path: Path given by the job, relative to the root
+    :ptype path: str
+    """
+    def confine (self, name, path):
+        if self.root is None:
+            raise api.InvalidMigration(name + " writes files, which the server only allows under its --root directory")
+        if not isinstance(path, str):
+            raise api.InvalidMigration("Invalid value of {}: {}, a path is expected".format(name, path))
+
+        resolved = os.path.realpath(os.path.join(self.root, path))
+        if os.path.commonpath([resolved, self.root]) != self.root:
+            raise api.InvalidMigration("{} is outside the root directory of the server: {}".format(name, path))
+        return resolved
+
+
+    """
+    This method runs one migration and returns its results.
+
+    Parameters:
+    :param job: Exports, output directory and options of the migration
+    :ptype job: dict
+    """
+    def migrate (self, job):
+        missing = [f for f in ("cortex", "jstore") if f not in job]
+        if missing:
+            raise api.InvalidMigration("Job without " + ", ".join(missing))
+
+        options = job.get("options", {})
+        if not isinstance(options, dict):
+            raise api.InvalidMigration("The options of a job must be a JSON object")
+        if "output_dir" in options:
+            raise api.InvalidMigration("output_dir is a field of the job, not an option")
+
+        # Nothing is written outside the root directory
+        options = {name: self.confine(name, value) if name in PATH_OPTIONS and value is not None else value for name, value in options.items()}
+        output_dir = self.confine("output_dir", job["output_dir"]) if job.get("output_dir") is not None else None
+
+        start = time.perf_counter()
+        self.jobs += 1
+        try:
+            result = api.migrate(job["cortex"], job["jstore"], output_dir = output_dir, logger = self.logger, warm_caches = True, **options)
+        except Exception:
+            self.failed += 1
+            raise
+
+        self.logger.info("MigrationServer::migrate: job {} in {:.3f}s".format(self.jobs, time.perf_counter() - start))
+        return result
+
+
+    """
+    This method returns the status of the server.
+    """
+    def status (self):
+        return {"jobs": self.jobs, "failed": self.failed, "caches": standardize.cache_stats()}
+
+
+class MigrationHandler(BaseHTTPRequestHandler):
+
+    """
+    This method returns True when the request comes from the local machine: the Host
+    is the loopback interface, so no other site name resolves to the server, and the
+    Origin, when a browser sends one, is a local page.
+    """
+    def is_local (self):
+        origin = self.headers.get("Origin")
+        try:
+            if urlsplit("//" + self.headers.get("Host", "")).hostname not in LOCAL_HOSTS:
+                return False
+            return origin is None or urlsplit(origin).hostname in LOCAL_HOSTS
+        except ValueError:
+            return False
+
+
+    def do_GET (self):
+        if not self.is_local():
+            return self.reply(403, {"error": "requests are only accepted from the local machine"})
+        if self.path != "/status":
+            return self.reply(404, {"error": "unknown path " + self.path})
+        self.reply(200, self.server.status())
+
+
+    def do_POST (self):
+        if self.path != "/migrate":
+            return self.reply(404, {"error": "unknown path " + self.path})
+        if not self.is_local():
+            return self.reply(403, {"error": "requests are only accepted from the local machine"})
+        if self.headers.get_content_type() != "application/json":
+            return self.reply(415, {"error": "the job must be sent as application/json"})
+
+        try:
+            job = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if not isinstance(job, dict):
+                raise ValueError("The job must be a JSON object")
+        except ValueError as e:
+            return self.reply(400, {"error": str(e)})
+
+        try:
+            self.reply(200, self.server.migrate(job))
+        except api.InvalidMigration as e:
+            self.reply(400, {"error": str(e)})
+        except Exception as e:
+            self.reply(500, {"error": str(e)})
+
+
+    """
+    This method sends a JSON response.
+
+    Parameters:
+    :param code: HTTP status code
+    :ptype code: int
+    :param body: Body of the response
+    :ptype body: object
+    """
+    def reply (self, code, body):
+        data = json.dumps(body, default=to_json).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+    def log_message (self, format, *args):
+        self.server.logger.debug("MigrationHandler: " + format % args)
+
+
+"""
+Main program
+"""
+def main ():
+  parser = argparse.ArgumentParser (description="Cortex2JStore server: runs migrations in one warm process")
+  parser.add_argument ("-l", "--loglevel", type=int, default=logging.INFO, choices=[logging.DEBUG,logging.INFO,logging.WARNING,logging.ERROR,logging.CRITICAL], help="logging level, choices 10,20,30,40,50: default 20=logging.INFO")
+  parser.add_argument ("--port", type=int, default=8765, help="port listened on, on the loopback interface: default 8765")
+  parser.add_argument ("--cache_size", type=int, default=standardize.DEFAULT_CACHE_SIZE, help="maximum number of distinct values kept by each name and comma transform cache: default 100000")
+  parser.add_argument ("--cache_file", type=str, default=None, help="json file the transform caches are loaded from at start and saved to on shutdown: default none")
+  parser.add_argument ("--root", type=str, default=None, help="directory the output_dir and the files of the jobs are resolved under, jobs writing elsewhere are refused: default none, jobs may only return their results")
+  args = parser.parse_args ()
+
+  logger = logging.getLogger ("Cortex2JStore")
+  logger.setLevel (args.loglevel)
+
+  # The caches are set up once, the jobs keep them warm
+  standardize.configure_caches (size = args.cache_size, path = args.cache_file)
+
+  server = MigrationServer (("127.0.0.1", args.port), logger, args.cache_file, args.root)
+  logger.info ("Main: listening on 127.0.0.1:{}".format (args.port))
+  try:
+    server.serve_forever ()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close ()
+    if args.cache_file:
+      save_caches (standardize.caches, args.cache_file)
+      logger.info ("Main: caches saved to " + args.cache_file)
+
+
+"""
+Main entry point for the program
+"""
+if __name__ == "__main__":
+
+  # set underlying default logging capabilities
+  logging.basicConfig (level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+  main ()
@@ -0,0 +1,219 @@
+"""
+Out-of-core Cortex index for exports larger than memory
+
+The Cortex rows are spilled to a SQLite table keyed on "Original File Name", with an
+index on the normalized file name, and the JStore rows are streamed against it one
+at a time, so the join runs in bounded memory and keeps the JStore order. Only the
+n-gram postings of the fuzzy pass, built on the normalized file names, stay in memory.
+
+The driver switches to this index when the exports are estimated to outgrow the
+memory budget; the estimate is the file size times the expansion of the rows read
+from each format.
+"""
+
+# import the required modules
+from matching import MatchIndex
+from matching import ngrams
+from records import Record
+import readers
+import os
+import pickle
+import sqlite3
+
+# Estimated in-memory size of the rows read from a raw export, per byte of the file
+MEMORY_EXPANSION = {
+    "csv": 5,
+    "xls": 4,
+    "xlsx": 10,
+}
+
+# Memory budget when the physical memory cannot be read, in MB
+DEFAULT_MEMORY_BUDGET_MB = 4096
+
+# Rows inserted into the spilled index per batch
+SPILL_BATCH_ROWS = 10000
+
+# Page cache of the spilled index, in MB
+SPILL_CACHE_MB = 64
+
+
+"""
+This function returns the default memory budget in MB, half of the physical memory.
+"""
+def default_memory_budget ():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (2 * 1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return DEFAULT_MEMORY_BUDGET_MB
+
+
+"""
+This function returns the estimated memory taken by the rows of a raw export, in MB.
+Rows given in memory are already resident and count as 0.
+
+Parameters:
+:param path: Path to the raw file
+:ptype path: str
+"""
+def estimate_memory (path):
+    if not readers.is_path(path):
+        return 0
+    return os.path.getsize(path) * MEMORY_EXPANSION[readers.detect_format(path)] / (1024 * 1024)
+
+
+class SpillIndex(MatchIndex):
+
+    """
+    Constructor
+
+    Parameters:
+    :param path: Path to the SQLite file, removed when the index is closed
+    :ptype path: str
+    :param mode: Last matching pass to run: exact, normalized or fuzzy
+    :ptype mode: str
+    :param normalizers: Names of the key normalizers of the normalized and fuzzy passes
+    :ptype normalizers: list
+    :param max_distance: Largest edit distance accepted by the fuzzy pass
+    :ptype max_distance: int
+    """
+    def __init__(self, path, mode = "exact", normalizers = (), max_distance = 2):
+        super().__init__(mode, normalizers, max_distance)
+        self.path = path # Path to the SQLite file
+        self.schema = None # Shared schema of the indexed rows
+        self.pending = [] # Rows not inserted yet
+        self.added = 0 # Number of rows added, the position of the next one
+        self.finished = False # All the rows were inserted and indexed
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+        # The file is scratch space, rebuilt by every run, so it is written without a journal.
+        # The pipeline mode matches in another thread than the one that built the index.
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.executescript("""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            PRAGMA cache_size = -{};
+            CREATE TABLE rows (key TEXT PRIMARY KEY, normalized TEXT, count INTEGER, row BLOB, targets INTEGER DEFAULT 0, position INTEGER);
+        """.format(SPILL_CACHE_MB * 1024))
+
+
+    def __len__ (self):
+        self.finish()
+        return self.connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+
+    """
+    This method adds a row to the index. Rows are inserted in batches, and a later
+    row with the same key replaces the earlier one, as in the in-memory index. The
+    position of a key is the one of its first row, then of its second one.
+
+    Parameters:
+    :param key: Exact key of the row
+    :ptype key: str
+    :param row: Indexed row
+    :ptype row: Record
+    """
+    def add (self, key, row):
+        self.schema = row.schema
+        normalized = None if self.mode == "exact" else self.normalize(key)
+        self.pending.append((key, normalized, pickle.dumps(row.values, protocol=5), self.added))
+        self.added += 1
+
+        if self.mode == "fuzzy":
+            for gram in ngrams(normalized):
+                self.postings[(len(normalized), gram)].add(normalized)
+
+        if len(self.pending) >= SPILL_BATCH_ROWS:
+            self.flush()
+
+
+    """
+    This method inserts the pending rows.
+    """
+    def flush (self):
+        self.connection.executemany("""
+            INSERT INTO rows (key, normalized, count, row, position) VALUES (?, ?, 1, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET normalized = excluded.normalized, count = count + 1, row = excluded.row,
+                position = CASE WHEN count = 1 THEN excluded.position ELSE position END
+        """, self.pending)
+        self.pending = []
+
+
+    """
+    This method inserts the pending rows, indexes the normalized keys and collects
+    the keys seen more than once.
+    """
+    def finish (self):
+        if self.finished:
+            return
+
+        self.flush()
+        if self.mode != "exact":
+            self.connection.execute("CREATE INDEX rows_normalized ON rows (normalized)")
+        self.connection.commit()
+
+        # In the order the keys were first seen again, like the in-memory index
+        self.duplicates = dict(self.connection.execute("SELECT key, count FROM rows WHERE count > 1 ORDER BY position"))
+        self.finished = True
+
+
+    """
+    This method closes the index and removes its file.
+    """
+    def close (self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+            os.remove(self.path)
+
+
+    """
+    This method records a JStore key matched to an exact key, and returns the number
+    of JStore keys matched to it so far. The counts stay on disk with the rows.
+
+    Parameters:
+    :param key: Exact key
+    :ptype key: str
+    """
+    def target (self, key):
+        self.finish()
+        return self.connection.execute("UPDATE rows SET targets = targets + 1 WHERE key = ? RETURNING targets", (key,)).fetchone()[0]
+
+
+    """
+    This method returns the number of JStore keys matched to an exact key.
+
+    Parameters:
+    :param key: Exact key
+    :ptype key: str
+    """
+    def targets_of (self, key):
+        self.finish()
+        found = self.connection.execute("SELECT targets FROM rows WHERE key = ?", (key,)).fetchone()
+        return 0 if found is None else found[0]
+
+
+    """
+    This method returns the row of an exact key, or None.
+
+    Parameters:
+    :param key: Exact key
+    :ptype key: str
+    """
+    def row (self, key):
+        self.finish()
+        found = self.connection.execute("SELECT row FROM rows WHERE key = ?", (key,)).fetchone()
+        return None if found is None else Record(self.schema, pickle.loads(found[0]))
+
+
+    """
+    This method returns the exact keys of a normalized key.
+
+    Parameters:
+    :param normalized: Normalized key
+    :ptype normalized: str
+    """
+    def keys (self, normalized):
+        self.finish()
+        return [key for (key,) in self.connection.execute("SELECT key FROM rows WHERE normalized = ?", (normalized,))]
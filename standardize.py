@@ -0,0 +1,253 @@
+"""
+JStore schema standardization
+
+Pure, per-value string transforms applied to the JStore schema columns, so chunks
+of rows can be standardized in worker processes. Each process keeps its own LRU
+caches in front of the comma and name transforms. The transforms are registered
+by name in TRANSFORMS and chained per column in config.jstore_schema_columns.
+"""
+
+# import the required modules
+from cache import LRUCache
+from cache import load_caches
+import re
+
+# Commas with no space on either side are list separators in the exports, the start and
+# the end of the string count as no space
+COMMA_SEPARATOR = re.compile(r"(?<! ),(?! )")
+
+# Name suffixes, the word before a suffix is the last name
+SUFFIXES = frozenset(["Jr.", "Sr.", "II.", "III.", "IV.", "V.", "VI.", "VII.", "VIII.", "IX.", "X."])
+
+# Default number of distinct values kept by each transform cache
+DEFAULT_CACHE_SIZE = 100000
+
+# Caches in front of the comma and name transforms, one set per process
+caches = {
+    "comma_replace_pipe": LRUCache(DEFAULT_CACHE_SIZE),
+    "format_name": LRUCache(DEFAULT_CACHE_SIZE),
+}
+
+
+"""
+This function resets the transform caches of the current process, optionally warming
+them from a cache file. It is also the initializer of the worker processes.
+
+Parameters:
+:param size: Maximum number of entries per cache
+:ptype size: int
+:param path: Path to a cache file saved by a previous run
+:ptype path: str
+:param record: Flag to record the computed entries, so they can be reported to the parent process
+:ptype record: bool
+"""
+def configure_caches (size = DEFAULT_CACHE_SIZE, path = None, record = False):
+    for name in caches:
+        caches[name] = LRUCache(size, record)
+    load_caches(caches, path)
+
+
+"""
+This function returns the counters of the transform caches of the current process.
+"""
+def cache_stats ():
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+"""
+This function standardizes a single JStore row in place. The steps come from a
+compiled ColumnPlan: the position of every schema column in the row, with its
+chain of transforms.
+
+Parameters:
+:param row: JStore row to be standardized
+:ptype row: Record
+:param steps: Tuples of (column position, transforms)
+:ptype steps: tuple
+"""
+def standardize_row (row, steps):
+    values = row.values
+    for position, transforms in steps:
+        value = values[position]
+        for transform in transforms:
+            value = transform(value)
+        values[position] = value
+
+    return row
+
+
+"""
+This function standardizes a chunk of JStore rows and returns them. The local
+subjects of the standardized rows are counted in the vocabulary, in the same pass.
+
+Parameters:
+:param rows: JStore rows to be standardized
+:ptype rows: list
+:param steps: Tuples of (column position, transforms)
+:ptype steps: tuple
+:param vocabulary: Vocabulary collecting the local subjects, None to skip it
+:ptype vocabulary: Vocabulary
+"""
+def standardize_rows (rows, steps, vocabulary = None):
+    for row in rows:
+        standardize_row(row, steps)
+        if vocabulary is not None:
+            vocabulary.add_row(row)
+    return rows
+
+
+"""
+This function is the unit of work sent to the worker processes. It returns the
+standardized rows together with the cache reports and the vocabulary of this chunk,
+so that the parent process can account for the lookups, keep the newly computed
+values and merge the vocabularies in chunk order.
+
+Parameters:
+:param rows: JStore rows to be standardized
+:ptype rows: list
+:param steps: Tuples of (column position, transforms)
+:ptype steps: tuple
+:param vocabulary: Empty vocabulary collecting the local subjects of the chunk
+:ptype vocabulary: Vocabulary
+"""
+def standardize_chunk (rows, steps, vocabulary = None):
+    standardize_rows(rows, steps, vocabulary)
+    return rows, {name: cache.drain() for name, cache in caches.items()}, vocabulary
+
+
+"""
+This function will replace the commas with pipes in the given string, only if there
+is no space before and after the comma. The start and the end of the string count
+as "no space".
+
+Parameters:
+:param string: String to be processed
+:ptype string: str
+"""
+def comma_replace_pipe (string):
+    if "," not in string:
+        return string
+    return COMMA_SEPARATOR.sub("|", string)
+
+
+"""
+This function is comma_replace_pipe behind the transform cache of the current process.
+
+Parameters:
+:param string: String to be processed
+:ptype string: str
+"""
+def cached_comma_replace_pipe (string):
+    return caches["comma_replace_pipe"].get(string, comma_replace_pipe)
+
+
+"""
+This function standardizes the naming convention of a pipe separated list of people
+to <LastName, FirstName + Extra>. Names that cannot be standardized are dropped.
+
+Parameters:
+:param string: Pipe separated list of people
+:ptype string: str
+"""
+def standardize_vanderbilt_people (string):
+    # Split the string by pipe
+    values_list = string.split('|')
+    new_values_list = []
+    for name in values_list:
+        formatted_name = caches["format_name"].get(name, format_name)
+        if formatted_name != "":
+            new_values_list.append(formatted_name)
+
+    formatted_names =  '|'.join(new_values_list)
+
+    return formatted_names
+
+
+"""
+This function formats a single name as <LastName, FirstName + Extra>.
+Every word is visited a constant number of times, the positions of repeated
+words are those of their first occurrence, as the original list.index() based
+implementation did.
+
+Parameters:
+:param name: Name to be formatted
+:ptype name: str
+"""
+def format_name(name):
+    parts = name.split()
+
+    if len(parts) < 2:
+        # Logic: If there is only one part in the name,
+        # then return the name as it is.
+        return name
+
+    elif len(parts) == 2:
+        # Logic: If there are two parts in the name,
+        # then return the name as <LastName, FirstName>
+        return f"{parts[1]}, {parts[0]}"
+
+    # Logic: If there are more than two parts in the name,
+    # then first check if the name contains a suffix.
+    # If it does, then take the word before the suffix as the last name.
+    # and then append whatever is left as the extra.
+    # If it does not, then take the last word as the last name.
+    suffix_location = suffix_index(parts)
+
+    if suffix_location is None:
+        # We need to check if there is paranthesis at the end of the name
+        if parts[-1][-1] in "()":
+            return ""
+        
+        return f"{parts[-1]}, {' '.join(parts[:-1])}"
+
+    last_name = parts[suffix_location - 1]
+
+    # The extra is every word but the last name, a repeated word is dropped
+    # with it when its first occurrence is the last name.
+    first = first_positions(parts)
+    extra_parts = [part for part in parts if first[part] != suffix_location - 1]
+
+    # Divide the extra in two parts around its own first suffix
+    suffix_location = suffix_index(extra_parts) or 0
+    first = first_positions(extra_parts)
+    last = len(extra_parts) - 1
+
+    before_suffix = ' '.join(part for part in extra_parts if first[part] < suffix_location) + ","
+    after_suffix = ''.join(part if first[part] == last else part + ' ' for part in extra_parts if first[part] >= suffix_location)
+
+    return f"{last_name}, {before_suffix} {after_suffix}"
+
+
+"""
+This function returns the position of the first suffix in the list of words, or None.
+
+Parameters:
+:param parts: Words of a name
+:ptype parts: list
+"""
+def suffix_index (parts):
+    for i, part in enumerate(parts):
+        if part in SUFFIXES:
+            return i
+    return None
+
+
+"""
+This function maps every word of the list to the position of its first occurrence.
+
+Parameters:
+:param parts: Words of a name
+:ptype parts: list
+"""
+def first_positions (parts):
+    first = {}
+    for i, part in enumerate(parts):
+        first.setdefault(part, i)
+    return first
+
+
+# Transforms that can be chained on a column in config.jstore_schema_columns
+TRANSFORMS = {
+    "comma_replace_pipe": cached_comma_replace_pipe,
+    "standardize_vanderbilt_people": standardize_vanderbilt_people,
+}
@@ -0,0 +1,192 @@
+"""
+State store for incremental migrations
+
+Keeps a fingerprint of every JStore row and Cortex record seen by the previous
+run in a local SQLite database, along with the standardized JStore output, so
+that only changed rows are merged and standardized again.
+"""
+
+# import the required modules
+from config import match_columns
+from config import jstore_schema_columns
+import hashlib
+import json
+from records import to_json
+import sqlite3
+
+# Cortex column holding the unique identifier of a record, the source of the JStore "Identifier[2071405]"
+CORTEX_IDENTIFIER = match_columns.get("Identifier[2071405]", "Unique Identifier")
+
+# Bump when the standardization logic changes, so that every cached output is rebuilt
+STATE_VERSION = 1
+
+
+"""
+This function returns a stable fingerprint of the given values.
+
+Parameters:
+:param values: JSON serializable values
+:ptype values: list
+"""
+def fingerprint (values):
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+class StateStore:
+
+    """
+    Constructor
+
+    Parameters:
+    :param path: Path to the SQLite database
+    :ptype path: str
+    :param logger: Logger object
+    :ptype logger: logging.Logger
+    """
+    def __init__(self, path, logger):
+        self.path = path # Path to the SQLite database
+        self.logger = logger # Logger object
+        self.connection = None # SQLite connection
+        self.cortex_columns = list(dict.fromkeys(match_columns.values())) # Cortex columns used by the merge
+
+
+    """
+    This method opens the database and creates the tables. A state written with a
+    different configuration or state version is discarded.
+    """
+    def open (self):
+        try:
+            self.logger.info("StateStore::open: " + self.path)
+
+            self.connection = sqlite3.connect(self.path)
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS cortex (identifier TEXT PRIMARY KEY, fingerprint TEXT);
+                CREATE TABLE IF NOT EXISTS jstore (filename TEXT PRIMARY KEY, fingerprint TEXT, output TEXT);
+            """)
+
+            config_fingerprint = fingerprint([STATE_VERSION, list(match_columns.items()), sorted(jstore_schema_columns.items())])
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'config'").fetchone()
+
+            if row is None or row[0] != config_fingerprint:
+                self.logger.info("StateStore::open: configuration changed, discarding the previous state")
+                self.connection.execute("DELETE FROM cortex")
+                self.connection.execute("DELETE FROM jstore")
+                self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('config', ?)", (config_fingerprint,))
+                self.connection.commit()
+
+        except Exception as e:
+            self.logger.error("StateStore::open: Exception: " + str(e))
+            raise e
+
+
+    """
+    This method returns the fingerprint of the Cortex columns used by the merge.
+
+    Parameters:
+    :param cortex_row: Cleaned up Cortex row
+    :ptype cortex_row: dict
+    """
+    def cortex_fingerprint (self, cortex_row):
+        return fingerprint([cortex_row.get(c) for c in self.cortex_columns])
+
+
+    """
+    This method returns the fingerprint of a match, covering the raw JStore row
+    and the fingerprint of its Cortex record.
+
+    Parameters:
+    :param jstore_row: Raw JStore row
+    :ptype jstore_row: dict
+    :param cortex_fingerprint: Fingerprint of the matching Cortex record
+    :ptype cortex_fingerprint: str
+    """
+    def match_fingerprint (self, jstore_row, cortex_fingerprint):
+        return fingerprint([list(jstore_row.items()), cortex_fingerprint])
+
+
+    """
+    This method records the Cortex fingerprints keyed on their identifier and
+    returns the number of new or changed Cortex records.
+
+    Parameters:
+    :param fingerprints: Cortex fingerprints keyed on the Cortex identifier, folded for the records sharing one
+    :ptype fingerprints: dict
+    """
+    def update_cortex (self, fingerprints):
+        try:
+            previous = dict(self.connection.execute("SELECT identifier, fingerprint FROM cortex"))
+            changed = sum(1 for k, v in fingerprints.items() if previous.get(k) != v)
+
+            self.connection.execute("DELETE FROM cortex")
+            self.connection.executemany("INSERT INTO cortex VALUES (?, ?)", fingerprints.items())
+
+            return changed
+
+        except Exception as e:
+            self.logger.error("StateStore::update_cortex: Exception: " + str(e))
+            raise e
+
+
+    """
+    This method returns the fingerprints of the JStore rows of the previous run keyed on "Filename".
+    """
+    def jstore_fingerprints (self):
+        return dict(self.connection.execute("SELECT filename, fingerprint FROM jstore"))
+
+
+    """
+    This method returns the cached standardized rows of the given file names.
+
+    Parameters:
+    :param filenames: JStore file names
+    :ptype filenames: list
+    """
+    def outputs (self, filenames):
+        try:
+            outputs = {}
+            cursor = self.connection.execute("SELECT filename, output FROM jstore")
+            wanted = set(filenames)
+
+            for filename, output in cursor:
+                if filename in wanted:
+                    outputs[filename] = json.loads(output)
+
+            return outputs
+
+        except Exception as e:
+            self.logger.error("StateStore::outputs: Exception: " + str(e))
+            raise e
+
+
+    """
+    This method stores the fingerprints and standardized rows of the changed JStore rows,
+    drops the rows that are no longer exported and commits the run.
+
+    Parameters:
+    :param changed: Tuples of (filename, fingerprint, standardized row)
+    :ptype changed: list
+    :param removed: File names no longer present in the JStore export
+    :ptype removed: list
+    """
+    def commit (self, changed, removed):
+        try:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO jstore VALUES (?, ?, ?)",
+                ((filename, fp, json.dumps(row, ensure_ascii=False, default=to_json)) for filename, fp, row in changed),
+            )
+            self.connection.executemany("DELETE FROM jstore WHERE filename = ?", ((f,) for f in removed))
+            self.connection.commit()
+
+        except Exception as e:
+            self.logger.error("StateStore::commit: Exception: " + str(e))
+            raise e
+
+
+    """
+    This method closes the database.
+    """
+    def close (self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,59 @@
+"""
+Shared fixtures of the tests: a small synthetic Cortex/JStore export pair, written
+with the benchmark generator, and a runner of the whole pipeline in process.
+"""
+
+# import the required modules
+import json
+import logging
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from cortex2jstore import Cortex2JStore
+from cortex2jstore import build_parser
+import pytest
+import synthetic
+
+# JStore rows of the synthetic exports, enough for duplicates, misses and subjects
+EXPORT_ROWS = 300
+
+
+@pytest.fixture(scope="session")
+def exports (tmp_path_factory):
+    return synthetic.write_dataset(str(tmp_path_factory.mktemp("exports")), EXPORT_ROWS, match_ratio = 0.9)
+
+
+"""
+This fixture returns a function running configure and driver on the exports with
+command line options, and returning the application object. Errors are raised.
+"""
+@pytest.fixture
+def run (exports):
+    def run (output_dir, *options):
+        args = build_parser().parse_args(["-c", exports[0], "-j", exports[1], "-o", str(output_dir), "-l", "30", "-f", "ndjson"] + list(options))
+        appln = Cortex2JStore(logging.getLogger("Cortex2JStore.tests"))
+        appln.configure(args)
+        appln.driver()
+        return appln
+
+    return run
+
+
+"""
+This fixture returns a function reading the rows of an NDJSON artifact from an output
+directory, or None when the artifact was not written.
+"""
+@pytest.fixture
+def artifact ():
+    def artifact (output_dir, name):
+        path = os.path.join(str(output_dir), name + ".ndjson")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as artifact_file:
+            return [json.loads(line) for line in artifact_file]
+
+    return artifact
@@ -0,0 +1,143 @@
+"""
+Library API and warm server: results, and client mistakes reported as such.
+"""
+
+# import the required modules
+from server import MigrationServer
+import api
+import json
+import logging
+import pytest
+import threading
+import urllib.error
+import urllib.request
+
+
+def test_migrate_inputs (exports, tmp_path, run, artifact):
+    run(tmp_path / "reference")
+    expected = artifact(tmp_path / "reference", "finaljstore")
+
+    with open(exports[1], 'rb') as jstore_file:
+        result = api.migrate(exports[0], jstore_file)
+    assert result["rows"] == expected
+    assert result["match_report"]["matched"]["exact"] == len(expected)
+
+    # Rows given in memory are read like a file with the same header
+    again = api.migrate(exports[0], [dict(row) for row in artifact(tmp_path / "reference", "jstore")])
+    assert again["rows"] == expected
+
+
+@pytest.mark.parametrize("options", [
+    {"bogus": 1},
+    {"cortex_raw": "elsewhere.csv"},
+    {"match": "nope"},
+    {"workers": "2"},
+    {"stream": True},
+    {"engine": "columnar", "match": "fuzzy"},
+])
+def test_migrate_invalid_options (exports, options):
+    with pytest.raises(api.InvalidMigration):
+        api.migrate(exports[0], exports[1], **options)
+
+
+def test_migrate_missing_export (exports, tmp_path):
+    with pytest.raises(api.InvalidMigration):
+        api.migrate(str(tmp_path / "missing.csv"), exports[1])
+
+
+"""
+This fixture returns a function starting a server in a thread, with a root directory
+or without, and returning its URL. The servers are shut down after the test.
+"""
+@pytest.fixture
+def start_server ():
+    servers = []
+
+    def start_server (root = None):
+        server = MigrationServer(("127.0.0.1", 0), logging.getLogger("Cortex2JStore.tests"), root = root)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return "http://127.0.0.1:{}".format(server.server_address[1])
+
+    yield start_server
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def server (start_server):
+    return start_server()
+
+
+def post (url, job, **headers):
+    headers.setdefault("Content-Type", "application/json")
+    request = urllib.request.Request(url + "/migrate", data=json.dumps(job).encode("utf-8"), headers=headers)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_server_status_codes (exports, server):
+    status, result = post(server, {"cortex": exports[0], "jstore": exports[1]})
+    assert status == 200 and result["rows"]
+
+    for job in [
+        {"cortex": exports[0]},
+        {"cortex": exports[0], "jstore": exports[1], "options": {"bogus": 1}},
+        {"cortex": exports[0], "jstore": exports[1], "options": {"output_dir": "elsewhere"}},
+        {"cortex": exports[0], "jstore": exports[1], "options": {"pipeline": True}},
+        {"cortex": "missing.csv", "jstore": exports[1]},
+    ]:
+        status, result = post(server, job)
+        assert status == 400, result
+
+
+def test_server_refuses_other_sites (exports, server):
+    job = {"cortex": exports[0], "jstore": exports[1]}
+
+    # A page can post a form or text/plain body without a preflight, but not JSON
+    for content_type in ["text/plain", "application/x-www-form-urlencoded", "multipart/form-data; boundary=x"]:
+        status, result = post(server, job, **{"Content-Type": content_type})
+        assert status == 415, result
+
+    # A site name resolving to the loopback interface, or a page of another site
+    for headers in [{"Host": "attacker.example"}, {"Host": "attacker.example:8765"}, {"Origin": "http://attacker.example"}, {"Origin": "null"}]:
+        status, result = post(server, job, **headers)
+        assert status == 403, (headers, result)
+
+    status, result = post(server, job, Host = "localhost", Origin = "http://localhost:3000")
+    assert status == 200, result
+
+
+def test_server_confines_paths (exports, tmp_path, start_server):
+    job = {"cortex": exports[0], "jstore": exports[1]}
+    root = tmp_path / "root"
+    root.mkdir()
+
+    # Without a root directory the jobs do not write files
+    server = start_server()
+    for fields in [{"output_dir": str(root / "output")}, {"options": {"vocabulary": str(root / "vocabulary.db")}}]:
+        status, result = post(server, dict(job, **fields))
+        assert status == 400, result
+    assert not list(root.iterdir())
+
+    server = start_server(str(root))
+    for fields in [
+        {"output_dir": "../output"},
+        {"output_dir": str(tmp_path / "output")},
+        {"options": {"cache_file": "../cache.json"}},
+        {"options": {"incremental": str(tmp_path / "state.db")}},
+        {"options": {"vocabulary": "sub/../../vocabulary.db"}},
+    ]:
+        status, result = post(server, dict(job, **fields))
+        assert status == 400, (fields, result)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["root"]
+    assert not list(root.iterdir())
+
+    status, result = post(server, dict(job, output_dir = "output", options = {"vocabulary": "vocabulary.db"}))
+    assert status == 200, result
+    assert result["output_dir"] == str(root / "output")
+    assert (root / "vocabulary.db").exists()
@@ -0,0 +1,88 @@
+"""
+Batch mode: several collections migrated concurrently, each one as a single run would.
+"""
+
+# import the required modules
+from cortex2jstore import Cortex2JStore
+from cortex2jstore import build_parser
+from vocabulary import VocabularyStore
+import batch
+import json
+import logging
+import os
+import pytest
+import synthetic
+
+# JStore rows of the collections, of different sizes so they start in size order
+COLLECTIONS = {"alumni": 120, "campus": 60, "football": 200}
+
+
+@pytest.fixture(scope="module")
+def collections (tmp_path_factory):
+    directory = tmp_path_factory.mktemp("collections")
+    for seed, (name, rows) in enumerate(COLLECTIONS.items()):
+        synthetic.write_dataset(str(directory / name), rows, seed = seed)
+    return directory
+
+
+"""
+This function runs a batch with command line options and returns the summaries.
+"""
+def run_batch (output_dir, collections, *options):
+    args = build_parser().parse_args(["-o", str(output_dir), "-l", "30", "-f", "ndjson", "-a", "final"] + list(options))
+    return batch.run_batch(Cortex2JStore, collections, args, logging.getLogger("Cortex2JStore.tests"))
+
+
+def test_find_collections (collections):
+    found = batch.find_collections(str(collections / "*"))
+    assert [c["name"] for c in found] == sorted(COLLECTIONS)
+    assert all(os.path.basename(c["cortex"]) == "cortex.csv" and os.path.basename(c["jstore"]) == "jstore.xlsx" for c in found)
+
+
+@pytest.mark.parametrize("format", ["json", "csv"])
+def test_load_manifest (collections, format):
+    path = collections / ("manifest." + format)
+    if format == "json":
+        path.write_text(json.dumps([{"name": "campus", "cortex": "campus/cortex.csv", "jstore": "campus/jstore.xlsx"}]))
+    else:
+        path.write_text("name,cortex,jstore\ncampus,campus/cortex.csv,campus/jstore.xlsx\n")
+
+    assert batch.load_manifest(str(path)) == [{"name": "campus", "cortex": str(collections / "campus" / "cortex.csv"), "jstore": str(collections / "campus" / "jstore.xlsx")}]
+
+    if format == "json":
+        path.write_text(json.dumps([{"name": "campus", "cortex": "campus/cortex.csv"}]))
+    else:
+        path.write_text("name,cortex,jstore\ncampus,campus/cortex.csv,\n")
+    with pytest.raises(Exception, match="without jstore"):
+        batch.load_manifest(str(path))
+
+
+def test_batch (tmp_path, collections, run, artifact):
+    found = batch.find_collections(str(collections / "*"))
+    broken = {"name": "broken", "cortex": str(tmp_path / "missing.csv"), "jstore": found[0]["jstore"]}
+    summaries = run_batch(tmp_path / "batch", found + [broken], "--batch_workers", "2", "--vocabulary", str(tmp_path / "vocabulary.db"))
+
+    # The summaries are in the order of the collections, a failed collection does not stop the others
+    assert [(s["name"], s["status"]) for s in summaries] == [(name, "ok") for name in sorted(COLLECTIONS)] + [("broken", "failed")]
+    with open(tmp_path / "batch" / "batch.json", 'r') as summary_file:
+        assert [s["name"] for s in json.load(summary_file)] == [s["name"] for s in summaries]
+    assert (tmp_path / "batch" / "cache.json").exists()
+
+    # The vocabularies are saved under the names of the collections
+    store = VocabularyStore(str(tmp_path / "vocabulary.db"), logging.getLogger("Cortex2JStore.tests"))
+    store.open()
+    assert sorted(store.names()) == sorted(COLLECTIONS)
+    store.close()
+
+    for collection in found:
+        run(tmp_path / "single" / collection["name"], "-c", collection["cortex"], "-j", collection["jstore"], "-a", "final", "--vocabulary_name", collection["name"])
+        for name in ("finaljstore", "localsubjects", "vocabulary"):
+            expected = artifact(tmp_path / "single" / collection["name"], name)
+            assert expected, name
+            assert artifact(tmp_path / "batch" / collection["name"], name) == expected, (collection["name"], name)
+
+
+def test_duplicate_names (tmp_path, collections):
+    found = batch.find_collections(str(collections / "*"))
+    with pytest.raises(Exception, match="Duplicate collection names"):
+        run_batch(tmp_path / "batch", found + found[:1])
@@ -0,0 +1,67 @@
+"""
+Transform caches: eviction, the save/load round trip, and runs starting warm from a cache file.
+"""
+
+# import the required modules
+from cache import LRUCache
+from cache import load_caches
+from cache import save_caches
+import standardize
+
+
+def test_lru_eviction ():
+    cache = LRUCache(2)
+    for key in ["a", "b", "a", "c", "a", "b"]:
+        cache.get(key, str.upper)
+
+    # "b" was the least recently used when "c" came in, and again when "b" came back
+    assert list(cache.entries.items()) == [("a", "A"), ("b", "B")]
+    assert cache.stats() == {"hits": 2, "misses": 4, "evictions": 2, "size": 2, "maxsize": 2, "hit_rate": 2 / 6}
+
+
+def test_disabled ():
+    cache = LRUCache(0)
+    assert cache.get("a", str.upper) == "A"
+    assert not cache.entries
+
+
+def test_round_trip (tmp_path):
+    path = str(tmp_path / "cache.json")
+    caches = {"upper": LRUCache(10), "lower": LRUCache(10)}
+    for key in ["Été", "a,b", "", "Smith, John"]:
+        caches["upper"].get(key, str.upper)
+        caches["lower"].get(key, str.lower)
+    save_caches(caches, path)
+
+    loaded = {"upper": LRUCache(10), "lower": LRUCache(10), "other": LRUCache(10)}
+    load_caches(loaded, path)
+    for name in caches:
+        assert loaded[name].entries == caches[name].entries
+        assert list(loaded[name].entries) == list(caches[name].entries)
+    assert not loaded["other"].entries
+    assert not (tmp_path / "cache.json.tmp").exists()
+
+    # A smaller cache keeps the most recently used entries
+    small = {"upper": LRUCache(2)}
+    load_caches(small, path)
+    assert list(small["upper"].entries) == ["", "Smith, John"]
+
+
+def test_missing_file (tmp_path):
+    caches = {"upper": LRUCache(10)}
+    load_caches(caches, str(tmp_path / "missing.json"))
+    load_caches(caches, None)
+    assert not caches["upper"].entries
+
+
+def test_warm_run (tmp_path, run, artifact):
+    path = str(tmp_path / "cache.json")
+    run(tmp_path / "cold", "-a", "final", "--cache_file", path)
+    cold = standardize.cache_stats()["format_name"]
+
+    run(tmp_path / "warm", "-a", "final", "--cache_file", path)
+    warm = standardize.cache_stats()["format_name"]
+
+    assert artifact(tmp_path / "warm", "finaljstore") == artifact(tmp_path / "cold", "finaljstore")
+    assert cold["misses"] and warm["misses"] == 0
+    assert warm["hits"] == cold["hits"] + cold["misses"]
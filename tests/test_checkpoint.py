@@ -0,0 +1,51 @@
+"""
+Resuming the row engine from every checkpoint, with and without the incremental mode.
+"""
+
+# import the required modules
+from cortex2jstore import Cortex2JStore
+from state import StateStore
+import logging
+import pytest
+
+# Method failing right after each checkpoint is written, keyed on the checkpoint
+CRASH_AFTER = {
+    "loaded": "find_matches",
+    "matched": "combine_matches",
+    "standardized": "export_local_subjects",
+}
+
+
+def crash (self, *args, **kwargs):
+    raise RuntimeError("simulated crash")
+
+
+@pytest.mark.parametrize("stage", list(CRASH_AFTER))
+@pytest.mark.parametrize("incremental", [False, True])
+def test_resume (tmp_path, monkeypatch, run, artifact, stage, incremental):
+    run(tmp_path / "reference")
+    expected = artifact(tmp_path / "reference", "finaljstore")
+
+    options = ["-i", str(tmp_path / "state.db")] if incremental else []
+    method = CRASH_AFTER[stage]
+    if incremental and method == "combine_matches":
+        method = "incremental_merge"
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Cortex2JStore, method, crash)
+        with pytest.raises(RuntimeError):
+            run(tmp_path / "output", "--checkpoint", *options)
+
+    appln = run(tmp_path / "output", "--resume", *options)
+    assert appln.checkpoints.resumed_after == stage
+    assert artifact(tmp_path / "output", "finaljstore") == expected
+
+    if incremental:
+        state = StateStore(str(tmp_path / "state.db"), logging.getLogger("Cortex2JStore.tests"))
+        state.open()
+        assert len(state.jstore_fingerprints()) == len(expected)
+        state.close()
+
+        # The next run finds every row unchanged
+        run(tmp_path / "again", *options)
+        assert artifact(tmp_path / "again", "finaljstore.delta") == []
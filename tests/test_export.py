@@ -0,0 +1,71 @@
+"""
+Export command line: the final rows converted between JSON, NDJSON, CSV and XLSX.
+"""
+
+# import the required modules
+import export
+import pytest
+import sys
+import writers
+
+
+"""
+This function runs the export command line.
+"""
+def convert (monkeypatch, source, target, *options):
+    monkeypatch.setattr(sys, "argv", ["export.py", "-l", "30", "-s", str(source), "-t", str(target)] + list(options))
+    export.main()
+
+
+"""
+This function returns the rows of an export, with the empty cells as empty strings,
+as CSV and XLSX do not tell them apart.
+"""
+def read_back (path):
+    return [{k: "" if v is None else v for k, v in row.items()} for row in export.read_rows(str(path), export.detect_format(str(path)))]
+
+
+@pytest.mark.parametrize("target", ["json", "ndjson", "csv", "xlsx"])
+@pytest.mark.parametrize("source", ["ndjson", "json", "csv", "xlsx"])
+def test_convert (tmp_path, monkeypatch, run, artifact, source, target):
+    run(tmp_path / "output", "-a", "final")
+    rows = artifact(tmp_path / "output", "finaljstore")
+
+    source_path = tmp_path / ("source." + source)
+    convert(monkeypatch, tmp_path / "output" / "finaljstore.ndjson", source_path)
+    convert(monkeypatch, source_path, tmp_path / ("target." + target))
+    assert read_back(tmp_path / ("target." + target)) == rows
+
+
+def test_columns_and_layout (tmp_path, monkeypatch, run, artifact):
+    run(tmp_path / "output", "-a", "final")
+    rows = artifact(tmp_path / "output", "finaljstore")
+    source = tmp_path / "output" / "finaljstore.ndjson"
+
+    # Columns are kept in the order given, unknown ones are empty
+    columns = ["Title[2071407]", "Filename", "Missing"]
+    for target in ["columns.csv", "columns.xlsx", "columns.ndjson"]:
+        convert(monkeypatch, source, tmp_path / target, "-c", ",".join(columns))
+        assert read_back(tmp_path / target) == [{c: row.get(c, "") for c in columns} for row in rows], target
+
+    convert(monkeypatch, source, tmp_path / "compact.json", "-f", "compact")
+    assert (tmp_path / "compact.json").read_bytes() == writers.encode(rows, "compact")
+
+    # Past the row limit the XLSX rows continue in a new file
+    monkeypatch.setattr(writers, "EXCEL_MAX_ROWS", 101)
+    convert(monkeypatch, source, tmp_path / "split.xlsx", "--xlsx_split", "file")
+    files = ["split.xlsx"] + ["split.{}.xlsx".format(i) for i in range(2, -(-len(rows) // 100) + 1)]
+    assert sum((read_back(tmp_path / f) for f in files), []) == rows
+
+
+def test_explicit_formats (tmp_path, monkeypatch, run, artifact):
+    run(tmp_path / "output", "-a", "final")
+    rows = artifact(tmp_path / "output", "finaljstore")
+
+    convert(monkeypatch, tmp_path / "output" / "finaljstore.ndjson", tmp_path / "rows.txt", "--target_format", "csv")
+    convert(monkeypatch, tmp_path / "rows.txt", tmp_path / "rows.json", "--source_format", "csv")
+    assert read_back(tmp_path / "rows.json") == rows
+
+    # An unknown extension is reported and nothing is written
+    convert(monkeypatch, tmp_path / "rows.json", tmp_path / "rows.parquet")
+    assert not (tmp_path / "rows.parquet").exists()
@@ -0,0 +1,60 @@
+"""
+Incremental mode: the rows merged again are the ones whose JStore row or Cortex record changed.
+"""
+
+# import the required modules
+import csv
+import pytest
+import synthetic
+
+# File names of the exports, all of them matched
+FILENAMES = ["IMG_{:03d}.tif".format(i) for i in range(10)]
+
+# Cortex rows sharing the identifier of the first one
+SHARED_IDENTIFIER = (2, 7)
+
+
+"""
+This fixture returns a function writing the Cortex and JStore exports to a directory,
+with the Cortex titles given by row, and returning their paths.
+"""
+@pytest.fixture
+def write_exports (tmp_path):
+    def write_exports (name, titles = {}):
+        directory = tmp_path / name
+        directory.mkdir()
+        cortex_path = str(directory / "cortex.csv")
+        jstore_path = str(directory / "jstore.xlsx")
+        synthetic.write_cortex(cortex_path, FILENAMES)
+        synthetic.write_jstore(jstore_path, FILENAMES, filled = 0)
+
+        with open(cortex_path, 'r', newline='', encoding='utf-8-sig') as cortex_file:
+            rows = list(csv.reader(cortex_file))
+        rows[1 + SHARED_IDENTIFIER[1]][1] = rows[1 + SHARED_IDENTIFIER[0]][1]
+        for index, title in titles.items():
+            rows[1 + index][2] = title
+        with open(cortex_path, 'w', newline='', encoding='utf-8-sig') as cortex_file:
+            csv.writer(cortex_file).writerows(rows)
+
+        return ["-c", cortex_path, "-j", jstore_path, "-a", "final"]
+
+    return write_exports
+
+
+@pytest.mark.parametrize("changed", SHARED_IDENTIFIER)
+def test_shared_identifier (tmp_path, run, artifact, write_exports, changed):
+    state = ["-i", str(tmp_path / "state.db")]
+    run(tmp_path / "first", *write_exports("first"), *state)
+
+    # Nothing changed, nothing is merged again
+    run(tmp_path / "again", *write_exports("again"), *state)
+    assert artifact(tmp_path / "again", "finaljstore.delta") == []
+
+    # Only the title of one of the records sharing an identifier changes
+    exports = write_exports("second", {changed: "Retitled"})
+    run(tmp_path / "second", *exports, *state)
+    run(tmp_path / "reference", *exports)
+
+    delta = artifact(tmp_path / "second", "finaljstore.delta")
+    assert [row["Filename"] for row in delta if row["Title[2071407]"] == "Retitled"] == [FILENAMES[changed]]
+    assert artifact(tmp_path / "second", "finaljstore") == artifact(tmp_path / "reference", "finaljstore")
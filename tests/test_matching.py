@@ -0,0 +1,129 @@
+"""
+Matching passes and match report, with the Cortex index in memory and on disk.
+"""
+
+# import the required modules
+from matching import MatchIndex
+from matching import MatchReport
+from records import Schema
+from records import Record
+from spill import SpillIndex
+import config
+import matching
+import pytest
+
+# Original File Names of the Cortex rows, one of them twice
+CORTEX_KEYS = [
+    "Football_Stadium.tif",
+    "Reunion_Dinner.tif",
+    "Photos/Library_Annex.tif",
+    "Campus_Map.tif",
+    "campus_map.TIF",
+    "Reunion_Dinner.tif",
+]
+
+# JStore file names and the Cortex key and pass matching them, per mode
+MATCHES = [
+    ("Reunion_Dinner.tif", {"exact": ("Reunion_Dinner.tif", "exact"), "normalized": ("Reunion_Dinner.tif", "exact"), "fuzzy": ("Reunion_Dinner.tif", "exact")}),
+    ("LIBRARY_ANNEX.TIF", {"exact": None, "normalized": ("Photos/Library_Annex.tif", "normalized"), "fuzzy": ("Photos/Library_Annex.tif", "normalized")}),
+    ("Footbal_Stadium.jpg", {"exact": None, "normalized": None, "fuzzy": ("Football_Stadium.tif", "fuzzy")}),
+    ("Football_Stadium.tif", {"exact": ("Football_Stadium.tif", "exact"), "normalized": ("Football_Stadium.tif", "exact"), "fuzzy": ("Football_Stadium.tif", "exact")}),
+    ("CAMPUS_MAP.tif", {"exact": None, "normalized": None, "fuzzy": None}),
+    ("Unrelated.tif", {"exact": None, "normalized": None, "fuzzy": None}),
+]
+
+
+"""
+This fixture returns a function building a Cortex index of CORTEX_KEYS, in memory
+or in a SQLite file, for a matching mode.
+"""
+@pytest.fixture(params=["memory", "disk"])
+def build_index (request, tmp_path):
+    indexes = []
+
+    def build_index (mode):
+        if request.param == "memory":
+            index = MatchIndex(mode, config.match_normalizers, 2)
+        else:
+            index = SpillIndex(str(tmp_path / "{}.db".format(mode)), mode, config.match_normalizers, 2)
+        schema = Schema(["Original File Name", "Position"])
+        for position, key in enumerate(CORTEX_KEYS):
+            index.add(key, Record(schema, [key, position]))
+        index.finish()
+        indexes.append(index)
+        return index
+
+    yield build_index
+    for index in indexes:
+        index.close()
+
+
+@pytest.mark.parametrize("mode", ["exact", "normalized", "fuzzy"])
+def test_match (build_index, mode):
+    index = build_index(mode)
+    assert len(index) == 5
+    assert index.duplicates == {"Reunion_Dinner.tif": 2}
+
+    for filename, expected in MATCHES:
+        row, method, candidates = index.match(filename)
+        if expected[mode] is None:
+            assert row is None and method is None, filename
+        else:
+            assert (row["Original File Name"], method) == expected[mode], filename
+            assert candidates == [expected[mode][0]]
+
+    # The last of the duplicated rows is used
+    assert index.match("Reunion_Dinner.tif")[0]["Position"] == 5
+
+    # Two Cortex keys are equal once normalized, neither one is picked
+    if mode != "exact":
+        assert index.match("CAMPUS_MAP.tif")[2] == ["Campus_Map.tif", "campus_map.TIF"]
+
+
+@pytest.mark.parametrize("mode", ["exact", "fuzzy"])
+def test_report (build_index, mode):
+    index = build_index(mode)
+    report = MatchReport(index)
+    for filename in [filename for filename, expected in MATCHES] + ["Reunion_Dinner.tif"]:
+        row, method, candidates = index.match(filename)
+        report.add(filename, method, candidates)
+
+    summary = report.to_dict(mode, index.duplicates)
+    if mode == "exact":
+        assert summary["matched"] == {"exact": 3}
+        assert summary["recovered"] == []
+        assert summary["unmatched"] == ["LIBRARY_ANNEX.TIF", "Footbal_Stadium.jpg", "CAMPUS_MAP.tif", "Unrelated.tif"]
+        assert summary["ambiguous"] == [
+            {"original_file_name": "Reunion_Dinner.tif", "reason": "duplicate cortex rows, the last one is used", "cortex_rows": 2, "jstore_rows": 2, "first_filename": "Reunion_Dinner.tif"},
+            {"original_file_name": "Reunion_Dinner.tif", "reason": "several jstore rows", "jstore_rows": 2, "first_filename": "Reunion_Dinner.tif"},
+        ]
+        return
+
+    assert summary["matched"] == {"exact": 3, "normalized": 1, "fuzzy": 1}
+    assert summary["recovered"] == [
+        {"filename": "LIBRARY_ANNEX.TIF", "original_file_name": "Photos/Library_Annex.tif", "method": "normalized"},
+        {"filename": "Footbal_Stadium.jpg", "original_file_name": "Football_Stadium.tif", "method": "fuzzy"},
+    ]
+    assert summary["unmatched_count"] == 2
+    assert summary["unmatched"] == ["CAMPUS_MAP.tif", "Unrelated.tif"]
+
+    # The stadium was first matched by the fuzzy pass, then by its exact name
+    assert summary["ambiguous"] == [
+        {"filename": "CAMPUS_MAP.tif", "reason": "several candidates", "candidates": ["Campus_Map.tif", "campus_map.TIF"]},
+        {"original_file_name": "Reunion_Dinner.tif", "reason": "duplicate cortex rows, the last one is used", "cortex_rows": 2, "jstore_rows": 2, "first_filename": "Reunion_Dinner.tif"},
+        {"original_file_name": "Football_Stadium.tif", "reason": "several jstore rows", "jstore_rows": 2, "first_filename": "Footbal_Stadium.jpg"},
+        {"original_file_name": "Reunion_Dinner.tif", "reason": "several jstore rows", "jstore_rows": 2, "first_filename": "Reunion_Dinner.tif"},
+    ]
+    assert summary["ambiguous_count"] == 4
+
+
+def test_report_unmatched_limit (build_index, monkeypatch):
+    monkeypatch.setattr(matching, "REPORT_UNMATCHED_LIMIT", 2)
+    index = build_index("exact")
+    report = MatchReport(index)
+    for filename in ["A.tif", "B.tif", "C.tif", "Reunion_Dinner.tif"]:
+        report.add(filename, *index.match(filename)[1:])
+
+    summary = report.to_dict("exact", index.duplicates)
+    assert summary["unmatched"] == ["A.tif", "B.tif"]
+    assert summary["unmatched_count"] == 3
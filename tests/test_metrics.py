@@ -0,0 +1,51 @@
+"""
+Stage metrics: CPU time of the thread running the stage, and RSS change of the stage.
+"""
+
+# import the required modules
+from metrics import Instrumentation
+import logging
+import metrics
+import threading
+import time
+
+
+def busy (seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_thread_cpu ():
+    instrumentation = Instrumentation(logging.getLogger("Cortex2JStore.tests"))
+
+    # A stage waiting while another thread burns CPU is not charged that CPU
+    def other ():
+        with instrumentation.stage("busy"):
+            busy(0.3)
+
+    with instrumentation.stage("waiting"):
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join()
+
+    stages = {stage["stage"]: stage for stage in instrumentation.summary()}
+    assert stages["waiting"]["wall_s"] >= 0.3 and stages["waiting"]["cpu_s"] < 0.1
+    assert stages["busy"]["cpu_s"] > 0.1
+
+
+def test_rss_delta ():
+    instrumentation = Instrumentation(logging.getLogger("Cortex2JStore.tests"))
+    with instrumentation.stage("allocate"):
+        data = b"x" * (64 << 20)
+    with instrumentation.stage("allocate"):
+        pass
+
+    stage = instrumentation.summary()[0]
+    assert stage["calls"] == 2
+    if metrics.rss_mb() is None:
+        assert stage["rss_delta_mb"] is None
+    else:
+        assert stage["rss_delta_mb"] > 48
+        assert stage["peak_rss_mb"] > stage["rss_delta_mb"]
+    del data
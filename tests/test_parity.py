@@ -0,0 +1,88 @@
+"""
+Every engine and mode produces the same results from the same exports, and the option
+combinations a mode does not support are rejected instead of being ignored.
+"""
+
+# import the required modules
+import pytest
+import synthetic
+
+# Command line options of the engines and modes compared with the row engine
+MODES = {
+    "columnar": ["-e", "columnar"],
+    "stream": ["-s"],
+    "pipeline": ["-p", "-w", "2"],
+    "disk": ["--join", "disk"],
+}
+
+# Results compared between the modes
+ARTIFACTS = ("finaljstore", "match_report", "localsubjects", "vocabulary")
+
+
+@pytest.mark.parametrize("mode", list(MODES))
+@pytest.mark.parametrize("match", ["exact", "normalized"])
+def test_parity (tmp_path, run, artifact, mode, match):
+    if mode == "columnar" and match != "exact":
+        pytest.skip("the columnar engine only joins on the exact file name")
+
+    run(tmp_path / "row", "-m", match, "-a", "final")
+    run(tmp_path / mode, "-m", match, "-a", "final", *MODES[mode])
+
+    for name in ARTIFACTS:
+        expected = artifact(tmp_path / "row", name)
+        assert expected, name
+        assert artifact(tmp_path / mode, name) == expected, name
+
+
+"""
+This fixture writes exports made of the cases where the engines could part: file names
+shared by several Cortex rows, empty file names on both sides, and JStore rows, some
+of them repeated, without a Cortex row.
+"""
+@pytest.fixture(scope="module")
+def edge_exports (tmp_path_factory):
+    directory = tmp_path_factory.mktemp("edge")
+    matched = ["IMG_{:03d}.tif".format(i) for i in range(30)]
+    unmatched = ["NEW_{:03d}.tif".format(i) for i in range(10)]
+
+    cortex_names = matched + matched[:10] + matched[:5] + ["", ""] + ["SCAN_{:03d}.tif".format(i) for i in range(5)]
+    jstore_names = matched + unmatched + unmatched[:3] + matched[:2] + ["", ""]
+
+    cortex_path = str(directory / "cortex.csv")
+    jstore_path = str(directory / "jstore.xlsx")
+    synthetic.write_cortex(cortex_path, cortex_names, seed = 1)
+    synthetic.write_jstore(jstore_path, jstore_names, seed = 1)
+    return cortex_path, jstore_path
+
+
+@pytest.mark.parametrize("mode", list(MODES))
+@pytest.mark.parametrize("match", ["exact", "normalized"])
+def test_parity_edge_cases (tmp_path, run, artifact, edge_exports, mode, match):
+    if mode == "columnar" and match != "exact":
+        pytest.skip("the columnar engine only joins on the exact file name")
+
+    inputs = ["-c", edge_exports[0], "-j", edge_exports[1], "-m", match, "-a", "final"]
+    run(tmp_path / "row", *inputs)
+    run(tmp_path / mode, *inputs, *MODES[mode])
+
+    for name in ARTIFACTS:
+        expected = artifact(tmp_path / "row", name)
+        assert expected, name
+        assert artifact(tmp_path / mode, name) == expected, name
+
+
+@pytest.mark.parametrize("options", [
+    ["-e", "columnar", "-m", "normalized"],
+    ["-e", "columnar", "-m", "fuzzy"],
+    ["-e", "columnar", "-i", "state.db"],
+    ["-s", "-i", "state.db"],
+    ["-p", "-i", "state.db"],
+    ["--join", "disk", "-i", "state.db"],
+    ["--join", "disk", "-e", "columnar"],
+    ["-s", "--checkpoint"],
+    ["-e", "columnar", "--resume"],
+])
+def test_unsupported_options (tmp_path, run, options):
+    options = [str(tmp_path / o) if o == "state.db" else o for o in options]
+    with pytest.raises(Exception, match="require|cannot run|columnar joins"):
+        run(tmp_path / "output", *options)
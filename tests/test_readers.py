@@ -0,0 +1,69 @@
+"""
+Parallel CSV reader: the rows of the serial reader, whatever the byte ranges.
+"""
+
+# import the required modules
+import mmap
+import pytest
+import readers
+
+# CSV exports, as bytes, with the records a byte range must not split
+EXPORTS = {
+    "plain": b"Filename,Title\na.tif,A\nb.tif,B\nc.tif,C\n",
+    "quoted newlines": b'Filename,Description\na.tif,"line one\nline two"\nb.tif,"""quoted"",\n\n""more"""\nc.tif,"x\n"\n',
+    "crlf": b'Filename,Description\r\na.tif,"one\r\ntwo"\r\nb.tif,B\r\n\r\nc.tif,"C,c"\r\n',
+    "bom": b"\xef\xbb\xbfFilename,Title\na.tif,\xc3\xa9t\xc3\xa9\nb.tif,\xe2\x80\x94\n",
+    "short rows": b"Filename,Title,Date\na.tif\nb.tif,B\n\n\nc.tif,C,1900\n",
+    "no final newline": b'Filename,Title\na.tif,A\nb.tif,"B\nb"',
+    "header only": b"Filename,Title\n",
+}
+
+
+@pytest.mark.parametrize("name", list(EXPORTS))
+def test_parallel_rows (tmp_path, monkeypatch, name):
+    path = tmp_path / "cortex.csv"
+    path.write_bytes(EXPORTS[name])
+    headers, rows = readers.open_csv(str(path))
+    expected = list(rows)
+
+    monkeypatch.setattr(readers, "CSV_PARALLEL_MIN_BYTES", 0)
+    for chunk_bytes in [1, 2, 3, 5, 8, 13, 1 << 20]:
+        monkeypatch.setattr(readers, "CSV_CHUNK_BYTES", chunk_bytes)
+        parallel_headers, parallel_rows = readers.open_csv_parallel(str(path), 2)
+        assert parallel_headers == headers
+        assert list(parallel_rows) == expected, chunk_bytes
+
+
+@pytest.mark.parametrize("name", list(EXPORTS))
+def test_record_boundaries (tmp_path, name):
+    data = EXPORTS[name]
+    path = tmp_path / "cortex.csv"
+    path.write_bytes(data)
+
+    # A range starts after a newline outside quotes
+    line_starts = {i + 1 for i, byte in enumerate(data) if byte == ord("\n") and data[:i].count(b'"') % 2 == 0}
+
+    with open(path, 'rb') as csv_file, mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = readers.record_end(mm, 0)
+        for chunk_bytes in range(1, len(mm) + 1):
+            boundaries = readers.record_boundaries(mm, start, chunk_bytes)
+            assert boundaries[0] == start and boundaries[-1] == len(mm)
+            assert boundaries == sorted(boundaries), chunk_bytes
+            assert set(boundaries[:-1]) <= line_starts, chunk_bytes
+
+
+def test_cortex_read_workers (tmp_path, monkeypatch, run, artifact):
+    run(tmp_path / "serial", "-a", "cortex,finaljstore")
+
+    monkeypatch.setattr(readers, "CSV_PARALLEL_MIN_BYTES", 0)
+    monkeypatch.setattr(readers, "CSV_CHUNK_BYTES", 4096)
+    ranges = []
+    record_boundaries = readers.record_boundaries
+    monkeypatch.setattr(readers, "record_boundaries", lambda *args: ranges.append(record_boundaries(*args)) or ranges[-1])
+    run(tmp_path / "parallel", "-a", "cortex,finaljstore", "--read_workers", "2")
+    assert ranges and len(ranges[0]) > 3
+
+    for name in ("cortex", "finaljstore"):
+        expected = artifact(tmp_path / "serial", name)
+        assert expected, name
+        assert artifact(tmp_path / "parallel", name) == expected, name
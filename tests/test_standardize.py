@@ -0,0 +1,30 @@
+"""
+The standardization transforms against their golden outputs, and the process pool
+standardizing the same rows as the serial path.
+"""
+
+# import the required modules
+import bench_standardize
+import cortex2jstore
+import pytest
+import standardize
+
+
+def test_golden ():
+    assert bench_standardize.check_golden() == []
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_workers (tmp_path, monkeypatch, run, artifact, workers):
+    run(tmp_path / "serial", "-a", "final")
+
+    # The pool is used from the first row, the chunks end at any row
+    monkeypatch.setattr(cortex2jstore, "PARALLEL_MIN_ROWS", 1)
+    run(tmp_path / "pool", "-a", "final", "-w", str(workers))
+
+    for name in ("finaljstore", "localsubjects", "vocabulary"):
+        assert artifact(tmp_path / "pool", name) == artifact(tmp_path / "serial", name), name
+
+    # The values computed in the workers are merged into the caches of this process
+    stats = standardize.cache_stats()["format_name"]
+    assert stats["misses"] and stats["size"]
@@ -0,0 +1,103 @@
+"""
+Local subjects vocabulary: counts, diff, and the store shared by runs.
+"""
+
+# import the required modules
+from records import Record
+from records import Schema
+from vocabulary import Vocabulary
+from vocabulary import VocabularyStore
+import json
+import logging
+import pytest
+import sys
+import vocabulary
+
+
+"""
+This function returns a vocabulary of standardized rows given as (file name, subjects).
+"""
+def vocabulary_of (rows):
+    schema = Schema([vocabulary.RECORD_COLUMN, vocabulary.SUBJECTS_COLUMN])
+    result = Vocabulary()
+    for filename, subjects in rows:
+        result.add_row(Record(schema, [filename, subjects]))
+    return result
+
+
+OLD = [("a.tif", "Football|Alumni"), ("b.tif", "Football|Campus"), ("c.tif", "Libraries")]
+
+NEW = [("a.tif", "Football|Alumni"), ("b.tif", "Campus|football "), ("d.tif", "Reunions|Football")]
+
+
+@pytest.fixture
+def store (tmp_path):
+    store = VocabularyStore(str(tmp_path / "vocabulary.db"), logging.getLogger("Cortex2JStore.tests")).open()
+    yield store
+    store.close()
+
+
+def test_counts ():
+    old = vocabulary_of(OLD)
+    assert old.to_list() == [
+        {"subject": "Football", "normalized": "football", "count": 2, "first_seen": "a.tif"},
+        {"subject": "Alumni", "normalized": "alumni", "count": 1, "first_seen": "a.tif"},
+        {"subject": "Campus", "normalized": "campus", "count": 1, "first_seen": "b.tif"},
+        {"subject": "Libraries", "normalized": "libraries", "count": 1, "first_seen": "c.tif"},
+    ]
+    assert vocabulary_of(NEW).groups() == {"football": ["Football", "football "]}
+
+
+def test_diff ():
+    assert vocabulary.diff(vocabulary_of(OLD), vocabulary_of(NEW)) == {
+        "added": ["football ", "Reunions"],
+        "removed": ["Libraries"],
+        "changed": [],
+    }
+    assert vocabulary.diff(vocabulary_of(OLD), vocabulary_of(OLD + [("e.tif", "Libraries|Alumni")])) == {
+        "added": [],
+        "removed": [],
+        "changed": [{"subject": "Alumni", "before": 1, "after": 2}, {"subject": "Libraries", "before": 1, "after": 2}],
+    }
+    assert vocabulary.diff(vocabulary_of(OLD), vocabulary_of(OLD)) == {"added": [], "removed": [], "changed": []}
+
+
+def test_store (store):
+    store.save("old", vocabulary_of(OLD))
+    store.save("new", vocabulary_of(OLD))
+    store.save("new", vocabulary_of(NEW))
+
+    # A vocabulary saved again replaces the earlier one, in first-seen order
+    assert store.names() == ["new", "old"]
+    assert store.load("old").to_list() == vocabulary_of(OLD).to_list()
+    assert store.load("new").to_list() == vocabulary_of(NEW).to_list()
+    assert store.merge(["old", "new"]).to_list() == vocabulary_of(OLD + NEW).to_list()
+    assert not store.load("missing").entries
+
+
+def test_cli_diff (store, tmp_path, monkeypatch):
+    store.save("old", vocabulary_of(OLD))
+    store.save("new", vocabulary_of(NEW))
+
+    output = tmp_path / "diff.json"
+    monkeypatch.setattr(sys, "argv", ["vocabulary.py", "--db", store.path, "--diff", "old", "new", "-o", str(output)])
+    vocabulary.main()
+    assert json.loads(output.read_text()) == vocabulary.diff(vocabulary_of(OLD), vocabulary_of(NEW))
+
+    output = tmp_path / "merge.json"
+    monkeypatch.setattr(sys, "argv", ["vocabulary.py", "--db", store.path, "-o", str(output)])
+    vocabulary.main()
+    merged = json.loads(output.read_text())
+    assert merged["vocabularies"] == ["new", "old"]
+    assert merged["subjects"] == vocabulary_of(NEW + OLD).to_list()
+
+
+def test_runs (tmp_path, run, artifact):
+    path = str(tmp_path / "vocabulary.db")
+    run(tmp_path / "first", "-a", "final", "--vocabulary", path, "--vocabulary_name", "first")
+    run(tmp_path / "second", "-a", "final", "--vocabulary", path, "--vocabulary_name", "second")
+
+    store = VocabularyStore(path, logging.getLogger("Cortex2JStore.tests")).open()
+    assert store.load("first").to_list() == artifact(tmp_path / "first", "vocabulary")
+    assert vocabulary.diff(store.load("first"), store.load("second")) == {"added": [], "removed": [], "changed": []}
+    store.close()
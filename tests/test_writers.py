@@ -0,0 +1,65 @@
+"""
+Round trips of the JSON exports through the readers.
+"""
+
+# import the required modules
+import json
+import pytest
+import writers
+
+ARRAYS = [
+    [1, 23, 456, -7.5e3, 1e-2],
+    [True, False, None, 12345678901234567890],
+    ["a", {"k": [1, 2, {"z": "é"}]}, [], {}],
+    [" , ] ", 0],
+    [],
+]
+
+
+@pytest.mark.parametrize("data", ARRAYS)
+@pytest.mark.parametrize("format", ["pretty", "compact"])
+def test_read_json_across_chunks (tmp_path, monkeypatch, data, format):
+    path = writers.write_json(data, str(tmp_path / "data.json"), format)
+
+    # Without ijson the array is read in chunks, items must survive any chunk boundary
+    monkeypatch.setattr(writers, "ijson", None)
+    for size in range(1, 9):
+        monkeypatch.setattr(writers, "READ_CHUNK_SIZE", size)
+        assert list(writers.read_json(path)) == data
+
+
+@pytest.mark.parametrize("text", ["[1,", "[1 2]", "[1", "{}", "[tru]"])
+def test_read_json_malformed (tmp_path, monkeypatch, text):
+    path = tmp_path / "data.json"
+    path.write_text(text)
+
+    monkeypatch.setattr(writers, "ijson", None)
+    monkeypatch.setattr(writers, "READ_CHUNK_SIZE", 3)
+    with pytest.raises(Exception):
+        list(writers.read_json(str(path)))
+
+
+def test_pretty_matches_json_dump ():
+    rows = [{"Title": "Café — Tōkyō", "Count": 1.5, "Empty": None}]
+    assert writers.encode(rows, "pretty") == json.dumps(rows, indent=4).encode("ascii")
+
+
+@pytest.mark.parametrize("format", ["compact", "ndjson"])
+def test_without_orjson (tmp_path, monkeypatch, format):
+    rows = [{"Title": "Café — Tōkyō", "Small": 1e-05, "Large": 1e+20, "Count": -7.5e3, "Id": 1234567890123, "Empty": None, "Tags": ["a", "b"]}]
+    read = writers.read_ndjson if format == "ndjson" else writers.read_json
+    if writers.orjson is None:
+        pytest.skip("orjson is not installed")
+
+    expected = list(read(writers.write_json(rows, str(tmp_path / "orjson.json"), format)))
+    monkeypatch.setattr(writers, "orjson", None)
+    assert list(read(writers.write_json(rows, str(tmp_path / "json.json"), format))) == expected == rows
+
+
+def test_without_orjson_nan (monkeypatch):
+    if writers.orjson is None:
+        pytest.skip("orjson is not installed")
+
+    assert writers.encode([float("nan"), float("inf")]) == b"[null,null]"
+    monkeypatch.setattr(writers, "orjson", None)
+    assert writers.encode([float("nan"), float("inf")]) == b"[NaN,Infinity]"
@@ -0,0 +1,95 @@
+"""
+XLSX exports: rows continued on a new sheet or in a new file past the row limit.
+"""
+
+# import the required modules
+import openpyxl
+import pytest
+import writers
+
+COLUMNS = ["Filename", "Title", "Count"]
+
+ROWS = [{"Filename": "IMG_{}.tif".format(i), "Title": "Title " + str(i), "Count": i} for i in range(10)]
+
+
+"""
+This function returns the values of every sheet of an XLSX file, by sheet name.
+"""
+def read_sheets (path):
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    sheets = {sheet.title: [list(row) for row in sheet.iter_rows(values_only=True)] for sheet in workbook.worksheets}
+    workbook.close()
+    return sheets
+
+
+def expected_values (rows):
+    return [COLUMNS] + [[row[c] for c in COLUMNS] for row in rows]
+
+
+@pytest.mark.parametrize("count, sheets", [(0, 1), (3, 1), (4, 2), (9, 3), (10, 4)])
+def test_sheet_split (tmp_path, count, sheets):
+    path = str(tmp_path / "rows.xlsx")
+
+    # Four rows per sheet, the header and three rows
+    with writers.XlsxWriter(path, COLUMNS, "sheet", max_rows = 4) as writer:
+        for row in ROWS[:count]:
+            writer.write(row)
+
+    assert writer.paths == [path] and writer.count == count
+    written = read_sheets(path)
+    assert list(written) == ["Sheet" + str(i + 1) for i in range(sheets)]
+    for i, values in enumerate(written.values()):
+        assert values == expected_values(ROWS[i * 3:min(count, i * 3 + 3)])
+
+
+def test_file_split (tmp_path):
+    path = str(tmp_path / "rows.xlsx")
+    with writers.XlsxWriter(path, None, "file", max_rows = 4) as writer:
+        for row in ROWS:
+            writer.write(row)
+
+    # The header is taken from the first row and repeated in every file
+    assert writer.paths == [path] + [str(tmp_path / "rows.{}.xlsx".format(i)) for i in (2, 3, 4)]
+    for i, file_path in enumerate(writer.paths):
+        assert read_sheets(file_path) == {"Sheet1": expected_values(ROWS[i * 3:i * 3 + 3])}
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(["rows.xlsx", "rows.2.xlsx", "rows.3.xlsx", "rows.4.xlsx"])
+
+
+def test_sequences_and_nan (tmp_path):
+    path = str(tmp_path / "rows.xlsx")
+    writers.write_xlsx([["a.tif", float("nan"), 1], ["b.tif", None, 2]], path, COLUMNS)
+    assert read_sheets(path) == {"Sheet1": [COLUMNS, ["a.tif", None, 1], ["b.tif", None, 2]]}
+
+
+def test_abort (tmp_path):
+    path = str(tmp_path / "rows.xlsx")
+    with pytest.raises(RuntimeError):
+        with writers.XlsxWriter(path, COLUMNS, "file", max_rows = 4) as writer:
+            for row in ROWS:
+                writer.write(row)
+            raise RuntimeError("failed export")
+
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize("split", ["sheet", "file"])
+@pytest.mark.parametrize("mode", [[], ["-s"], ["-p", "-w", "2"], ["-e", "columnar"]])
+def test_final_exports (tmp_path, monkeypatch, run, artifact, split, mode):
+    monkeypatch.setattr(writers, "EXCEL_MAX_ROWS", 101)
+    run(tmp_path, "-a", "final", "--xlsx_split", split, *mode)
+    final = artifact(tmp_path, "finaljstore")
+    columns = list(final[0])
+
+    # A hundred rows per sheet, in order over the sheets or the files
+    if split == "sheet":
+        sheets = list(read_sheets(str(tmp_path / "finaljstore.xlsx")).values())
+    else:
+        paths = ["finaljstore.xlsx"] + ["finaljstore.{}.xlsx".format(i) for i in range(2, -(-len(final) // 100) + 1)]
+        sheets = [read_sheets(str(tmp_path / path))["Sheet1"] for path in paths]
+    assert len(sheets) == -(-len(final) // 100)
+
+    values = []
+    for sheet in sheets:
+        assert sheet[0] == columns and len(sheet) <= 101
+        values += sheet[1:]
+    assert values == [[row[c] if row[c] != "" else None for c in columns] for row in final]
@@ -0,0 +1,317 @@
+"""
+Local subjects vocabulary
+
+The vocabulary is filled while the rows are standardized. For every subject of the
+"Vanderbilt Local Subjects[2083876]" column it keeps the occurrence count, the first
+record (file name) it was seen in and its normalized form (case and whitespace
+folded), so near-duplicates can be grouped. Vocabularies are saved by name in a
+local SQLite store, one per run or collection, and can be merged and diffed there:
+
+python vocabulary.py --db vocabulary.db --merge a,b -o merged.json
+python vocabulary.py --db vocabulary.db --diff a b
+"""
+
+# import the required modules
+from collections import defaultdict
+import writers
+import logging
+import argparse
+import re
+import sqlite3
+
+# Column holding the pipe separated local subjects, and the column naming a record
+SUBJECTS_COLUMN = "Vanderbilt Local Subjects[2083876]"
+RECORD_COLUMN = "Filename"
+
+
+"""
+This function returns the normalized form of a subject, case and whitespace folded.
+
+Parameters:
+:param subject: Subject
+:ptype subject: str
+"""
+def normalize_subject (subject):
+    return re.sub(r"\s+", " ", subject).strip().casefold()
+
+
+class Vocabulary:
+
+    """
+    Constructor
+    """
+    def __init__(self):
+        self.entries = {} # [count, first seen record] per subject, in first-seen order
+
+
+    def __len__ (self):
+        return len(self.entries)
+
+
+    """
+    This method counts the subjects of a standardized JStore row.
+
+    Parameters:
+    :param row: Standardized JStore row
+    :ptype row: Record
+    """
+    def add_row (self, row):
+        value = row.get(SUBJECTS_COLUMN)
+        if value is None:
+            return
+        record = row.get(RECORD_COLUMN)
+        for subject in value.split('|'):
+            self.add(subject, 1, record)
+
+
+    """
+    This method adds occurrences of a subject.
+
+    Parameters:
+    :param subject: Subject
+    :ptype subject: str
+    :param count: Number of occurrences
+    :ptype count: int
+    :param record: Record the subject was first seen in
+    :ptype record: str
+    """
+    def add (self, subject, count = 1, record = None):
+        entry = self.entries.get(subject)
+        if entry is None:
+            self.entries[subject] = [count, record]
+        else:
+            entry[0] += count
+
+
+    """
+    This method merges another vocabulary into this one, whose first-seen records win.
+
+    Parameters:
+    :param other: Vocabulary to be merged
+    :ptype other: Vocabulary
+    """
+    def merge (self, other):
+        for subject, (count, record) in other.entries.items():
+            self.add(subject, count, record)
+        return self
+
+
+    """
+    This method returns the subjects, in first-seen order.
+    """
+    def subjects (self):
+        return list(self.entries)
+
+
+    """
+    This method returns the subjects grouped on their normalized form, for the
+    normalized forms shared by several subjects.
+    """
+    def groups (self):
+        groups = defaultdict(list)
+        for subject in self.entries:
+            groups[normalize_subject(subject)].append(subject)
+        return {normalized: subjects for normalized, subjects in groups.items() if len(subjects) > 1}
+
+
+    """
+    This method returns the vocabulary as a list of dictionaries, in first-seen order.
+    """
+    def to_list (self):
+        return [
+            {"subject": subject, "normalized": normalize_subject(subject), "count": count, "first_seen": record}
+            for subject, (count, record) in self.entries.items()
+        ]
+
+
+"""
+This function compares two vocabularies and returns the added and removed subjects
+and the subjects whose count changed.
+
+Parameters:
+:param old: Previous vocabulary
+:ptype old: Vocabulary
+:param new: Current vocabulary
+:ptype new: Vocabulary
+"""
+def diff (old, new):
+    return {
+        "added": [s for s in new.entries if s not in old.entries],
+        "removed": [s for s in old.entries if s not in new.entries],
+        "changed": [
+            {"subject": s, "before": old.entries[s][0], "after": count}
+            for s, (count, record) in new.entries.items() if s in old.entries and old.entries[s][0] != count
+        ],
+    }
+
+
+class VocabularyStore:
+
+    """
+    Constructor
+
+    Parameters:
+    :param path: Path to the SQLite database
+    :ptype path: str
+    :param logger: Logger object
+    :ptype logger: logging.Logger
+    """
+    def __init__(self, path, logger):
+        self.path = path # Path to the SQLite database
+        self.logger = logger # Logger object
+        self.connection = None # SQLite connection
+
+
+    """
+    This method opens the database and creates the table. Several processes may
+    save to the same database, e.g. the collections of a batch.
+    """
+    def open (self):
+        try:
+            self.connection = sqlite3.connect(self.path, timeout=60)
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS subjects (
+                    vocabulary TEXT, position INTEGER, subject TEXT, normalized TEXT, count INTEGER, first_seen TEXT,
+                    PRIMARY KEY (vocabulary, subject)
+                );
+                CREATE INDEX IF NOT EXISTS subjects_normalized ON subjects (normalized);
+            """)
+            return self
+
+        except Exception as e:
+            self.logger.error("VocabularyStore::open: Exception: " + str(e))
+            raise e
+
+
+    """
+    This method saves a vocabulary under a name, replacing the one saved before.
+
+    Parameters:
+    :param name: Name of the vocabulary, e.g. the collection
+    :ptype name: str
+    :param vocabulary: Vocabulary to be saved
+    :ptype vocabulary: Vocabulary
+    """
+    def save (self, name, vocabulary):
+        try:
+            with self.connection:
+                self.connection.execute("DELETE FROM subjects WHERE vocabulary = ?", (name,))
+                self.connection.executemany(
+                    "INSERT INTO subjects VALUES (?, ?, ?, ?, ?, ?)",
+                    ((name, i, subject, normalize_subject(subject), count, None if record is None else str(record))
+                     for i, (subject, (count, record)) in enumerate(vocabulary.entries.items())),
+                )
+
+        except Exception as e:
+            self.logger.error("VocabularyStore::save: Exception: " + str(e))
+            raise e
+
+
+    """
+    This method loads a vocabulary saved under a name.
+
+    Parameters:
+    :param name: Name of the vocabulary
+    :ptype name: str
+    """
+    def load (self, name):
+        vocabulary = Vocabulary()
+        cursor = self.connection.execute("SELECT subject, count, first_seen FROM subjects WHERE vocabulary = ? ORDER BY position", (name,))
+        for subject, count, record in cursor:
+            vocabulary.add(subject, count, record)
+        return vocabulary
+
+
+    """
+    This method returns the names of the saved vocabularies.
+    """
+    def names (self):
+        return [name for (name,) in self.connection.execute("SELECT DISTINCT vocabulary FROM subjects ORDER BY vocabulary")]
+
+
+    """
+    This method returns the merge of the vocabularies saved under the names, in that order.
+
+    Parameters:
+    :param names: Names of the vocabularies
+    :ptype names: list
+    """
+    def merge (self, names):
+        vocabulary = Vocabulary()
+        for name in names:
+            vocabulary.merge(self.load(name))
+        return vocabulary
+
+
+    """
+    This method closes the database.
+    """
+    def close (self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+"""
+Parse command line arguments
+"""
+def parseCmdLineArgs ():
+  # instantiate a ArgumentParser object
+  parser = argparse.ArgumentParser (description="Vocabulary: merges and diffs the local subjects vocabularies saved by cortex2jstore")
+
+  parser.add_argument ("-l", "--loglevel", type=int, default=logging.INFO, choices=[logging.DEBUG,logging.INFO,logging.WARNING,logging.ERROR,logging.CRITICAL], help="logging level, choices 10,20,30,40,50: default 20=logging.INFO")
+
+  parser.add_argument ("--db", type=str, required=True, help="sqlite vocabulary store written with cortex2jstore --vocabulary")
+
+  parser.add_argument ("--merge", type=str, default=None, help="comma separated names of the vocabularies to merge, all when empty")
+
+  parser.add_argument ("--diff", type=str, nargs=2, default=None, metavar=("OLD", "NEW"), help="names of the two vocabularies to compare")
+
+  parser.add_argument ("-o", "--output", type=str, default=None, help="json file the merge or the diff is written to: default logged only")
+
+  return parser.parse_args()
+
+
+"""
+Main program
+"""
+def main ():
+  try:
+    logger = logging.getLogger ("Vocabulary")
+
+    # first parse the arguments
+    args = parseCmdLineArgs ()
+    logger.setLevel (args.loglevel)
+
+    store = VocabularyStore (args.db, logger).open ()
+
+    if args.diff:
+      result = diff (store.load (args.diff[0]), store.load (args.diff[1]))
+      logger.info ("Main: {} added, {} removed, {} changed".format (len (result["added"]), len (result["removed"]), len (result["changed"])))
+
+    else:
+      names = [n.strip () for n in args.merge.split (",") if n.strip ()] if args.merge else store.names ()
+      vocabulary = store.merge (names)
+      result = {"vocabularies": names, "subjects": vocabulary.to_list (), "groups": vocabulary.groups ()}
+      logger.info ("Main: {} subjects in {}, {} near-duplicate groups".format (len (vocabulary), ", ".join (names), len (result["groups"])))
+
+    store.close ()
+
+    if args.output:
+      writers.write_json (result, args.output, "pretty")
+      logger.info ("Main: written to {}".format (args.output))
+
+  except Exception as e:
+    logger.error ("Exception caught in main - {}".format (e))
+    return
+
+
+"""
+Main entry point for the program
+"""
+if __name__ == "__main__":
+
+  # set underlying default logging capabilities
+  logging.basicConfig (level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+  main ()
@@ -0,0 +1,481 @@
+"""
+JSON and XLSX exports
+
+JSON export formats:
+
+pretty  - JSON array indented by 4, non-ASCII characters escaped, byte for byte what json.dump(indent=4) writes
+compact - JSON array without whitespace, UTF-8
+ndjson  - one JSON document per line, UTF-8, written and read back one row at a time
+
+Lists are written one item at a time, and records are written as JSON objects. orjson encodes
+the compact and ndjson formats when it is installed, with the standard library as the fallback.
+Both write the same JSON values, not always the same bytes: a float may be spelled differently
+(1e-05 or 0.00001), and NaN and infinities are written as null by orjson but as NaN and
+Infinity by the standard library. The pretty format is always written by the standard
+library, so that its bytes do not depend on which packages are installed.
+
+XLSX exports are written one row at a time with openpyxl in write-only mode, in
+constant memory. Past Excel's row limit the rows continue on a new sheet, or in
+a new file. Files are written to a temporary file first and renamed into place,
+so a failed export never leaves a truncated file. openpyxl is only imported once
+an XLSX file is written.
+"""
+
+# import the required modules
+from collections.abc import Mapping
+import csv
+import json
+import os
+import re
+from records import to_json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Supported JSON export formats
+JSON_FORMATS = ("pretty", "compact", "ndjson")
+
+# Indentation of the pretty format, the one of the original json.dump exports
+PRETTY_INDENT = 4
+
+# Where the rows continue past the row limit of a sheet
+XLSX_SPLITS = ("sheet", "file")
+
+# Rows per sheet in Excel, the header included
+EXCEL_MAX_ROWS = 1048576
+
+# Characters read at a time by the JSON array reader without ijson
+READ_CHUNK_SIZE = 1 << 20
+
+# An item of a JSON array followed by its separator, and an item whose last token may be cut at the end of the buffer
+ITEM_END = re.compile(r"\s*[,\]]")
+ITEM_CUT = re.compile(r"\s*[^\s,\]]*\Z")
+
+# Rows handed to the CSV writer at a time
+CSV_CHUNK_ROWS = 10000
+
+
+"""
+This function encodes a value as UTF-8 JSON in the given format.
+
+Parameters:
+:param value: Value to be encoded
+:ptype value: object
+:param format: pretty, compact or ndjson
+:ptype format: str
+"""
+def encode (value, format = "compact"):
+    if format == "pretty":
+        return json.dumps(value, indent=PRETTY_INDENT, default=to_json).encode("ascii")
+
+    if orjson is not None:
+        return orjson.dumps(value, default=to_json, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=to_json).encode("utf-8")
+
+
+"""
+This function returns the path an export is written to in the given format,
+.json files become .ndjson files in the ndjson format.
+
+Parameters:
+:param path: Path to the JSON file
+:ptype path: str
+:param format: pretty, compact or ndjson
+:ptype format: str
+"""
+def export_path (path, format):
+    if format == "ndjson" and path.endswith(".json"):
+        return path[:-len(".json")] + ".ndjson"
+    return path
+
+
+class JsonWriter:
+
+    """
+    Constructor
+
+    Parameters:
+    :param path: Path to the file, as returned by export_path
+    :ptype path: str
+    :param format: pretty, compact or ndjson
+    :ptype format: str
+    """
+    def __init__(self, path, format = "pretty"):
+        if format not in JSON_FORMATS:
+            raise Exception("Unknown JSON format: " + str(format))
+
+        self.path = path # Final path of the file
+        self.format = format # Export format
+        self.tmp_path = path + ".tmp" # Temporary file renamed to path on close
+        self.file = open(self.tmp_path, 'wb') # Temporary file
+        self.count = 0 # Number of items written
+
+
+    """
+    This method writes one item of the array, or one line in the ndjson format.
+
+    Parameters:
+    :param item: Item to be written
+    :ptype item: object
+    """
+    def write (self, item):
+        if self.format == "ndjson":
+            self.file.write(encode(item))
+            self.file.write(b"\n")
+
+        elif self.format == "compact":
+            self.file.write(b"," if self.count else b"[")
+            self.file.write(encode(item))
+
+        else:
+            # Nested lines of the item are indented one level, like json.dump(indent=...) does
+            self.file.write(b",\n" if self.count else b"[\n")
+            prefix = b" " * PRETTY_INDENT
+            self.file.write(prefix + encode(item, "pretty").replace(b"\n", b"\n" + prefix))
+
+        self.count += 1
+
+
+    """
+    This method closes the array and moves the file into place.
+    """
+    def close (self):
+        if self.format != "ndjson":
+            if self.count == 0:
+                self.file.write(b"[]")
+            else:
+                self.file.write(b"\n]" if self.format == "pretty" else b"]")
+
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+
+    """
+    This method discards the partially written file.
+    """
+    def abort (self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+    def __enter__ (self):
+        return self
+
+
+    def __exit__ (self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+"""
+This function writes data to a JSON file in the given format and returns the path written.
+Lists (and other iterables of rows) are written one item at a time; any other value
+is written as a single document.
+
+Parameters:
+:param data: Data to be exported
+:ptype data: object
+:param path: Path to the JSON file
+:ptype path: str
+:param format: pretty, compact or ndjson
+:ptype format: str
+"""
+def write_json (data, path, format = "pretty"):
+    path = export_path(path, format)
+
+    if isinstance(data, dict) or isinstance(data, str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as json_file:
+            json_file.write(encode(data, format))
+        os.replace(tmp_path, path)
+        return path
+
+    with JsonWriter(path, format) as writer:
+        for item in data:
+            writer.write(item)
+
+    return path
+
+
+"""
+This function lazily reads a ndjson file, yielding one document per line.
+
+Parameters:
+:param path: Path to the ndjson file
+:ptype path: str
+"""
+def read_ndjson (path):
+    loads = orjson.loads if orjson is not None else json.loads
+    with open(path, 'rb') as ndjson_file:
+        for line in ndjson_file:
+            if line.strip():
+                yield loads(line)
+
+
+"""
+This function lazily reads the items of a JSON array, with ijson when it is installed.
+Without it the file is read in chunks and the items are decoded one at a time with
+raw_decode, so only the current item is held in memory.
+
+Parameters:
+:param path: Path to the JSON file
+:ptype path: str
+"""
+def read_json (path):
+    if ijson is not None:
+        with open(path, 'rb') as json_file:
+            yield from ijson.items(json_file, "item", use_float=True)
+        return
+
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding="utf-8") as json_file:
+        buffer = ""
+        position = 0
+        eof = False
+        expected = "[" # Next token: [, an item (value), or a separator (,)
+
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+
+            if position == len(buffer) and not eof:
+                chunk = json_file.read(READ_CHUNK_SIZE)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            char = buffer[position] if position < len(buffer) else ""
+
+            if expected == "[":
+                if char != "[":
+                    raise Exception("Not a JSON array: " + path)
+                position += 1
+                expected = "first"
+
+            elif char == "]" and expected in ("first", ","):
+                return
+
+            elif expected == ",":
+                if char != ",":
+                    raise Exception("Malformed JSON array: " + path)
+                position += 1
+                expected = "value"
+
+            else:
+                # An item is only whole once its separator was read: a number or a literal
+                # cut at the end of the buffer decodes as a shorter value, or not at all
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                    complete = eof or ITEM_END.match(buffer, end) is not None or ITEM_CUT.match(buffer, end) is None
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    complete = False
+
+                if not complete:
+                    chunk = json_file.read(READ_CHUNK_SIZE)
+                    eof = not chunk
+                    buffer = buffer[position:] + chunk
+                    position = 0
+                    continue
+
+                yield item
+                position = end
+                expected = ","
+
+
+"""
+This function writes rows to a CSV file in chunks and returns the path written.
+
+Parameters:
+:param rows: Iterable of rows, mappings or sequences of values in the order of columns
+:ptype rows: iterable
+:param path: Path to the CSV file
+:ptype path: str
+:param columns: Header of the file, taken from the first row when None
+:ptype columns: list
+"""
+def write_csv (rows, path, columns = None):
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, 'w', newline='', encoding="utf-8") as csv_file:
+            csv_writer = csv.writer(csv_file)
+            if columns is not None:
+                columns = list(columns)
+                csv_writer.writerow(columns)
+
+            chunk = []
+            for row in rows:
+                if columns is None:
+                    columns = list(row.keys())
+                    csv_writer.writerow(columns)
+                chunk.append([row.get(c) for c in columns] if isinstance(row, Mapping) else row)
+                if len(chunk) >= CSV_CHUNK_ROWS:
+                    csv_writer.writerows(chunk)
+                    chunk = []
+            csv_writer.writerows(chunk)
+
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, path)
+    return path
+
+
+class XlsxWriter:
+
+    """
+    Constructor
+
+    Parameters:
+    :param path: Path to the XLSX file, the next files get .2.xlsx, .3.xlsx, ... in the file split
+    :ptype path: str
+    :param columns: Header of the sheets, taken from the first row when None
+    :ptype columns: list
+    :param split: Where the rows continue past max_rows: sheet or file
+    :ptype split: str
+    :param max_rows: Rows per sheet, the header included, EXCEL_MAX_ROWS when None
+    :ptype max_rows: int
+    """
+    def __init__(self, path, columns = None, split = "sheet", max_rows = None):
+        if split not in XLSX_SPLITS:
+            raise Exception("Unknown XLSX split: " + str(split))
+
+        self.path = path # Path to the first file
+        self.columns = list(columns) if columns is not None else None # Header of the sheets
+        self.split = split # Where the rows continue past max_rows
+        self.max_rows = max_rows or EXCEL_MAX_ROWS # Rows per sheet, the header included
+        self.paths = [] # Files written so far, the current one last
+        self.workbook = None # Current workbook
+        self.worksheet = None # Current sheet
+        self.sheet_rows = 0 # Rows of the current sheet, the header included
+        self.count = 0 # Number of rows written
+        self.new_workbook()
+
+
+    """
+    This method starts a new workbook, written to a temporary file on save.
+    """
+    def new_workbook (self):
+        import openpyxl
+
+        if self.workbook is not None:
+            self.save()
+
+        base, extension = os.path.splitext(self.path)
+        self.paths.append(self.path if not self.paths else base + "." + str(len(self.paths) + 1) + extension)
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.new_sheet()
+
+
+    """
+    This method starts a new sheet in the current workbook, with the header.
+    """
+    def new_sheet (self):
+        self.worksheet = self.workbook.create_sheet("Sheet" + str(len(self.workbook.worksheets) + 1))
+        self.sheet_rows = 0
+        if self.columns is not None:
+            self.worksheet.append(self.columns)
+            self.sheet_rows = 1
+
+
+    """
+    This method writes one row, a mapping keyed on the columns or a sequence of values
+    in the order of the columns.
+
+    Parameters:
+    :param row: Row to be written
+    :ptype row: dict
+    """
+    def write (self, row):
+        if self.columns is None:
+            self.columns = list(row.keys())
+            self.worksheet.append(self.columns)
+            self.sheet_rows = 1
+
+        if self.sheet_rows >= self.max_rows:
+            if self.split == "file":
+                self.new_workbook()
+            else:
+                self.new_sheet()
+
+        values = [row.get(c) for c in self.columns] if isinstance(row, Mapping) else row
+        # NaN cells, e.g. from data frames, are written empty
+        self.worksheet.append([None if v != v else v for v in values])
+        self.sheet_rows += 1
+        self.count += 1
+
+
+    """
+    This method saves the current workbook to its temporary file.
+    """
+    def save (self):
+        self.workbook.save(self.paths[-1] + ".tmp")
+        self.workbook = None
+
+
+    """
+    This method saves the last workbook and moves every file into place.
+    """
+    def close (self):
+        self.save()
+        for path in self.paths:
+            os.replace(path + ".tmp", path)
+
+
+    """
+    This method discards the written files.
+    """
+    def abort (self):
+        # The sheets of the current workbook stream to temporary files of openpyxl, closed here
+        if self.workbook is not None:
+            for worksheet in self.workbook.worksheets:
+                worksheet.close()
+        self.workbook = None
+        for path in self.paths:
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+
+
+    def __enter__ (self):
+        return self
+
+
+    def __exit__ (self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+"""
+This function writes rows to XLSX files, one row at a time, and returns the paths written.
+
+Parameters:
+:param rows: Iterable of rows, mappings or sequences of values in the order of columns
+:ptype rows: iterable
+:param path: Path to the XLSX file
+:ptype path: str
+:param columns: Header of the sheets, taken from the first row when None
+:ptype columns: list
+:param split: Where the rows continue past the row limit: sheet or file
+:ptype split: str
+"""
+def write_xlsx (rows, path, columns = None, split = "sheet"):
+    with XlsxWriter(path, columns, split) as writer:
+        for row in rows:
+            writer.write(row)
+
+    return writer.paths